@@ -0,0 +1,505 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+import storage
+from aggregation import (
+    AGGREGATE_INTERVALS,
+    BASE_INTERVAL,
+    CHILD_INTERVALS,
+    ROLLUP_EPOCH,
+    ROLLUPS,
+    add_record_to_totals,
+    aggregates_table,
+    convert_legacy_totals,
+    covered_buckets,
+    empty_totals,
+    get_bucket_end,
+    get_bucket_start,
+    initial_rollup_watermarks,
+    merge_totals,
+    read_rollup_watermarks,
+    record_weight,
+    totals_from_row,
+    totals_to_row,
+    write_rollup_watermarks,
+)
+from counters import TimingCounter
+from records import max_record_id, record_tables
+from watermarks import read_aggregate_watermark, write_aggregate_watermark
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGGREGATE_FLUSH_INTERVAL_MS = 5000
+DEFAULT_ROLLUP_INTERVAL_MS = 60000
+ROLLUP_GRACE = timedelta(minutes=2)
+ROLLUP_BATCH_SIZE = 20000
+RECOVERY_BATCH_SIZE = 5000
+
+BucketKey = Tuple[int, str, datetime]
+
+
+def _upsert_statement(connection):
+    statement = storage.upsert(connection, aggregates_table)
+    return statement.on_conflict_do_update(
+        index_elements=["monitor_id", "interval", "bucket_start"],
+        set_={
+            column.name: statement.excluded[column.name]
+            for column in aggregates_table.columns
+            if not column.primary_key
+        },
+    )
+
+
+class AggregateAccumulator:
+    """In-memory aggregate buckets flushed to the database in batches.
+
+    Each check updates the running totals of its 1m bucket in memory. Every
+    ``aggregate_flush_interval`` milliseconds the buckets changed since the
+    last flush are written with one ``INSERT ... ON CONFLICT DO UPDATE``
+    statement, in the same transaction as the aggregate watermark: the
+    highest monitor record id the flushed buckets include.
+
+    Coarser intervals are rolled up by ``compact`` every ``rollup_interval``
+    milliseconds: finished 1m buckets are added to their 5m bucket, 5m to
+    hour, hour to day, and day to week and month. The rollup watermarks of
+    ``ROLLUPS`` record how far each step got and are stored with the flushed
+    buckets. A record whose bucket was already rolled up, because it arrived
+    late or because the parent was written from records before rollups
+    existed, is also added to the parent directly.
+
+    Buckets missing from memory are seeded from their stored rows. After a
+    crash, the records above the watermark are re-derived into the buckets by
+    ``recover``.
+
+    Not thread safe; the record writer uses it from its writer thread only.
+    """
+
+    def __init__(self, engine: Engine, app_config: dict):
+        """Create an accumulator.
+
+        Args:
+            engine (Engine): Database engine holding the aggregates.
+            app_config (dict): Application configuration. Reads
+                ``aggregate_flush_interval``, ``rollup_interval``,
+                ``degraded_threshold`` and ``degraded_percentage_threshold``.
+        """
+        self.engine = engine
+        self.degraded_threshold_seconds = (
+            app_config.get("degraded_threshold", 200) / 1000
+        )
+        self.degraded_percentage_threshold = app_config.get(
+            "degraded_percentage_threshold", 10
+        )
+        self.flush_interval = (
+            app_config.get(
+                "aggregate_flush_interval", DEFAULT_AGGREGATE_FLUSH_INTERVAL_MS
+            )
+            / 1000
+        )
+        self.rollup_interval = (
+            app_config.get("rollup_interval", DEFAULT_ROLLUP_INTERVAL_MS) / 1000
+        )
+        self._buckets: Dict[BucketKey, dict] = {}
+        self._dirty: Set[BucketKey] = set()
+        self._touched: Set[BucketKey] = set()
+        self._record_id: Optional[int] = None
+        self._watermark: Optional[int] = None
+        self._rollups: Dict[Tuple[str, str], datetime] = {}
+        self._rollups_dirty = False
+        self._compaction_pending = True
+        self._last_flush = time.monotonic()
+        self._last_compaction = time.monotonic()
+        self._loads = 0
+        self._flushes = 0
+        self._rows_written = 0
+        self._recovered = 0
+        self._compactions = 0
+        self._compacted_rows = 0
+        self._flush_latency = TimingCounter()
+        self._compaction_latency = TimingCounter()
+
+    def _load_bucket_rows(self, connection, interval: str, bucket_start: datetime):
+        rows = connection.execute(
+            select(aggregates_table).where(
+                aggregates_table.c.interval == interval,
+                aggregates_table.c.bucket_start == bucket_start,
+            )
+        ).mappings()
+        for row in rows:
+            key = (row["monitor_id"], interval, bucket_start)
+            if key not in self._buckets:
+                self._buckets[key] = totals_from_row(row)
+        self._loads += 1
+
+    def _load(self, keys: Set[BucketKey]):
+        """Seed buckets missing from memory from the database.
+
+        Loads every monitor's row of each missing interval and bucket start in
+        one query, since at a bucket rollover all monitors move on together.
+        """
+        with self.engine.connect() as connection:
+            for interval, bucket_start in {(key[1], key[2]) for key in keys}:
+                self._load_bucket_rows(connection, interval, bucket_start)
+        for key in keys:
+            if key not in self._buckets:
+                self._buckets[key] = empty_totals()
+
+    def _routed_keys(
+        self, monitor_id: int, interval: str, timestamp: datetime
+    ) -> List[BucketKey]:
+        """Return the buckets a sample of ``interval`` is added to directly.
+
+        Besides its own bucket, that is every coarser bucket its interval, or
+        a coarser one, has already been rolled up into past ``timestamp``.
+        """
+        keys = [(monitor_id, interval, get_bucket_start(timestamp, interval))]
+        levels = {interval}
+        for child, parent in ROLLUPS:
+            if child not in levels:
+                continue
+            levels.add(parent)
+            compacted_until = self._rollups.get((child, parent), ROLLUP_EPOCH)
+            if get_bucket_start(timestamp, child) < compacted_until:
+                keys.append((monitor_id, parent, get_bucket_start(timestamp, parent)))
+        return keys
+
+    def add(self, records: Iterable):
+        """Add committed monitor records to their buckets.
+
+        Args:
+            records (Iterable): Saved ``MonitorRecord`` objects or
+                ``monitor_checks`` rows.
+        """
+        keyed = []
+        missing: Set[BucketKey] = set()
+        for record in records:
+            keys = self._routed_keys(record.monitor_id, BASE_INTERVAL, record.timestamp)
+            missing.update(key for key in keys if key not in self._buckets)
+            keyed.append((record, keys))
+        if missing:
+            self._load(missing)
+
+        for record, keys in keyed:
+            for key in keys:
+                totals = self._buckets[key]
+                if "legacy_avg_response_time" in totals:
+                    convert_legacy_totals(totals, record_weight(record))
+                add_record_to_totals(totals, record, self.degraded_threshold_seconds)
+                self._dirty.add(key)
+                self._touched.add(key)
+            if record.id is not None and (
+                self._record_id is None or record.id > self._record_id
+            ):
+                self._record_id = record.id
+
+    def flush(self) -> int:
+        """Write changed buckets and the watermarks in one transaction.
+
+        Buckets stay marked as changed if the write fails, so they are
+        retried by the next flush.
+
+        Returns:
+            int: Number of bucket rows written.
+        """
+        self._last_flush = time.monotonic()
+        if (
+            not self._dirty
+            and not self._rollups_dirty
+            and self._record_id == self._watermark
+        ):
+            return 0
+
+        started = time.perf_counter()
+        now = datetime.now()
+        keys = list(self._dirty)
+        rows = [
+            totals_to_row(
+                *key,
+                self._buckets[key],
+                self.degraded_threshold_seconds,
+                self.degraded_percentage_threshold,
+                now,
+            )
+            for key in keys
+        ]
+        with self.engine.begin() as connection:
+            if rows:
+                connection.execute(_upsert_statement(connection), rows)
+            if self._record_id is not None:
+                write_aggregate_watermark(connection, self._record_id)
+            if self._rollups_dirty:
+                write_rollup_watermarks(connection, self._rollups)
+        self._dirty.difference_update(keys)
+        self._watermark = self._record_id
+        self._rollups_dirty = False
+        self._flushes += 1
+        self._rows_written += len(rows)
+        self._flush_latency.add(time.perf_counter() - started)
+        return len(rows)
+
+    def maybe_flush(self) -> int:
+        """Flush if ``aggregate_flush_interval`` has passed since the last flush."""
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def merge_missing(
+        self, monitor_id: int, interval: str, buckets: Dict[datetime, dict]
+    ) -> int:
+        """Add totals computed for buckets missing from the aggregates.
+
+        Buckets that have gained rows at ``interval`` or a finer interval since
+        their totals were computed are skipped, so records counted by
+        ``add`` are never counted twice. Coarser buckets already rolled up
+        past a missing bucket are updated directly.
+
+        Args:
+            monitor_id (int): Monitor the buckets belong to.
+            interval (str): Interval of the buckets.
+            buckets (Dict[datetime, dict]): Running totals by bucket start.
+
+        Returns:
+            int: Number of missing buckets inserted.
+        """
+        if not buckets:
+            return 0
+        self.flush()
+        starts = sorted(buckets)
+        with self.engine.connect() as connection:
+            covered = covered_buckets(
+                connection,
+                monitor_id,
+                interval,
+                starts[0],
+                get_bucket_end(starts[-1], interval),
+            )
+
+        keyed = [
+            (bucket_start, self._routed_keys(monitor_id, interval, bucket_start))
+            for bucket_start in starts
+            if bucket_start not in covered
+        ]
+        for _, keys in keyed:
+            # Uncovered buckets have no stored row to seed them from.
+            self._buckets.setdefault(keys[0], empty_totals())
+        missing = {key for _, keys in keyed for key in keys if key not in self._buckets}
+        if missing:
+            self._load(missing)
+        for bucket_start, keys in keyed:
+            for key in keys:
+                merge_totals(self._buckets[key], buckets[bucket_start])
+                self._dirty.add(key)
+                self._touched.add(key)
+        self.flush()
+        return len(keyed)
+
+    def _roll_up(self, rows: List[dict], parent: str):
+        """Add stored child bucket rows to their parent buckets."""
+        keyed = [
+            (
+                (
+                    row["monitor_id"],
+                    parent,
+                    get_bucket_start(row["bucket_start"], parent),
+                ),
+                row,
+            )
+            for row in rows
+        ]
+        missing = {key for key, _ in keyed if key not in self._buckets}
+        if missing:
+            self._load(missing)
+        for key, row in keyed:
+            merge_totals(self._buckets[key], totals_from_row(row))
+            self._dirty.add(key)
+            self._touched.add(key)
+
+    def _evict(self):
+        """Drop flushed buckets that were not updated since the last eviction."""
+        for key in [
+            key
+            for key in self._buckets
+            if key not in self._touched and key not in self._dirty
+        ]:
+            del self._buckets[key]
+        self._touched = set()
+
+    def compact(self) -> bool:
+        """Roll finished buckets up into their parent intervals.
+
+        A child bucket is finished once ``ROLLUP_GRACE`` has passed since its
+        end and its own children have been rolled up into it. At most
+        ``ROLLUP_BATCH_SIZE`` child rows are rolled up per step, so a large
+        backlog is worked off over several calls.
+
+        Returns:
+            bool: Whether finished buckets are still waiting to be rolled up.
+        """
+        self._last_compaction = time.monotonic()
+        started = time.perf_counter()
+        now = datetime.now()
+        pending = False
+        for child, parent in ROLLUPS:
+            compacted_until = self._rollups.get((child, parent), ROLLUP_EPOCH)
+            finished_before = now - ROLLUP_GRACE
+            grandchild = CHILD_INTERVALS.get(child)
+            if grandchild is not None:
+                finished_before = min(
+                    finished_before,
+                    self._rollups.get((grandchild, child), ROLLUP_EPOCH),
+                )
+            cutoff = get_bucket_start(finished_before, child)
+            if cutoff <= compacted_until:
+                continue
+
+            # Child buckets are read back from the database, so write the
+            # ones still in memory first.
+            self.flush()
+            with self.engine.connect() as connection:
+                rows = (
+                    connection.execute(
+                        select(aggregates_table)
+                        .where(
+                            aggregates_table.c.interval == child,
+                            aggregates_table.c.bucket_start >= compacted_until,
+                            aggregates_table.c.bucket_start < cutoff,
+                        )
+                        .order_by(aggregates_table.c.bucket_start)
+                        .limit(ROLLUP_BATCH_SIZE)
+                    )
+                    .mappings()
+                    .all()
+                )
+                if len(rows) == ROLLUP_BATCH_SIZE:
+                    pending = True
+                    last_start = rows[-1]["bucket_start"]
+                    if rows[0]["bucket_start"] == last_start:
+                        rows = (
+                            connection.execute(
+                                select(aggregates_table).where(
+                                    aggregates_table.c.interval == child,
+                                    aggregates_table.c.bucket_start == last_start,
+                                )
+                            )
+                            .mappings()
+                            .all()
+                        )
+                        cutoff = get_bucket_end(last_start, child)
+                    else:
+                        rows = [row for row in rows if row["bucket_start"] < last_start]
+                        cutoff = last_start
+
+            self._roll_up(rows, parent)
+            self._rollups[(child, parent)] = cutoff
+            self._rollups_dirty = True
+            self._compacted_rows += len(rows)
+
+        self.flush()
+        self._evict()
+        self._compactions += 1
+        self._compaction_latency.add(time.perf_counter() - started)
+        self._compaction_pending = pending
+        return pending
+
+    def maybe_compact(self) -> bool:
+        """Compact if ``rollup_interval`` has passed or a backlog is waiting."""
+        if (
+            not self._compaction_pending
+            and time.monotonic() - self._last_compaction < self.rollup_interval
+        ):
+            return False
+        return self.compact()
+
+    def recover(self) -> int:
+        """Load the watermarks and re-derive records past the aggregate watermark.
+
+        Stored aggregates include exactly the records up to the watermark, so
+        records above it were committed but their bucket updates were lost.
+        Without a watermark the aggregates were kept in step with the records
+        and it starts at the newest record. Missing rollup watermarks are
+        initialized by ``initial_rollup_watermarks``.
+
+        Returns:
+            int: Number of records re-derived into the aggregates.
+        """
+        now = datetime.now()
+        with self.engine.connect() as connection:
+            self._rollups = read_rollup_watermarks(connection)
+            if len(self._rollups) < len(ROLLUPS):
+                self._rollups = {
+                    **initial_rollup_watermarks(connection, now),
+                    **self._rollups,
+                }
+                write_rollup_watermarks(connection, self._rollups)
+                connection.commit()
+
+            for interval in AGGREGATE_INTERVALS:
+                self._load_bucket_rows(
+                    connection, interval, get_bucket_start(now, interval)
+                )
+
+            watermark = read_aggregate_watermark(connection)
+            if watermark is None:
+                watermark = max_record_id(connection)
+                write_aggregate_watermark(connection, watermark)
+                connection.commit()
+            self._record_id = self._watermark = watermark
+
+            recovered = 0
+            for table in record_tables(connection):
+                last_id = watermark
+                while True:
+                    batch = connection.execute(
+                        select(table)
+                        .where(table.c.id > last_id)
+                        .order_by(table.c.id)
+                        .limit(RECOVERY_BATCH_SIZE)
+                    ).all()
+                    if not batch:
+                        break
+                    self.add(batch)
+                    recovered += len(batch)
+                    last_id = batch[-1].id
+
+        if recovered:
+            self.flush()
+            logger.info(
+                f"Re-derived aggregates for {recovered} records past watermark "
+                f"{watermark}"
+            )
+        self._recovered += recovered
+        return recovered
+
+    def stats(self) -> dict:
+        """Return bucket, flush and rollup counters of the accumulator.
+
+        Returns:
+            dict: Buckets held in memory and waiting to be flushed, the highest
+            record id added and flushed, counts of seeding queries, flushes,
+            rows written and recovered records, flush latency in seconds, the
+            rollup watermarks, and compaction counts and latency in seconds.
+        """
+        return {
+            "buckets": len(self._buckets),
+            "dirty": len(self._dirty),
+            "last_record_id": self._record_id,
+            "watermark": self._watermark,
+            "loads": self._loads,
+            "flushes": self._flushes,
+            "rows_written": self._rows_written,
+            "recovered": self._recovered,
+            "flush_latency": self._flush_latency.as_dict(),
+            "rollups": {
+                f"{child}:{parent}": compacted_until.isoformat()
+                for (child, parent), compacted_until in self._rollups.items()
+            },
+            "compactions": self._compactions,
+            "compacted_rows": self._compacted_rows,
+            "compaction_pending": self._compaction_pending,
+            "compaction_latency": self._compaction_latency.as_dict(),
+        }
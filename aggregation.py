@@ -1,16 +1,54 @@
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy import text
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
-from api.models import HeartbeatAggregate, MonitorRecord
+from sqlalchemy import bindparam, func, select, tuple_, update
+
+import storage
+from api.models import HeartbeatAggregate, MonitorRecord, RollupWatermark
+from registry import read_monitor_ids
+from scheduler import DEFAULT_INTERVAL_MS
+from sketch import LatencySketch
 
 logger = logging.getLogger(__name__)
 
-AGGREGATE_INTERVALS = ("hour", "day", "week")
+AGGREGATE_INTERVALS = ("1m", "5m", "hour", "day", "week", "month")
+BASE_INTERVAL = "1m"
+ROLLUPS = (
+    ("1m", "5m"),
+    ("5m", "hour"),
+    ("hour", "day"),
+    ("day", "week"),
+    ("day", "month"),
+)
+CHILD_INTERVALS = {parent: child for child, parent in ROLLUPS}
+ROLLUP_EPOCH = datetime(1970, 1, 1)
+PHASE_COLUMNS = ("dns_time", "connect_time", "tls_time", "ttfb")
+COUNT_COLUMNS = (
+    "count",
+    "down_count",
+    "degraded_count",
+    "response_sample_count",
+    "sample_weight",
+    "issue_weight",
+    "response_weight",
+    "phase_sample_count",
+)
+DEFAULT_SAMPLE_WEIGHT = DEFAULT_INTERVAL_MS / 1000
+REEVALUATE_BATCH_SIZE = 1000
+
+aggregates_table = HeartbeatAggregate.__table__
+rollup_watermarks_table = RollupWatermark.__table__
 
 
 def get_bucket_start(timestamp: datetime, interval: str) -> datetime:
     """Return normalized bucket start for an interval."""
+    if interval == "1m":
+        return timestamp.replace(second=0, microsecond=0)
+    if interval == "5m":
+        return timestamp.replace(
+            minute=timestamp.minute - timestamp.minute % 5, second=0, microsecond=0
+        )
     if interval == "hour":
         return timestamp.replace(minute=0, second=0, microsecond=0)
     if interval == "day":
@@ -18,11 +56,135 @@ def get_bucket_start(timestamp: datetime, interval: str) -> datetime:
     if interval == "week":
         start = timestamp - timedelta(days=timestamp.weekday())
         return start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "month":
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     raise ValueError(f"Unsupported interval: {interval}")
 
 
-def _compute_status(count: int, down_count: int, degraded_count: int, threshold: float):
-    issue_percentage = ((down_count + degraded_count) * 100.0 / count) if count else 0.0
+def get_bucket_end(bucket_start: datetime, interval: str) -> datetime:
+    """Return the start of the bucket following ``bucket_start``."""
+    if interval == "month":
+        if bucket_start.month == 12:
+            return bucket_start.replace(year=bucket_start.year + 1, month=1)
+        return bucket_start.replace(month=bucket_start.month + 1)
+    lengths = {
+        "1m": timedelta(minutes=1),
+        "5m": timedelta(minutes=5),
+        "hour": timedelta(hours=1),
+        "day": timedelta(days=1),
+        "week": timedelta(weeks=1),
+    }
+    if interval not in lengths:
+        raise ValueError(f"Unsupported interval: {interval}")
+    return bucket_start + lengths[interval]
+
+
+def covered_buckets(
+    connection, monitor_id: int, interval: str, start: datetime, end: datetime
+) -> Set[datetime]:
+    """Return the buckets of a monitor between ``start`` and ``end`` with aggregates.
+
+    A bucket counts as covered if it has a row at ``interval`` or at any finer
+    interval rolled up into it, since those hold its records until compacted.
+    """
+    intervals = [interval]
+    while intervals[-1] in CHILD_INTERVALS:
+        intervals.append(CHILD_INTERVALS[intervals[-1]])
+    return set(
+        connection.execute(
+            select(
+                storage.bucket_start(
+                    connection, aggregates_table.c.bucket_start, interval
+                )
+            )
+            .where(
+                aggregates_table.c.monitor_id == monitor_id,
+                aggregates_table.c.interval.in_(intervals),
+                aggregates_table.c.bucket_start >= start,
+                aggregates_table.c.bucket_start < end,
+            )
+            .distinct()
+        ).scalars()
+    )
+
+
+def record_weight(record: MonitorRecord) -> float:
+    """Return the seconds a record stands for, its ``check_interval`` if recorded."""
+    return record.check_interval or DEFAULT_SAMPLE_WEIGHT
+
+
+def read_rollup_watermarks(connection) -> Dict[Tuple[str, str], datetime]:
+    """Return how far each finer interval has been rolled up into its parent.
+
+    Returns:
+        dict: Maps ``(child, parent)`` to the bucket start before which every
+        child bucket is included in the parent, either by compaction or by
+        records written to the parent directly.
+    """
+    rows = connection.execute(select(rollup_watermarks_table)).mappings()
+    return {(row["child"], row["parent"]): row["compacted_until"] for row in rows}
+
+
+def write_rollup_watermarks(connection, watermarks: Dict[Tuple[str, str], datetime]):
+    """Store rollup watermarks, see ``read_rollup_watermarks``."""
+    statement = storage.upsert(connection, rollup_watermarks_table)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["child", "parent"],
+            set_={
+                "compacted_until": statement.excluded.compacted_until,
+                "updated_at": statement.excluded.updated_at,
+            },
+        ),
+        [
+            {
+                "child": child,
+                "parent": parent,
+                "compacted_until": compacted_until,
+                "updated_at": datetime.now(),
+            }
+            for (child, parent), compacted_until in watermarks.items()
+        ],
+    )
+
+
+def initial_rollup_watermarks(
+    connection, now: datetime
+) -> Dict[Tuple[str, str], datetime]:
+    """Return rollup watermarks for aggregates that have not been rolled up yet.
+
+    Intervals that already have rows were written from records directly, up
+    to now. Their open bucket keeps receiving records directly until it
+    closes, after which it is built from its child interval. Intervals
+    without rows are built from all existing rows of their child interval.
+    """
+    existing = set(
+        connection.execute(select(aggregates_table.c.interval).distinct()).scalars()
+    )
+    return {
+        (child, parent): (
+            get_bucket_end(get_bucket_start(now, parent), parent)
+            if parent in existing
+            else ROLLUP_EPOCH
+        )
+        for child, parent in ROLLUPS
+    }
+
+
+def _compute_status(
+    count: int,
+    down_count: int,
+    degraded_count: int,
+    threshold: float,
+    sample_weight: float = 0.0,
+    issue_weight: float = 0.0,
+):
+    if sample_weight:
+        issue_percentage = issue_weight * 100.0 / sample_weight
+    elif count:
+        issue_percentage = (down_count + degraded_count) * 100.0 / count
+    else:
+        issue_percentage = 0.0
     if down_count > 0:
         status = "down"
     elif issue_percentage > threshold:
@@ -32,314 +194,372 @@ def _compute_status(count: int, down_count: int, degraded_count: int, threshold:
     return status, issue_percentage
 
 
-def upsert_aggregates_for_record(db, record: MonitorRecord, app_config: dict):
-    """Incrementally update hour/day/week aggregate buckets for one monitor record."""
-    degraded_threshold_seconds = app_config.get("degraded_threshold", 200) / 1000
-    degraded_percentage_threshold = app_config.get("degraded_percentage_threshold", 10)
-    now = datetime.now()
+def empty_totals() -> dict:
+    """Return zeroed running totals of one aggregate bucket."""
+    return {
+        "count": 0,
+        "down_count": 0,
+        "degraded_count": 0,
+        "response_sample_count": 0,
+        "response_sum": 0.0,
+        "sample_weight": 0.0,
+        "issue_weight": 0.0,
+        "response_weight": 0.0,
+        "phase_sample_count": 0,
+        "phase_sums": dict.fromkeys(PHASE_COLUMNS, 0.0),
+        "sketch": LatencySketch(),
+    }
 
+
+def add_record_to_totals(totals: dict, record, degraded_threshold_seconds: float):
+    """Add one monitor record to the running totals of a bucket.
+
+    ``response_sum`` is weighted by ``record_weight``; phase sums are plain
+    sums over the checks that received a response. The response times of
+    successful checks are also counted in the bucket's latency sketch.
+    """
     is_degraded = (
         record.is_up
         and record.response_time is not None
         and record.response_time > degraded_threshold_seconds
     )
-
-    for interval in AGGREGATE_INTERVALS:
-        bucket_start = get_bucket_start(record.timestamp, interval)
-        aggregate = (
-            db.query(HeartbeatAggregate)
-            .filter(
-                HeartbeatAggregate.monitor_name == record.monitor_name,
-                HeartbeatAggregate.interval == interval,
-                HeartbeatAggregate.bucket_start == bucket_start,
+    weight = record_weight(record)
+    totals["count"] += 1
+    totals["sample_weight"] += weight
+    if not record.is_up:
+        totals["down_count"] += 1
+    if is_degraded:
+        totals["degraded_count"] += 1
+    if not record.is_up or is_degraded:
+        totals["issue_weight"] += weight
+    if record.response_time is not None:
+        totals["response_sample_count"] += 1
+        totals["response_sum"] += record.response_time * weight
+        totals["response_weight"] += weight
+        if record.is_up:
+            totals["sketch"].add(record.response_time)
+    if record.ttfb is not None:
+        totals["phase_sample_count"] += 1
+        for phase in PHASE_COLUMNS:
+            totals["phase_sums"][phase] += getattr(record, phase) or 0.0
+
+
+def totals_from_row(row) -> dict:
+    """Convert a stored aggregate row back into running totals.
+
+    Rows written before sample weights existed keep their average response
+    time under ``legacy_avg_response_time`` until ``convert_legacy_totals``
+    gives their samples a weight.
+    """
+    totals = empty_totals()
+    for column in COUNT_COLUMNS:
+        totals[column] = row[column] or 0
+    avg_response_time = row["avg_response_time"] or 0.0
+    if totals["count"] and not totals["sample_weight"]:
+        totals["legacy_avg_response_time"] = avg_response_time
+    else:
+        totals["response_sum"] = avg_response_time * totals["response_weight"]
+    for phase in PHASE_COLUMNS:
+        totals["phase_sums"][phase] = (row[f"avg_{phase}"] or 0.0) * totals[
+            "phase_sample_count"
+        ]
+    totals["sketch"] = LatencySketch.from_bytes(row["response_sketch"])
+    return totals
+
+
+def convert_legacy_totals(totals: dict, unit: float):
+    """Give the samples of a bucket written before weights existed ``unit`` weight."""
+    avg_response_time = totals.pop("legacy_avg_response_time")
+    totals["sample_weight"] = totals["count"] * unit
+    totals["issue_weight"] = (totals["down_count"] + totals["degraded_count"]) * unit
+    totals["response_weight"] = totals["response_sample_count"] * unit
+    totals["response_sum"] = avg_response_time * totals["response_weight"]
+
+
+def merge_totals(totals: dict, other: dict):
+    """Add the running totals of another bucket into ``totals``."""
+    for side in (totals, other):
+        if "legacy_avg_response_time" in side:
+            convert_legacy_totals(side, DEFAULT_SAMPLE_WEIGHT)
+    for column in COUNT_COLUMNS:
+        totals[column] += other[column]
+    totals["response_sum"] += other["response_sum"]
+    for phase in PHASE_COLUMNS:
+        totals["phase_sums"][phase] += other["phase_sums"][phase]
+    totals["sketch"].merge(other["sketch"])
+
+
+def totals_to_row(
+    monitor_id: int,
+    interval: str,
+    bucket_start: datetime,
+    totals: dict,
+    degraded_threshold_seconds: float,
+    degraded_percentage_threshold: float,
+    now: datetime,
+) -> dict:
+    """Return the ``aggregate_buckets`` column values for bucket totals."""
+    status, issue_percentage = _compute_status(
+        totals["count"],
+        totals["down_count"],
+        totals["degraded_count"],
+        degraded_percentage_threshold,
+        totals["sample_weight"],
+        totals["issue_weight"],
+    )
+    phase_samples = totals["phase_sample_count"]
+    return {
+        "monitor_id": monitor_id,
+        "interval": interval,
+        "bucket_start": bucket_start,
+        **{column: totals[column] for column in COUNT_COLUMNS},
+        "avg_response_time": (
+            totals["response_sum"] / totals["response_weight"]
+            if totals["response_weight"]
+            else None
+        ),
+        **{
+            f"avg_{phase}": (
+                totals["phase_sums"][phase] / phase_samples if phase_samples else None
             )
-            .one_or_none()
-        )
+            for phase in PHASE_COLUMNS
+        },
+        "response_sketch": (
+            totals["sketch"].to_bytes() if totals["sketch"].counts else None
+        ),
+        "degraded_threshold": degraded_threshold_seconds,
+        "issue_percentage": issue_percentage,
+        "status": status,
+        "is_up": status == "up",
+        "updated_at": now,
+    }
 
-        if aggregate is None:
-            response_sample_count = 1 if record.response_time is not None else 0
-            avg_response_time = (
-                record.response_time if record.response_time is not None else None
-            )
-            count = 1
-            down_count = 0 if record.is_up else 1
-            degraded_count = 1 if is_degraded else 0
 
-            status, issue_percentage = _compute_status(
-                count, down_count, degraded_count, degraded_percentage_threshold
-            )
-            aggregate = HeartbeatAggregate(
-                monitor_name=record.monitor_name,
-                interval=interval,
-                bucket_start=bucket_start,
-                count=count,
-                down_count=down_count,
-                degraded_count=degraded_count,
-                response_sample_count=response_sample_count,
-                avg_response_time=avg_response_time,
-                issue_percentage=issue_percentage,
-                status=status,
-                is_up=status == "up",
-                updated_at=now,
-            )
-            db.add(aggregate)
-            continue
+def _rollup_tail(
+    connection,
+    monitor_ids: List[int],
+    interval: str,
+    watermarks: Dict[Tuple[str, str], datetime],
+) -> Dict[Tuple[int, datetime], dict]:
+    """Return the totals of finer buckets not yet rolled up into ``interval``.
 
-        aggregate.count += 1
-        if not record.is_up:
-            aggregate.down_count += 1
-        if is_degraded:
-            aggregate.degraded_count += 1
-
-        if record.response_time is not None:
-            prev_samples = aggregate.response_sample_count
-            prev_total = (aggregate.avg_response_time or 0.0) * prev_samples
-            aggregate.response_sample_count = prev_samples + 1
-            aggregate.avg_response_time = (
-                prev_total + record.response_time
-            ) / aggregate.response_sample_count
-
-        status, issue_percentage = _compute_status(
-            aggregate.count,
-            aggregate.down_count,
-            aggregate.degraded_count,
-            degraded_percentage_threshold,
+    Recurses down to the base interval, so the result covers everything
+    written since the last compaction of each level.
+    """
+    child = CHILD_INTERVALS.get(interval)
+    if child is None:
+        return {}
+    compacted_until = watermarks.get((child, interval), ROLLUP_EPOCH)
+
+    child_totals = {}
+    rows = connection.execute(
+        select(aggregates_table).where(
+            aggregates_table.c.monitor_id.in_(monitor_ids),
+            aggregates_table.c.interval == child,
+            aggregates_table.c.bucket_start >= compacted_until,
         )
-        aggregate.issue_percentage = issue_percentage
-        aggregate.status = status
-        aggregate.is_up = status == "up"
-        aggregate.updated_at = now
+    ).mappings()
+    for row in rows:
+        child_totals[(row["monitor_id"], row["bucket_start"])] = totals_from_row(row)
+    for (monitor_id, child_start), totals in _rollup_tail(
+        connection, monitor_ids, child, watermarks
+    ).items():
+        if child_start >= compacted_until:
+            merge_totals(
+                child_totals.setdefault((monitor_id, child_start), empty_totals()),
+                totals,
+            )
 
+    tail = {}
+    for (monitor_id, child_start), totals in child_totals.items():
+        key = (monitor_id, get_bucket_start(child_start, interval))
+        merge_totals(tail.setdefault(key, empty_totals()), totals)
+    return tail
+
+
+def read_aggregate_rows(
+    connection,
+    monitor_names: Iterable[str],
+    interval: str,
+    since: datetime,
+    app_config: dict,
+) -> Dict[str, List[dict]]:
+    """Return the aggregate buckets of monitors starting at or after ``since``.
+
+    Coarser intervals are built by compacting finished finer buckets in the
+    background, so the open buckets are completed here with the finer
+    buckets not rolled up into them yet.
+
+    Args:
+        connection: Database connection.
+        monitor_names (Iterable[str]): Monitors to read.
+        interval (str): One of ``AGGREGATE_INTERVALS``.
+        since (datetime): Earliest bucket start to return.
+        app_config (dict): Application configuration with degraded thresholds.
+
+    Returns:
+        dict: Lists of ``aggregate_buckets`` column values ordered by bucket
+        start, keyed by monitor name.
+    """
+    monitor_names = list(monitor_names)
+    rows_by_monitor: Dict[str, List[dict]] = {name: [] for name in monitor_names}
+    monitor_ids = read_monitor_ids(connection, monitor_names) if monitor_names else {}
+    if not monitor_ids:
+        return rows_by_monitor
+    names = {monitor_id: name for name, monitor_id in monitor_ids.items()}
+
+    rows = connection.execute(
+        select(aggregates_table).where(
+            aggregates_table.c.monitor_id.in_(list(names)),
+            aggregates_table.c.interval == interval,
+            aggregates_table.c.bucket_start >= since,
+        )
+    ).mappings()
+    stored = {(row["monitor_id"], row["bucket_start"]): row for row in rows}
 
-def merge_duplicate_aggregates(engine, app_config: dict):
-    """Merge duplicate aggregate buckets created with mixed timestamp formats."""
+    tail = _rollup_tail(
+        connection, list(names), interval, read_rollup_watermarks(connection)
+    )
+    degraded_threshold_seconds = app_config.get("degraded_threshold", 200) / 1000
     degraded_percentage_threshold = app_config.get("degraded_percentage_threshold", 10)
+    now = datetime.now()
 
-    duplicate_groups_query = text(
-        """
-        SELECT
-            monitor_name,
+    merged = {key: dict(row) for key, row in stored.items()}
+    for (monitor_id, bucket_start), totals in tail.items():
+        if bucket_start < since:
+            continue
+        row = stored.get((monitor_id, bucket_start))
+        if row is not None:
+            stored_totals = totals_from_row(row)
+            merge_totals(stored_totals, totals)
+            totals = stored_totals
+        merged[(monitor_id, bucket_start)] = totals_to_row(
+            monitor_id,
             interval,
-            datetime(bucket_start) AS normalized_bucket_start,
-            MIN(id) AS keep_id,
-            COUNT(*) AS row_count,
-            SUM(count) AS total_count,
-            SUM(down_count) AS total_down_count,
-            SUM(degraded_count) AS total_degraded_count,
-            SUM(response_sample_count) AS total_response_samples,
-            SUM(COALESCE(avg_response_time, 0) * COALESCE(response_sample_count, 0)) AS total_response_sum,
-            MAX(updated_at) AS latest_updated_at
-        FROM heartbeat_aggregates
-        GROUP BY monitor_name, interval, datetime(bucket_start)
-        HAVING COUNT(*) > 1
-        """
-    )
-
-    with engine.connect() as connection:
-        duplicate_groups = connection.execute(duplicate_groups_query).mappings().all()
-        if not duplicate_groups:
-            return
-
-        deleted_rows = 0
-
-        for group in duplicate_groups:
-            total_count = int(group["total_count"] or 0)
-            total_down_count = int(group["total_down_count"] or 0)
-            total_degraded_count = int(group["total_degraded_count"] or 0)
-            total_response_samples = int(group["total_response_samples"] or 0)
-
-            avg_response_time = (
-                float(group["total_response_sum"]) / total_response_samples
-                if total_response_samples > 0
-                else None
-            )
-
-            status, issue_percentage = _compute_status(
-                total_count,
-                total_down_count,
-                total_degraded_count,
-                degraded_percentage_threshold,
-            )
-
-            connection.execute(
-                text(
-                    """
-                    UPDATE heartbeat_aggregates
-                    SET
-                        bucket_start = :normalized_bucket_start,
-                        count = :total_count,
-                        down_count = :total_down_count,
-                        degraded_count = :total_degraded_count,
-                        response_sample_count = :total_response_samples,
-                        avg_response_time = :avg_response_time,
-                        issue_percentage = :issue_percentage,
-                        status = :status,
-                        is_up = :is_up,
-                        updated_at = :updated_at
-                    WHERE id = :keep_id
-                    """
-                ),
-                {
-                    "normalized_bucket_start": group["normalized_bucket_start"],
-                    "total_count": total_count,
-                    "total_down_count": total_down_count,
-                    "total_degraded_count": total_degraded_count,
-                    "total_response_samples": total_response_samples,
-                    "avg_response_time": avg_response_time,
-                    "issue_percentage": issue_percentage,
-                    "status": status,
-                    "is_up": 1 if status == "up" else 0,
-                    "updated_at": group["latest_updated_at"] or datetime.now(),
-                    "keep_id": group["keep_id"],
-                },
-            )
+            bucket_start,
+            totals,
+            degraded_threshold_seconds,
+            degraded_percentage_threshold,
+            now,
+        )
 
-            delete_result = connection.execute(
-                text(
-                    """
-                    DELETE FROM heartbeat_aggregates
-                    WHERE
-                        monitor_name = :monitor_name
-                        AND interval = :interval
-                        AND datetime(bucket_start) = :normalized_bucket_start
-                        AND id != :keep_id
-                    """
-                ),
-                {
-                    "monitor_name": group["monitor_name"],
-                    "interval": group["interval"],
-                    "normalized_bucket_start": group["normalized_bucket_start"],
-                    "keep_id": group["keep_id"],
-                },
-            )
-            deleted_rows += delete_result.rowcount or 0
+    for monitor_id, bucket_start in sorted(merged, key=lambda key: key[1]):
+        rows_by_monitor[names[monitor_id]].append(merged[(monitor_id, bucket_start)])
+    return rows_by_monitor
 
-        connection.commit()
-        logger.info(
-            "Merged %s duplicate aggregate groups and deleted %s rows",
-            len(duplicate_groups),
-            deleted_rows,
-        )
 
+def reevaluate_degraded_status(engine, app_config: dict) -> int:
+    """Recount degraded checks of buckets counted with another ``degraded_threshold``.
 
-def backfill_missing_aggregates(engine, app_config: dict):
-    """Backfill precomputed buckets from historical monitor records.
+    Degraded counts are re-derived from each bucket's latency sketch rather
+    than by rescanning monitor records, and the issue weight is adjusted by
+    the bucket's average sample weight per recounted check. Buckets whose
+    sketch does not cover all of their successful checks, written before
+    sketches were kept, are left unchanged.
 
-    Uses INSERT OR IGNORE so existing aggregate buckets are preserved and only
-    missing buckets from pre-upgrade history are inserted.
+    Returns:
+        int: Number of buckets updated.
     """
     degraded_threshold_seconds = app_config.get("degraded_threshold", 200) / 1000
     degraded_percentage_threshold = app_config.get("degraded_percentage_threshold", 10)
 
-    bucket_expr = {
-        "hour": "strftime('%Y-%m-%d %H:00:00', timestamp)",
-        "day": "strftime('%Y-%m-%d 00:00:00', timestamp)",
-        "week": (
-            "strftime('%Y-%m-%d 00:00:00', "
-            "datetime(timestamp, '-' || ((cast(strftime('%w', timestamp) as integer) + 6) % 7) || ' days'))"
-        ),
-    }
+    key_columns = (
+        aggregates_table.c.monitor_id,
+        aggregates_table.c.interval,
+        aggregates_table.c.bucket_start,
+    )
+    update_statement = (
+        update(aggregates_table)
+        .where(
+            aggregates_table.c.monitor_id == bindparam("key_monitor_id"),
+            aggregates_table.c.interval == bindparam("key_interval"),
+            aggregates_table.c.bucket_start == bindparam("key_bucket_start"),
+        )
+        .values(
+            degraded_count=bindparam("degraded_count"),
+            issue_weight=bindparam("issue_weight"),
+            issue_percentage=bindparam("issue_percentage"),
+            status=bindparam("status"),
+            is_up=bindparam("is_up"),
+            degraded_threshold=bindparam("degraded_threshold"),
+        )
+    )
 
+    updated = 0
+    last_key = None
     with engine.connect() as connection:
-        existing_count = connection.execute(
-            text("SELECT COUNT(1) FROM heartbeat_aggregates")
-        ).scalar()
-        if existing_count and existing_count > 0:
-            logger.info(
-                "Skipping aggregate backfill because %s aggregate rows already exist",
-                existing_count,
+        while True:
+            query = (
+                select(
+                    *key_columns,
+                    aggregates_table.c.count,
+                    aggregates_table.c.down_count,
+                    aggregates_table.c.degraded_count,
+                    aggregates_table.c.sample_weight,
+                    aggregates_table.c.issue_weight,
+                    aggregates_table.c.response_sketch,
+                )
+                .where(
+                    aggregates_table.c.response_sketch.is_not(None),
+                    func.abs(
+                        aggregates_table.c.degraded_threshold
+                        - degraded_threshold_seconds
+                    )
+                    > 1e-9,
+                )
+                .order_by(*key_columns)
+                .limit(REEVALUATE_BATCH_SIZE)
             )
-            return
-
-        for interval in AGGREGATE_INTERVALS:
-            expr = bucket_expr[interval]
-            query = text(
-                f"""
-                INSERT OR IGNORE INTO heartbeat_aggregates (
-                    monitor_name,
-                    interval,
-                    bucket_start,
-                    count,
-                    down_count,
+            if last_key is not None:
+                query = query.where(tuple_(*key_columns) > last_key)
+            rows = connection.execute(query).mappings().all()
+            if not rows:
+                break
+            last_key = tuple(rows[-1][column.name] for column in key_columns)
+
+            updates = []
+            for row in rows:
+                sketch = LatencySketch.from_bytes(row["response_sketch"])
+                if sketch.total != row["count"] - row["down_count"]:
+                    continue
+                degraded_count = sketch.count_above(degraded_threshold_seconds)
+                unit = row["sample_weight"] / row["count"] if row["count"] else 0.0
+                issue_weight = max(
+                    0.0,
+                    row["issue_weight"]
+                    + (degraded_count - row["degraded_count"]) * unit,
+                )
+                status, issue_percentage = _compute_status(
+                    row["count"],
+                    row["down_count"],
                     degraded_count,
-                    response_sample_count,
-                    avg_response_time,
-                    issue_percentage,
-                    status,
-                    is_up,
-                    updated_at
+                    degraded_percentage_threshold,
+                    row["sample_weight"],
+                    issue_weight,
+                )
+                updates.append(
+                    {
+                        "key_monitor_id": row["monitor_id"],
+                        "key_interval": row["interval"],
+                        "key_bucket_start": row["bucket_start"],
+                        "degraded_count": degraded_count,
+                        "issue_weight": issue_weight,
+                        "issue_percentage": issue_percentage,
+                        "status": status,
+                        "is_up": status == "up",
+                        "degraded_threshold": degraded_threshold_seconds,
+                    }
                 )
-                SELECT
-                    grouped.monitor_name,
-                    :interval AS interval,
-                    grouped.bucket_start,
-                    grouped.total_count,
-                    grouped.down_count,
-                    grouped.degraded_count,
-                    grouped.response_sample_count,
-                    grouped.avg_response_time,
-                    CASE
-                        WHEN grouped.total_count > 0
-                            THEN ((grouped.down_count + grouped.degraded_count) * 100.0 / grouped.total_count)
-                        ELSE 0
-                    END AS issue_percentage,
-                    CASE
-                        WHEN grouped.down_count > 0 THEN 'down'
-                        WHEN (
-                            CASE
-                                WHEN grouped.total_count > 0
-                                    THEN ((grouped.down_count + grouped.degraded_count) * 100.0 / grouped.total_count)
-                                ELSE 0
-                            END
-                        ) > :degraded_percentage_threshold THEN 'degraded'
-                        ELSE 'up'
-                    END AS status,
-                    CASE
-                        WHEN grouped.down_count = 0 AND (
-                            CASE
-                                WHEN grouped.total_count > 0
-                                    THEN ((grouped.down_count + grouped.degraded_count) * 100.0 / grouped.total_count)
-                                ELSE 0
-                            END
-                        ) <= :degraded_percentage_threshold THEN 1
-                        ELSE 0
-                    END AS is_up,
-                    CURRENT_TIMESTAMP AS updated_at
-                FROM (
-                    SELECT
-                        monitor_name,
-                        {expr} AS bucket_start,
-                        COUNT(*) AS total_count,
-                        SUM(CASE WHEN is_up = 0 THEN 1 ELSE 0 END) AS down_count,
-                        SUM(
-                            CASE
-                                WHEN is_up = 1
-                                    AND response_time IS NOT NULL
-                                    AND response_time > :degraded_threshold_seconds
-                                THEN 1
-                                ELSE 0
-                            END
-                        ) AS degraded_count,
-                        SUM(CASE WHEN response_time IS NOT NULL THEN 1 ELSE 0 END) AS response_sample_count,
-                        AVG(response_time) AS avg_response_time
-                    FROM monitor_records
-                    GROUP BY monitor_name, {expr}
-                ) AS grouped
-                """
-            )
 
-            result = connection.execute(
-                query,
-                {
-                    "interval": interval,
-                    "degraded_threshold_seconds": degraded_threshold_seconds,
-                    "degraded_percentage_threshold": degraded_percentage_threshold,
-                },
-            )
-            logger.info(
-                "Backfill interval %s inserted %s missing aggregate buckets",
-                interval,
-                result.rowcount,
-            )
+            if updates:
+                connection.execute(update_statement, updates)
+                connection.commit()
+                updated += len(updates)
 
-        connection.commit()
+    if updated:
+        logger.info(
+            "Re-evaluated %s aggregate buckets for degraded threshold %ss",
+            updated,
+            degraded_threshold_seconds,
+        )
+    return updated
@@ -1,18 +1,10 @@
-from .monitors import create_monitors_router
-from .status import create_status_router
-from .heartbeat import create_heartbeat_router
-from .config import create_config_router
-from .health import router as health_router
-from .rss import create_rss_router
-from .assets import create_assets_router
-
-
 def init_routers(monitors_config: list, app_config: dict):
     """Initialize all API routers with dependencies.
 
     Creates and registers all route handlers with their respective configuration
     dependencies, ensuring each router has access to the monitors configuration
-    and application settings.
+    and application settings. Creates the pool the read endpoints run their
+    database reads on.
 
     Args:
         monitors_config (list): List of monitor configurations containing name, url, and interval.
@@ -21,6 +13,19 @@ def init_routers(monitors_config: list, app_config: dict):
     Returns:
         list: List of initialized APIRouter instances ready to be included in the FastAPI app.
     """
+    # The routers read through the record modules, which import api.models,
+    # so importing them here keeps api.models importable on its own.
+    from .monitors import create_monitors_router
+    from .status import create_status_router
+    from .heartbeat import create_heartbeat_router
+    from .config import create_config_router
+    from .health import router as health_router
+    from .rss import create_rss_router
+    from .assets import create_assets_router
+    from .metrics import router as metrics_router
+    from .reads import configure_read_pool
+
+    configure_read_pool(app_config)
     routers = [
         create_monitors_router(monitors_config),
         create_status_router(monitors_config),
@@ -29,5 +34,6 @@ def init_routers(monitors_config: list, app_config: dict):
         create_rss_router(monitors_config),
         create_assets_router(),
         health_router,
+        metrics_router,
     ]
     return routers
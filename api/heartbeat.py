@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta
 
+from .reads import ReadPool, get_read_pool
 from .utils import aggregate_heartbeat_data
-import database
+from records import read_history
+from registry import read_monitor_ids
+from sketch import LatencySketch
 
 router = APIRouter(prefix="/api/heartbeat", tags=["Status"])
 
@@ -20,27 +23,52 @@ def create_heartbeat_router(app_config: dict):
         APIRouter: Configured router with heartbeat endpoints.
     """
 
-    valid_intervals = ["all", "hour", "day", "week"]
+    valid_intervals = ["all", "1m", "5m", "hour", "day", "week", "month"]
     default_hours_by_interval = {
         "all": 30 * 24,
+        "1m": 6,
+        "5m": 24,
         "hour": 96,
         "day": 120 * 24,
         "week": 104 * 7 * 24,
+        "month": 36 * 31 * 24,
     }
 
     def aggregate_row_to_node(row):
+        sketch = LatencySketch.from_bytes(row["response_sketch"])
         return {
-            "timestamp": row.bucket_start.isoformat(),
-            "is_up": row.is_up,
-            "status": row.status,
-            "response_time": row.avg_response_time,
-            "count": row.count,
-            "avg_response_time": row.avg_response_time,
-            "degraded_count": row.degraded_count,
-            "down_count": row.down_count,
-            "issue_percentage": row.issue_percentage,
+            "timestamp": row["bucket_start"].isoformat(),
+            "is_up": row["is_up"],
+            "status": row["status"],
+            "response_time": row["avg_response_time"],
+            "count": row["count"],
+            "avg_response_time": row["avg_response_time"],
+            "degraded_count": row["degraded_count"],
+            "down_count": row["down_count"],
+            "issue_percentage": row["issue_percentage"],
+            "avg_dns_time": row["avg_dns_time"],
+            "avg_connect_time": row["avg_connect_time"],
+            "avg_tls_time": row["avg_tls_time"],
+            "avg_ttfb": row["avg_ttfb"],
+            **sketch.percentiles(),
         }
 
+    def read_monitor_records(connection, monitor_name, since):
+        records = read_history(
+            connection,
+            read_monitor_ids(connection, [monitor_name]).values(),
+            since=since,
+        )
+        records.sort(key=lambda record: record.timestamp)
+        return records
+
+    def read_aggregates(connection, monitor_names, interval, since):
+        from aggregation import read_aggregate_rows
+
+        return read_aggregate_rows(
+            connection, monitor_names, interval, since, app_config
+        )
+
     @router.get(
         "",
         response_model=dict,
@@ -48,8 +76,11 @@ def create_heartbeat_router(app_config: dict):
         summary="Get aggregated heartbeat data for a monitor",
         description="Get heartbeat data aggregated by time interval",
     )
-    def get_aggregated_heartbeat(
-        monitor_name: str, interval: str = "all", hours: int = 24
+    async def get_aggregated_heartbeat(
+        monitor_name: str,
+        interval: str = "all",
+        hours: int = 24,
+        reads: ReadPool = Depends(get_read_pool),
     ):
         """Get aggregated heartbeat data for a specific monitor.
 
@@ -58,37 +89,29 @@ def create_heartbeat_router(app_config: dict):
 
         Args:
             monitor_name (str): Name of the monitor to query.
-            interval (str): Time interval ('all', 'hour', 'day', 'week'). Default: 'all'.
+            interval (str): Time interval ('all', '1m', '5m', 'hour', 'day', 'week',
+                'month'). Default: 'all'.
             hours (int): Number of hours to look back (default: 24).
+            reads (ReadPool): Pool the database reads run on.
 
         Returns:
             dict: Dictionary with monitor_name, interval, and aggregated heartbeat data.
 
         Raises:
-            HTTPException: 400 if invalid interval, 404 if monitor not found.
+            HTTPException: 400 if invalid interval, 404 if monitor not found, 503
+                if the database read timed out.
         """
-        from .models import MonitorRecord, HeartbeatAggregate
-
         if interval not in valid_intervals:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid interval. Must be one of: {', '.join(valid_intervals)}",
             )
 
-        db = database.SessionLocal()
-        try:
-            cutoff_time = datetime.now() - timedelta(hours=hours)
+        cutoff_time = datetime.now() - timedelta(hours=hours)
 
+        def read(connection):
             if interval == "all":
-                records = (
-                    db.query(MonitorRecord)
-                    .filter(
-                        MonitorRecord.monitor_name == monitor_name,
-                        MonitorRecord.timestamp >= cutoff_time,
-                    )
-                    .order_by(MonitorRecord.timestamp.asc())
-                    .all()
-                )
+                records = read_monitor_records(connection, monitor_name, cutoff_time)
 
                 if not records:
                     raise HTTPException(
@@ -100,26 +123,13 @@ def create_heartbeat_router(app_config: dict):
                     records, interval, app_config
                 )
             else:
-                aggregate_rows = (
-                    db.query(HeartbeatAggregate)
-                    .filter(
-                        HeartbeatAggregate.monitor_name == monitor_name,
-                        HeartbeatAggregate.interval == interval,
-                        HeartbeatAggregate.bucket_start >= cutoff_time,
-                    )
-                    .order_by(HeartbeatAggregate.bucket_start.asc())
-                    .all()
-                )
+                aggregate_rows = read_aggregates(
+                    connection, [monitor_name], interval, cutoff_time
+                )[monitor_name]
 
                 if not aggregate_rows:
-                    raw_records = (
-                        db.query(MonitorRecord)
-                        .filter(
-                            MonitorRecord.monitor_name == monitor_name,
-                            MonitorRecord.timestamp >= cutoff_time,
-                        )
-                        .order_by(MonitorRecord.timestamp.asc())
-                        .all()
+                    raw_records = read_monitor_records(
+                        connection, monitor_name, cutoff_time
                     )
 
                     if not raw_records:
@@ -140,8 +150,70 @@ def create_heartbeat_router(app_config: dict):
                 "interval": interval,
                 "heartbeat": aggregated_data,
             }
-        finally:
-            db.close()
+
+        return await reads.run(read)
+
+    @router.get(
+        "/percentiles",
+        response_model=dict,
+        status_code=200,
+        summary="Get response time percentiles for a monitor",
+        description="Get p50/p95/p99 response times over a time range",
+    )
+    async def get_response_percentiles(
+        monitor_name: str,
+        interval: str = "hour",
+        hours: int = 24,
+        reads: ReadPool = Depends(get_read_pool),
+    ):
+        """Get response time percentiles of a monitor over a time range.
+
+        Merges the latency sketches of the monitor's aggregate buckets that
+        start within the range, so percentiles are accurate to within 2%
+        without reading raw records. Only successful checks are counted.
+
+        Args:
+            monitor_name (str): Name of the monitor to query.
+            interval (str): Aggregate buckets to merge ('1m', '5m', 'hour', 'day',
+                'week', 'month'). Default: 'hour'.
+            hours (int): Number of hours to look back (default: 24).
+            reads (ReadPool): Pool the database reads run on.
+
+        Returns:
+            dict: Monitor name, interval, hours, number of checks counted and
+            the p50, p95 and p99 response times in seconds.
+
+        Raises:
+            HTTPException: 400 if invalid interval, 404 if no buckets found,
+                503 if the database read timed out.
+        """
+        aggregate_intervals = [i for i in valid_intervals if i != "all"]
+        if interval not in aggregate_intervals:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid interval. Must be one of: {', '.join(aggregate_intervals)}",
+            )
+
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        aggregate_rows = await reads.run(
+            lambda connection: read_aggregates(
+                connection, [monitor_name], interval, cutoff_time
+            )[monitor_name]
+        )
+        if not aggregate_rows:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Monitor '{monitor_name}' not found or no data available",
+            )
+
+        sketch = LatencySketch.merged(row["response_sketch"] for row in aggregate_rows)
+        return {
+            "monitor_name": monitor_name,
+            "interval": interval,
+            "hours": hours,
+            "count": sketch.total,
+            **sketch.percentiles(),
+        }
 
     @router.get(
         "/bulk",
@@ -152,27 +224,28 @@ def create_heartbeat_router(app_config: dict):
             "Get heartbeat data precomputed for multiple monitors and intervals in one request"
         ),
     )
-    def get_bulk_aggregated_heartbeat(
+    async def get_bulk_aggregated_heartbeat(
         monitor_names: str = "",
         intervals: str = "all,hour,day,week",
+        reads: ReadPool = Depends(get_read_pool),
     ):
         """Get precomputed heartbeat data for many monitors and intervals.
 
-        Uses a single database query for the maximum required lookback window,
-        then computes all requested interval aggregations in-memory.
+        Reads the stored aggregate buckets of every requested interval for all
+        monitors at once, and computes the 'all' view from raw records in-memory.
 
         Args:
             monitor_names (str): Comma-separated monitor names. Empty means all monitors.
             intervals (str): Comma-separated intervals. Defaults to all supported intervals.
+            reads (ReadPool): Pool the database reads run on.
 
         Returns:
             dict: Timestamp and a nested map keyed by monitor then interval.
 
         Raises:
-            HTTPException: 400 if interval list contains unsupported values.
+            HTTPException: 400 if interval list contains unsupported values, 503
+                if the database read timed out.
         """
-        from .models import MonitorRecord, HeartbeatAggregate
-
         requested_intervals = [i.strip() for i in intervals.split(",") if i.strip()]
         if not requested_intervals:
             requested_intervals = ["all"]
@@ -196,15 +269,11 @@ def create_heartbeat_router(app_config: dict):
             for interval in requested_intervals
         }
         now = datetime.now()
-        max_hours = max(hours_by_interval.values())
-        max_cutoff = now - timedelta(hours=max_hours)
 
-        db = database.SessionLocal()
-        try:
+        def read(connection):
             target_monitors = requested_monitor_names
             if not target_monitors:
-                rows = db.query(MonitorRecord.monitor_name).distinct().all()
-                target_monitors = sorted([row[0] for row in rows])
+                target_monitors = sorted(read_monitor_ids(connection))
 
             precomputed = {}
             for monitor_name in target_monitors:
@@ -214,49 +283,33 @@ def create_heartbeat_router(app_config: dict):
 
             intervals_without_all = [i for i in requested_intervals if i != "all"]
             if intervals_without_all and target_monitors:
-                aggregate_rows = (
-                    db.query(HeartbeatAggregate)
-                    .filter(
-                        HeartbeatAggregate.monitor_name.in_(target_monitors),
-                        HeartbeatAggregate.interval.in_(intervals_without_all),
-                        HeartbeatAggregate.bucket_start >= max_cutoff,
-                    )
-                    .order_by(
-                        HeartbeatAggregate.monitor_name.asc(),
-                        HeartbeatAggregate.interval.asc(),
-                        HeartbeatAggregate.bucket_start.asc(),
-                    )
-                    .all()
-                )
-
-                cutoff_by_interval = {
-                    interval: now - timedelta(hours=hours_by_interval[interval])
-                    for interval in intervals_without_all
-                }
-
-                for row in aggregate_rows:
-                    if row.bucket_start < cutoff_by_interval[row.interval]:
-                        continue
-                    precomputed[row.monitor_name][row.interval].append(
-                        aggregate_row_to_node(row)
-                    )
+                for interval in intervals_without_all:
+                    cutoff = now - timedelta(hours=hours_by_interval[interval])
+                    for monitor_name, aggregate_rows in read_aggregates(
+                        connection, target_monitors, interval, cutoff
+                    ).items():
+                        precomputed[monitor_name][interval] = [
+                            aggregate_row_to_node(row) for row in aggregate_rows
+                        ]
 
             if "all" in requested_intervals and target_monitors:
                 all_cutoff = now - timedelta(hours=hours_by_interval["all"])
-                raw_query = db.query(MonitorRecord).filter(
-                    MonitorRecord.timestamp >= all_cutoff,
-                    MonitorRecord.monitor_name.in_(target_monitors),
+                monitor_names = {
+                    monitor_id: monitor_name
+                    for monitor_name, monitor_id in read_monitor_ids(
+                        connection, target_monitors
+                    ).items()
+                }
+                all_records = read_history(connection, monitor_names, since=all_cutoff)
+                all_records.sort(
+                    key=lambda record: (record.monitor_id, record.timestamp)
                 )
 
-                all_records = raw_query.order_by(
-                    MonitorRecord.monitor_name.asc(), MonitorRecord.timestamp.asc()
-                ).all()
-
                 records_by_monitor = {}
                 for record in all_records:
-                    records_by_monitor.setdefault(record.monitor_name, []).append(
-                        record
-                    )
+                    records_by_monitor.setdefault(
+                        monitor_names[record.monitor_id], []
+                    ).append(record)
 
                 for monitor_name in target_monitors:
                     monitor_records = records_by_monitor.get(monitor_name, [])
@@ -269,7 +322,7 @@ def create_heartbeat_router(app_config: dict):
                 "interval_hours": hours_by_interval,
                 "data": precomputed,
             }
-        finally:
-            db.close()
+
+        return await reads.run(read)
 
     return router
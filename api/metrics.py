@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+
+from .reads import get_read_pool
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get(
+    "",
+    response_model=dict,
+    status_code=200,
+    summary="Monitoring service metrics",
+    description="Get runtime counters of the monitoring service",
+)
+def get_metrics():
+    """Get monitoring service metrics.
+
+    Returns scheduler counters such as dispatched and skipped checks and
+    scheduling lag for the monitoring service running in this process, and
+    the counters of the pool API reads run on. With probe shards, scheduler
+    and probe counters are listed per shard.
+
+    Returns:
+        dict: Runtime counters keyed by subsystem.
+    """
+    import monitor
+
+    return {**monitor.get_monitor_stats(), "api_reads": get_read_pool().stats()}
@@ -5,56 +5,198 @@ from sqlalchemy import (
     DateTime,
     Float,
     Boolean,
-    UniqueConstraint,
+    Index,
+    LargeBinary,
+    Text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel, Field
 from typing import Optional, List
 
+from storage.types import EpochMillis, Milliseconds
+
 Base = declarative_base()
 
 
+class Monitor(Base):
+    """SQLAlchemy ORM model for the monitors records and aggregates belong to.
+
+    Gives each monitor name seen in a check result a small integer id, which
+    records and aggregate buckets store instead of the name.
+    """
+
+    __tablename__ = "monitors"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class MonitorRecord(Base):
     """SQLAlchemy ORM model for monitor records.
 
     Represents a single monitor status check stored in the database, including
-    timestamp, HTTP status code, availability, and response time.
+    timestamp, HTTP status code, availability, and response time, with the
+    DNS, connect, TLS handshake and time-to-first-byte phases of the request
+    when they were measured. ``check_interval`` is the number of seconds until
+    the monitor's next check, the span of time the sample stands for.
+    ``attempts`` holds the other attempts of a check confirmed by retries as a
+    JSON list of sub-samples. ``cert_expires_at`` is the certificate expiry
+    seen by TLS monitors.
+
+    Records are clustered by monitor and time, so reading a monitor's history
+    is one sequential range scan. Timestamps are stored as epoch milliseconds
+    and durations as whole milliseconds, but read back as ``datetime`` and
+    seconds. ``id`` is assigned by the record writer in commit order.
+
+    ``monitor_name`` is not stored; it is set on records created from check
+    results, and the writer resolves it to ``monitor_id``.
     """
 
-    __tablename__ = "monitor_records"
-    id = Column(Integer, primary_key=True, index=True)
-    monitor_name = Column(String, index=True)
-    timestamp = Column(DateTime, index=True)
+    __tablename__ = "monitor_checks"
+    __table_args__ = (
+        Index("idx_monitor_checks_id", "id", unique=True),
+        Index("idx_monitor_checks_timestamp", "timestamp"),
+        {"sqlite_with_rowid": False},
+    )
+
+    monitor_id = Column(Integer, primary_key=True)
+    timestamp = Column(EpochMillis, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
     status_code = Column(Integer, nullable=True)
     is_up = Column(Boolean)
-    response_time = Column(Float, nullable=True)
+    response_time = Column(Milliseconds, nullable=True)
+    dns_time = Column(Milliseconds, nullable=True)
+    connect_time = Column(Milliseconds, nullable=True)
+    tls_time = Column(Milliseconds, nullable=True)
+    ttfb = Column(Milliseconds, nullable=True)
+    check_interval = Column(Milliseconds, nullable=True)
+    attempts = Column(Text, nullable=True)
+    cert_expires_at = Column(EpochMillis, nullable=True)
+
+    monitor_name = None
 
 
 class HeartbeatAggregate(Base):
-    """Precomputed aggregate heartbeat bucket for fast interval queries."""
+    """Precomputed aggregate heartbeat bucket for fast interval queries.
+
+    Issue percentage and average response time are weighted by the time each
+    sample stands for (``sample_weight``, ``issue_weight`` and
+    ``response_weight``, in seconds), so buckets stay accurate when a monitor's
+    check frequency changes within them.
+
+    ``response_sketch`` is a serialized ``LatencySketch`` of the response times
+    of successful checks, giving percentiles for the bucket and any range of
+    buckets. ``degraded_threshold`` is the threshold in seconds that
+    ``degraded_count`` was counted with.
 
-    __tablename__ = "heartbeat_aggregates"
+    Buckets are keyed by monitor, interval and epoch millisecond start, so
+    every bucket has exactly one row and a monitor's buckets of an interval
+    are stored together.
+    """
+
+    __tablename__ = "aggregate_buckets"
     __table_args__ = (
-        UniqueConstraint(
-            "monitor_name", "interval", "bucket_start", name="uq_heartbeat_aggregate"
-        ),
+        Index("idx_aggregate_buckets_interval_start", "interval", "bucket_start"),
+        {"sqlite_with_rowid": False},
     )
 
-    id = Column(Integer, primary_key=True, index=True)
-    monitor_name = Column(String, index=True, nullable=False)
-    interval = Column(String, index=True, nullable=False)
-    bucket_start = Column(DateTime, index=True, nullable=False)
+    monitor_id = Column(Integer, primary_key=True)
+    interval = Column(String, primary_key=True)
+    bucket_start = Column(EpochMillis, primary_key=True)
     count = Column(Integer, nullable=False, default=0)
     down_count = Column(Integer, nullable=False, default=0)
     degraded_count = Column(Integer, nullable=False, default=0)
     response_sample_count = Column(Integer, nullable=False, default=0)
     avg_response_time = Column(Float, nullable=True)
+    sample_weight = Column(Float, nullable=False, default=0.0)
+    issue_weight = Column(Float, nullable=False, default=0.0)
+    response_weight = Column(Float, nullable=False, default=0.0)
+    phase_sample_count = Column(Integer, nullable=False, default=0)
+    avg_dns_time = Column(Float, nullable=True)
+    avg_connect_time = Column(Float, nullable=True)
+    avg_tls_time = Column(Float, nullable=True)
+    avg_ttfb = Column(Float, nullable=True)
+    response_sketch = Column(LargeBinary, nullable=True)
+    degraded_threshold = Column(Float, nullable=True)
     issue_percentage = Column(Float, nullable=False, default=0.0)
     status = Column(String, nullable=False, default="up")
     is_up = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(EpochMillis, nullable=False)
+
+
+class AggregateWatermark(Base):
+    """Highest monitor record id already counted in ``aggregate_buckets``.
+
+    Aggregate buckets are flushed from memory together with this watermark,
+    so records above it are the tail to re-derive after a crash.
+    """
+
+    __tablename__ = "aggregate_watermarks"
+    name = Column(String, primary_key=True)
+    record_id = Column(Integer, nullable=False)
     updated_at = Column(DateTime, nullable=False)
 
 
+class RollupWatermark(Base):
+    """Progress of compacting one aggregate interval into a coarser one.
+
+    Every ``child`` bucket starting before ``compacted_until`` is included in
+    its ``parent`` bucket. Later child buckets are added by the next
+    compaction.
+    """
+
+    __tablename__ = "rollup_watermarks"
+    child = Column(String, primary_key=True)
+    parent = Column(String, primary_key=True)
+    compacted_until = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class AggregateBackfillState(Base):
+    """Progress of backfilling a monitor's missing aggregate buckets.
+
+    Records of the monitor before ``backfilled_until`` have been checked and
+    their missing buckets filled in. ``records_scanned`` and
+    ``buckets_inserted`` are totals over all backfill runs.
+    """
+
+    __tablename__ = "aggregate_backfill_state"
+    monitor_name = Column(String, primary_key=True)
+    backfilled_until = Column(DateTime, nullable=False)
+    records_scanned = Column(Integer, nullable=False, default=0)
+    buckets_inserted = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class LeaderLease(Base):
+    """Lock row naming the process currently allowed to run a singleton task.
+
+    A holder keeps the lease by renewing ``expires_at`` before it passes; any
+    other process may take over an expired lease. Times are Unix timestamps.
+    """
+
+    __tablename__ = "leader_leases"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+
+class SchemaVersion(Base):
+    """Migration applied to the database, see ``migrate.run_migrations``.
+
+    The row is written in the transaction that applies the migration. A
+    migration moving data in batches keeps ``completed_at`` empty until its
+    last batch, and ``checkpoint`` holds the JSON progress it resumes from.
+    """
+
+    __tablename__ = "schema_version"
+    version = Column(String, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+    checkpoint = Column(Text, nullable=True)
+
+
 class MonitorInfo(BaseModel):
     """Monitor information model.
 
@@ -82,6 +224,25 @@ class StatusRecord(BaseModel):
     response_time: Optional[float] = Field(
         None, description="Response time in seconds (null if timeout/error)"
     )
+    dns_time: Optional[float] = Field(
+        None, description="DNS resolution time in seconds (null if not measured)"
+    )
+    connect_time: Optional[float] = Field(
+        None, description="TCP connect time in seconds (null if connection reused)"
+    )
+    tls_time: Optional[float] = Field(
+        None, description="TLS handshake time in seconds (null if not measured)"
+    )
+    ttfb: Optional[float] = Field(
+        None, description="Time to first byte in seconds (null if not measured)"
+    )
+    attempts: Optional[List[dict]] = Field(
+        None,
+        description="Other attempts of a check confirmed by retries (null if none)",
+    )
+    cert_expires_at: Optional[str] = Field(
+        None, description="ISO format certificate expiry (TLS monitors only)"
+    )
 
     class Config:
         json_schema_extra = {
@@ -90,6 +251,10 @@ class StatusRecord(BaseModel):
                 "is_up": True,
                 "status_code": 200,
                 "response_time": 0.234,
+                "dns_time": 0.012,
+                "connect_time": 0.021,
+                "tls_time": 0.045,
+                "ttfb": 0.151,
             }
         }
 
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy.engine import Connection
+
+import database
+from counters import TimingCounter
+
+DEFAULT_READ_TIMEOUT_MS = 10000
+
+T = TypeVar("T")
+
+
+class ReadPool:
+    """Threads that run the database reads of API requests.
+
+    Async handlers await ``run`` with a function of a reader connection,
+    which runs on one of ``db_reader_pool_size`` threads of the pool. Each
+    thread holds at most one connection of the reader engine, so reads never
+    wait for a connection, and they no longer take the threads Starlette runs
+    sync handlers on. Reads beyond the pool size wait for a thread.
+
+    A read that has not finished ``api_read_timeout`` milliseconds after it
+    was requested, or whose request is cancelled, fails with 503: a read
+    still waiting is dropped and a running statement is interrupted, so a
+    slow query does not hold a thread for the requests behind it.
+    """
+
+    def __init__(self, app_config: dict):
+        """Create a read pool.
+
+        Args:
+            app_config (dict): Application configuration. Reads
+                ``api_read_timeout``; the pool has as many threads as the
+                reader engine keeps connections, see ``db_reader_pool_size``.
+        """
+        self.size = max(1, database.backend.reader_pool_size)
+        self.timeout = (
+            app_config.get("api_read_timeout", DEFAULT_READ_TIMEOUT_MS) / 1000
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.size, thread_name_prefix="api-read"
+        )
+        self._lock = threading.Lock()
+        self._running: Dict[object, object] = {}
+        self._pending = 0
+        self._reads = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._wait = TimingCounter()
+        self._duration = TimingCounter()
+
+    def _read(
+        self, read: Callable[[Connection], T], token: object, requested: float
+    ) -> T:
+        started = time.perf_counter()
+        try:
+            with database.read_engine.connect() as connection:
+                with self._lock:
+                    self._wait.add(started - requested)
+                    self._running[token] = connection.connection.driver_connection
+                try:
+                    return read(connection)
+                finally:
+                    with self._lock:
+                        del self._running[token]
+        except HTTPException:
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._duration.add(time.perf_counter() - started)
+
+    def _interrupt(self, token: object):
+        with self._lock:
+            driver_connection = self._running.get(token)
+            if driver_connection is not None:
+                database.backend.interrupt(driver_connection)
+
+    async def run(self, read: Callable[[Connection], T]) -> T:
+        """Run ``read`` with a reader connection on a thread of the pool.
+
+        Args:
+            read (Callable): Reads and returns the response data; exceptions
+                it raises, like ``HTTPException``, are raised here.
+
+        Returns:
+            What ``read`` returns.
+
+        Raises:
+            HTTPException: 503 if the read did not finish within
+                ``api_read_timeout``.
+        """
+        loop = asyncio.get_running_loop()
+        token = object()
+        self._reads += 1
+        self._pending += 1
+        future = loop.run_in_executor(
+            self._executor, self._read, read, token, time.perf_counter()
+        )
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._interrupt(token)
+            raise HTTPException(
+                status_code=503,
+                detail="Database read timed out",
+                headers={"Retry-After": "1"},
+            ) from None
+        except asyncio.CancelledError:
+            self._cancelled += 1
+            self._interrupt(token)
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        """Return the size, load and counters of the pool.
+
+        Returns:
+            dict: Threads, reads running and waiting for a thread, reads
+            requested, failed, timed out and cancelled, the timeout in
+            seconds, and wait and read latency in seconds.
+        """
+        with self._lock:
+            running = len(self._running)
+            wait = self._wait.as_dict()
+            duration = self._duration.as_dict()
+        return {
+            "threads": self.size,
+            "running": running,
+            "waiting": max(0, self._pending - running),
+            "reads": self._reads,
+            "failed": self._failed,
+            "timeouts": self._timeouts,
+            "cancelled": self._cancelled,
+            "timeout": self.timeout,
+            "wait": wait,
+            "duration": duration,
+        }
+
+
+_read_pool: Optional[ReadPool] = None
+
+
+def configure_read_pool(app_config: dict):
+    """Create the read pool of this process from application configuration."""
+    global _read_pool
+    _read_pool = ReadPool(app_config)
+
+
+def get_read_pool() -> ReadPool:
+    """Return the read pool of this process, as a FastAPI dependency."""
+    global _read_pool
+    if _read_pool is None:
+        _read_pool = ReadPool({})
+    return _read_pool
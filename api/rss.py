@@ -1,8 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from fastapi.responses import Response
 from datetime import timezone
 
-import database
+from sqlalchemy import select
+
+from .reads import ReadPool, get_read_pool
+from records import record_tables, records_table
+from registry import read_monitor_names
+
+FEED_SIZE = 100
 
 router = APIRouter(tags=["RSS"])
 
@@ -26,35 +32,49 @@ def create_rss_router(monitors_config: list):
         summary="Get RSS feed",
         description="Get RSS feed of monitor status updates",
     )
-    def get_rss_feed():
+    async def get_rss_feed(reads: ReadPool = Depends(get_read_pool)):
         """Get RSS feed of monitor status updates.
 
         Returns an RSS feed containing recent status changes for all monitors,
         fetching the 100 most recent status records from the database.
 
+        Args:
+            reads (ReadPool): Pool the database reads run on.
+
         Returns:
             Response: RSS feed as XML with media type application/rss+xml.
+
+        Raises:
+            HTTPException: 503 if the database read timed out.
         """
         from feedgen.feed import FeedGenerator
-        from .models import MonitorRecord
 
-        db = database.SessionLocal()
-        try:
+        def read(connection):
             fg = FeedGenerator()
             fg.id("http://localhost")
             fg.title("Status Feed")
             fg.link(href="http://localhost", rel="alternate")
             fg.description("Status updates for all monitors")
 
-            all_records = (
-                db.query(MonitorRecord)
-                .order_by(MonitorRecord.timestamp.desc())
-                .limit(100)
-                .all()
-            )
-
+            all_records = []
+            partitioned = 0
+            # Partitions come newest month first, so once they gave a full
+            # feed, older months cannot add to it.
+            for table in record_tables(connection, newest_first=True):
+                rows = connection.execute(
+                    select(table).order_by(table.c.timestamp.desc()).limit(FEED_SIZE)
+                ).all()
+                all_records.extend(rows)
+                if table is not records_table:
+                    partitioned += len(rows)
+                    if partitioned >= FEED_SIZE:
+                        break
+            all_records.sort(key=lambda record: record.timestamp, reverse=True)
+            del all_records[FEED_SIZE:]
+
+            monitor_names = read_monitor_names(connection)
             for record in all_records:
-                monitor_name = record.monitor_name
+                monitor_name = monitor_names[record.monitor_id]
                 status_text = "UP" if record.is_up else "DOWN"
 
                 monitor_config = next(
@@ -80,7 +100,7 @@ def create_rss_router(monitors_config: list):
             return Response(
                 content=rss_str, media_type="application/rss+xml; charset=utf-8"
             )
-        finally:
-            db.close()
+
+        return await reads.run(read)
 
     return router
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta
 
 from .models import AllStatusResponse
-import database
+from .reads import ReadPool, get_read_pool
+from records import read_history
+from registry import read_monitor_ids
 
 router = APIRouter(prefix="/api/status", tags=["Status"])
 
@@ -27,7 +31,11 @@ def create_status_router(monitors_config: list):
         summary="Get monitor status history",
         description="Get detailed status history for a specific monitor",
     )
-    def get_monitor_status(monitor_name: str, hours: int = 24):
+    async def get_monitor_status(
+        monitor_name: str,
+        hours: int = 24,
+        reads: ReadPool = Depends(get_read_pool),
+    ):
         """Get status history for a specific monitor.
 
         Retrieves detailed status history for the specified monitor over the
@@ -36,27 +44,24 @@ def create_status_router(monitors_config: list):
         Args:
             monitor_name (str): Name of the monitor to query.
             hours (int): Number of hours to look back (default: 24).
+            reads (ReadPool): Pool the database reads run on.
 
         Returns:
             dict: Dictionary with monitor_name and list of status records.
 
         Raises:
-            HTTPException: 404 if monitor not found or no data available.
+            HTTPException: 404 if monitor not found or no data available, 503
+                if the database read timed out.
         """
-        from .models import MonitorRecord
-
-        db = database.SessionLocal()
-        try:
-            cutoff_time = datetime.now() - timedelta(hours=hours)
-            records = (
-                db.query(MonitorRecord)
-                .filter(
-                    MonitorRecord.monitor_name == monitor_name,
-                    MonitorRecord.timestamp >= cutoff_time,
-                )
-                .order_by(MonitorRecord.timestamp.desc())
-                .all()
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+
+        def read(connection):
+            records = read_history(
+                connection,
+                read_monitor_ids(connection, [monitor_name]).values(),
+                since=cutoff_time,
             )
+            records.sort(key=lambda record: record.timestamp, reverse=True)
 
             if not records:
                 raise HTTPException(
@@ -71,12 +76,20 @@ def create_status_router(monitors_config: list):
                         "status_code": r.status_code,
                         "is_up": r.is_up,
                         "response_time": r.response_time,
+                        "dns_time": r.dns_time,
+                        "connect_time": r.connect_time,
+                        "tls_time": r.tls_time,
+                        "ttfb": r.ttfb,
+                        "attempts": json.loads(r.attempts) if r.attempts else None,
+                        "cert_expires_at": (
+                            r.cert_expires_at.isoformat() if r.cert_expires_at else None
+                        ),
                     }
                     for r in records
                 ],
             }
-        finally:
-            db.close()
+
+        return await reads.run(read)
 
     @router.get(
         "",
@@ -85,7 +98,7 @@ def create_status_router(monitors_config: list):
         summary="Get all monitors status",
         description="Get current status and history for all configured monitors",
     )
-    def get_all_status(hours: int = 24):
+    async def get_all_status(hours: int = 24, reads: ReadPool = Depends(get_read_pool)):
         """Get current status and history for all monitors.
 
         Returns the current status and detailed history for all configured monitors
@@ -93,27 +106,30 @@ def create_status_router(monitors_config: list):
 
         Args:
             hours (int): Number of hours to look back (default: 24).
+            reads (ReadPool): Pool the database reads run on.
 
         Returns:
             AllStatusResponse: Response containing timestamp and all monitors status.
+
+        Raises:
+            HTTPException: 503 if the database read timed out.
         """
-        from .models import MonitorRecord
+        cutoff_time = datetime.now() - timedelta(hours=hours)
 
-        db = database.SessionLocal()
-        try:
-            cutoff_time = datetime.now() - timedelta(hours=hours)
+        def read(connection):
+            monitor_ids = read_monitor_ids(
+                connection, [monitor["name"] for monitor in monitors_config]
+            )
 
             monitors_status = []
             for monitor in monitors_config:
-                records = (
-                    db.query(MonitorRecord)
-                    .filter(
-                        MonitorRecord.monitor_name == monitor["name"],
-                        MonitorRecord.timestamp >= cutoff_time,
-                    )
-                    .order_by(MonitorRecord.timestamp.asc())
-                    .all()
+                monitor_id = monitor_ids.get(monitor["name"])
+                records = read_history(
+                    connection,
+                    [] if monitor_id is None else [monitor_id],
+                    since=cutoff_time,
                 )
+                records.sort(key=lambda record: record.timestamp)
 
                 latest = None
                 if records:
@@ -133,6 +149,10 @@ def create_status_router(monitors_config: list):
                             "is_up": r.is_up,
                             "status_code": r.status_code,
                             "response_time": r.response_time,
+                            "dns_time": r.dns_time,
+                            "connect_time": r.connect_time,
+                            "tls_time": r.tls_time,
+                            "ttfb": r.ttfb,
                         }
                         for r in records
                     ],
@@ -143,7 +163,7 @@ def create_status_router(monitors_config: list):
                 "timestamp": datetime.now().isoformat(),
                 "monitors": monitors_status,
             }
-        finally:
-            db.close()
+
+        return await reads.run(read)
 
     return router
@@ -1,7 +1,7 @@
-from datetime import timedelta
 from typing import List
 
 from .models import MonitorRecord
+from sketch import LatencySketch
 
 
 def aggregate_heartbeat_data(
@@ -12,12 +12,14 @@ def aggregate_heartbeat_data(
 
     Args:
         records: List of monitor records
-        interval: Time interval ('all', 'hour', 'day', 'week')
+        interval: Time interval ('all', '1m', '5m', 'hour', 'day', 'week', 'month')
         app_config: Application configuration
 
     Returns:
         List of aggregated heartbeat nodes with status and metadata
     """
+    from aggregation import AGGREGATE_INTERVALS, get_bucket_start, record_weight
+
     if not records:
         return []
 
@@ -40,19 +42,18 @@ def aggregate_heartbeat_data(
                     "avg_response_time": r.response_time,
                     "degraded_count": 1 if is_degraded else 0,
                     "down_count": 0 if r.is_up else 1,
+                    "dns_time": r.dns_time,
+                    "connect_time": r.connect_time,
+                    "tls_time": r.tls_time,
+                    "ttfb": r.ttfb,
                 }
             )
         return aggregated
 
     grouped: dict = {}
     for r in records:
-        if interval == "hour":
-            start = r.timestamp.replace(minute=0, second=0, microsecond=0)
-        elif interval == "day":
-            start = r.timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif interval == "week":
-            start = r.timestamp - timedelta(days=r.timestamp.weekday())
-            start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if interval in AGGREGATE_INTERVALS:
+            start = get_bucket_start(r.timestamp, interval)
         else:
             start = r.timestamp
 
@@ -75,11 +76,26 @@ def aggregate_heartbeat_data(
         up_count = sum(1 for r in recs if r.is_up)
         down_count = len(recs) - up_count
 
-        response_times = [r.response_time for r in recs if r.response_time is not None]
+        response_records = [r for r in recs if r.response_time is not None]
+        response_weight = sum(record_weight(r) for r in response_records)
         avg_response_time = (
-            sum(response_times) / len(response_times) if response_times else None
+            sum(r.response_time * record_weight(r) for r in response_records)
+            / response_weight
+            if response_records
+            else None
         )
 
+        phase_records = [r for r in recs if r.ttfb is not None]
+        phase_averages = {
+            f"avg_{phase}": (
+                sum(getattr(r, phase) or 0.0 for r in phase_records)
+                / len(phase_records)
+                if phase_records
+                else None
+            )
+            for phase in ("dns_time", "connect_time", "tls_time", "ttfb")
+        }
+
         degraded_count = sum(
             1
             for r in recs
@@ -88,8 +104,19 @@ def aggregate_heartbeat_data(
             and r.response_time > degraded_threshold
         )
 
-        total_issues = down_count + degraded_count
-        issue_percentage = (total_issues / len(recs)) * 100 if recs else 0
+        sketch = LatencySketch()
+        for r in response_records:
+            if r.is_up:
+                sketch.add(r.response_time)
+
+        sample_weight = sum(record_weight(r) for r in recs)
+        issue_weight = sum(
+            record_weight(r)
+            for r in recs
+            if not r.is_up
+            or (r.response_time is not None and r.response_time > degraded_threshold)
+        )
+        issue_percentage = (issue_weight / sample_weight) * 100 if recs else 0
 
         if down_count > 0:
             status = "down"
@@ -109,6 +136,8 @@ def aggregate_heartbeat_data(
                 "degraded_count": degraded_count,
                 "down_count": down_count,
                 "issue_percentage": issue_percentage,
+                **phase_averages,
+                **sketch.percentiles(),
             }
         )
 
@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Boolean, String, delete, func, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+import database
+from counters import TimingCounter
+from records import read_records, record_tables, records_table
+from retention import month_coverage
+from storage.columnar import BOOL, INT, TEXT, ArchiveFile
+from storage.partitions import month_of, next_month
+from watermarks import read_aggregate_watermark
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_INTERVAL_MS = 3600000
+DEFAULT_ARCHIVE_BATCH_SIZE = 2000
+DEFAULT_ARCHIVE_BATCH_PAUSE_MS = 50
+
+COLUMN_NAMES = [column.name for column in records_table.columns]
+TIMESTAMP_INDEX = COLUMN_NAMES.index("timestamp")
+ID_INDEX = COLUMN_NAMES.index("id")
+
+
+def _column_kind(column) -> str:
+    if isinstance(column.type, Boolean):
+        return BOOL
+    if isinstance(column.type, String):
+        return TEXT
+    return INT
+
+
+ARCHIVE_KINDS = {column.name: _column_kind(column) for column in records_table.columns}
+
+
+def stored_columns(table) -> list:
+    """Return the columns of a records table as stored, without type conversion.
+
+    Timestamps and durations come back as integer milliseconds.
+    """
+    return [
+        (
+            type_coerce(column, column.type.impl).label(column.name)
+            if isinstance(column.type, TypeDecorator)
+            else column
+        )
+        for column in table.columns
+    ]
+
+
+def archive_after(app_config: dict) -> Optional[timedelta]:
+    """Return how old a month must be to be archived, ``None`` when off.
+
+    Raises:
+        ValueError: If ``archive_after_days`` is not a positive number.
+    """
+    days = app_config.get("archive_after_days")
+    if days is None:
+        return None
+    if not isinstance(days, (int, float)) or days <= 0:
+        raise ValueError("archive_after_days must be a positive number of days")
+    return timedelta(days=days)
+
+
+class RecordArchiver:
+    """Background compaction of closed months of raw records into the archive.
+
+    Every ``archive_interval`` milliseconds, each month that ended more than
+    ``archive_after_days`` ago is written to a columnar archive file, see
+    ``storage.columnar.RecordArchive``, and then removed from the records
+    tables: its partition file is deleted, and its rows in
+    ``monitor_checks`` are deleted ``archive_batch_size`` at a time with a
+    pause of ``archive_batch_pause`` milliseconds in between.
+
+    A month is only archived once the aggregates include all its records,
+    since the backfill does not read the archive; until then it waits. If
+    archiving stops after the file is written, the next run writes it again
+    with the records left in the tables, so nothing is lost or duplicated.
+    """
+
+    def __init__(self, writer, app_config: dict, migrations=None):
+        """Create an archiver.
+
+        Args:
+            writer (RecordWriter): Writer whose aggregate recovery must finish
+                before the watermark is read.
+            app_config (dict): Application configuration. Reads
+                ``archive_after_days``, ``archive_interval``,
+                ``archive_batch_size`` and ``archive_batch_pause``.
+            migrations (OnlineMigrations, optional): Background migrations,
+                which may still add legacy records to closed months and have
+                to be done first.
+
+        Raises:
+            ValueError: If ``archive_after_days`` is invalid.
+        """
+        self.writer = writer
+        self.migrations = migrations
+        self.archive_after = archive_after(app_config)
+        self.interval = (
+            app_config.get("archive_interval", DEFAULT_ARCHIVE_INTERVAL_MS) / 1000
+        )
+        self.batch_size = max(
+            1, int(app_config.get("archive_batch_size", DEFAULT_ARCHIVE_BATCH_SIZE))
+        )
+        self.batch_pause = (
+            app_config.get("archive_batch_pause", DEFAULT_ARCHIVE_BATCH_PAUSE_MS) / 1000
+        )
+        self._stopping = False
+        self._status = "waiting"
+        self._runs = 0
+        self._months_archived = 0
+        self._archived = 0
+        self._kept_uncovered = 0
+        self._last_run: Optional[datetime] = None
+        self._last_duration: Optional[float] = None
+        self._last_archived = 0
+        self._batch_latency = TimingCounter()
+        self._month_latency = TimingCounter()
+
+    def _delete_batch(self, statement):
+        started = time.perf_counter()
+        with database.engine.begin() as connection:
+            connection.execute(statement)
+        self._batch_latency.add(time.perf_counter() - started)
+        if self.batch_pause:
+            time.sleep(self.batch_pause)
+
+    def _months(self, cutoff: datetime) -> List[date]:
+        """Return the months with records in the tables that ended before ``cutoff``."""
+        months: Set[date] = set()
+        partitions = database.backend.partitions
+        if partitions is not None:
+            months.update(partitions.months())
+        with database.engine.connect() as connection:
+            oldest = connection.execute(
+                select(func.min(records_table.c.timestamp)).where(
+                    records_table.c.timestamp < cutoff
+                )
+            ).scalar()
+        if oldest is not None:
+            month = month_of(oldest)
+            while month < month_of(cutoff):
+                months.add(month)
+                month = next_month(month)
+        return sorted(
+            month
+            for month in months
+            if datetime.combine(next_month(month), datetime.min.time()) <= cutoff
+        )
+
+    def _blocks(
+        self,
+        connection,
+        month: date,
+        monitor_ids: List[int],
+        archived: Optional[ArchiveFile],
+    ) -> Iterator[Tuple[int, Dict[str, list]]]:
+        """Yield the stored values of each monitor's records in ``month``.
+
+        Records already in ``archived``, an earlier archive of the month, are
+        kept alongside those in the tables.
+        """
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(next_month(month), datetime.min.time())
+        for monitor_id in monitor_ids:
+            rows = [
+                tuple(row)
+                for row in read_records(
+                    connection,
+                    lambda table: select(*stored_columns(table)).where(
+                        table.c.monitor_id == monitor_id,
+                        table.c.timestamp >= start,
+                        table.c.timestamp < end,
+                    ),
+                    since=start,
+                    until=end,
+                )
+            ]
+            earlier = archived.read(monitor_id) if archived is not None else None
+            if earlier is not None:
+                ids = {row[ID_INDEX] for row in rows}
+                rows.extend(
+                    row
+                    for row in zip(*(earlier[name] for name in COLUMN_NAMES))
+                    if row[ID_INDEX] not in ids
+                )
+            rows.sort(key=lambda row: (row[TIMESTAMP_INDEX], row[ID_INDEX]))
+            yield monitor_id, {
+                name: [row[index] for row in rows]
+                for index, name in enumerate(COLUMN_NAMES)
+            }
+
+    def _delete_month(self, month: date):
+        """Delete the records of ``month`` from the records tables."""
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(next_month(month), datetime.min.time())
+        while not self._stopping:
+            with database.engine.connect() as connection:
+                ids = (
+                    connection.execute(
+                        select(records_table.c.id)
+                        .where(
+                            records_table.c.timestamp >= start,
+                            records_table.c.timestamp < end,
+                        )
+                        .limit(self.batch_size)
+                    )
+                    .scalars()
+                    .all()
+                )
+            if not ids:
+                break
+            self._delete_batch(delete(records_table).where(records_table.c.id.in_(ids)))
+        partitions = database.backend.partitions
+        if not self._stopping and partitions is not None:
+            if month in partitions.months():
+                partitions.remove(month)
+
+    def archive_month(self, month: date, watermark: int) -> Tuple[int, int]:
+        """Move the records of ``month`` from the tables to the archive.
+
+        Returns:
+            tuple: Records archived and records left in the tables because
+            the aggregates do not include them yet.
+        """
+        archive = database.backend.archive
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(next_month(month), datetime.min.time())
+        counts: Dict[int, int] = {}
+        uncovered = 0
+        with database.engine.connect() as connection:
+            for table in record_tables(connection, start, end):
+                table_counts, table_uncovered = month_coverage(
+                    connection, table, month, watermark
+                )
+                for monitor_id, count in table_counts.items():
+                    counts[monitor_id] = counts.get(monitor_id, 0) + count
+                uncovered += table_uncovered
+        if not counts:
+            return 0, 0
+        if uncovered:
+            return 0, uncovered
+
+        started = time.perf_counter()
+        archived = archive.open(month)
+        monitor_ids = set(counts)
+        if archived is not None:
+            monitor_ids.update(archived.blocks)
+        with database.engine.connect() as connection:
+            archive.write(
+                month,
+                ARCHIVE_KINDS,
+                self._blocks(connection, month, sorted(monitor_ids), archived),
+            )
+            if database.backend.partitions is not None:
+                database.backend.partitions.attach(connection, [])
+        self._delete_month(month)
+        records = sum(counts.values())
+        self._month_latency.add(time.perf_counter() - started)
+        self._months_archived += 1
+        self._archived += records
+        logger.info(
+            f"Archived {records} records of {month:%Y-%m} into "
+            f"{os.path.getsize(archive.path(month))} bytes"
+        )
+        return records, 0
+
+    def archive(self) -> int:
+        """Archive every month past ``archive_after_days`` once.
+
+        Returns:
+            int: Number of records archived.
+        """
+        started = time.perf_counter()
+        now = datetime.now()
+        with database.engine.connect() as connection:
+            watermark = read_aggregate_watermark(connection) or 0
+        archived = kept = 0
+        for month in self._months(now - self.archive_after):
+            if self._stopping:
+                break
+            month_archived, month_kept = self.archive_month(month, watermark)
+            archived += month_archived
+            kept += month_kept
+        self._runs += 1
+        self._kept_uncovered = kept
+        self._last_run = now
+        self._last_duration = time.perf_counter() - started
+        self._last_archived = archived
+        return archived
+
+    async def run(self):
+        """Archive every ``archive_interval`` until cancelled.
+
+        Does nothing without ``archive_after_days``. Errors are logged and
+        retried at the next interval.
+        """
+        if self.archive_after is None or database.backend.archive is None:
+            self._status = "disabled"
+            return
+        await self.writer.ready.wait()
+        if self.migrations is not None:
+            await self.migrations.done.wait()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._status = "archiving"
+                try:
+                    await loop.run_in_executor(None, self.archive)
+                except Exception as e:
+                    logger.exception(f"Archiving records failed: {e}")
+                self._status = "idle"
+                await asyncio.sleep(self.interval)
+        finally:
+            # The running batch finishes on its own thread.
+            self._stopping = True
+            self._status = "stopped"
+
+    def stats(self) -> dict:
+        """Return the archive settings and archiving counters.
+
+        Returns:
+            dict: Status, days after which months are archived (``None``
+            when off), completed runs, months and records archived, records
+            kept by the last run for lack of aggregates, the last run's
+            start, duration and records archived, archived months and their
+            size in bytes, and month and delete batch latency in seconds.
+        """
+        archive = database.backend.archive
+        return {
+            "status": self._status,
+            "archive_after_days": (
+                self.archive_after.total_seconds() / 86400
+                if self.archive_after
+                else None
+            ),
+            "runs": self._runs,
+            "months_archived": self._months_archived,
+            "archived": self._archived,
+            "kept_uncovered": self._kept_uncovered,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_duration": self._last_duration,
+            "last_archived": self._last_archived,
+            "archive_months": len(archive.months()) if archive is not None else 0,
+            "archive_bytes": archive.size() if archive is not None else 0,
+            "month_latency": self._month_latency.as_dict(),
+            "batch_latency": self._batch_latency.as_dict(),
+        }
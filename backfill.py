@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+import database
+import storage
+from aggregation import (
+    add_record_to_totals,
+    covered_buckets,
+    empty_totals,
+    get_bucket_end,
+    get_bucket_start,
+)
+from api.models import AggregateBackfillState
+from counters import TimingCounter
+from records import read_records, record_tables
+from registry import read_monitor_ids
+from watermarks import read_aggregate_watermark
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_INTERVAL = "hour"
+DEFAULT_BACKFILL_WORKERS = 2
+DEFAULT_BACKFILL_CHUNK_DAYS = 7
+PROGRESS_LOG_INTERVAL = 30.0
+
+backfill_state_table = AggregateBackfillState.__table__
+
+
+def read_backfill_state(connection) -> Dict[str, datetime]:
+    """Return how far each monitor's records have been backfilled."""
+    rows = connection.execute(select(backfill_state_table)).mappings()
+    return {row["monitor_name"]: row["backfilled_until"] for row in rows}
+
+
+def write_backfill_checkpoint(
+    connection,
+    monitor_name: str,
+    backfilled_until: datetime,
+    records_scanned: int,
+    buckets_inserted: int,
+):
+    """Record that a monitor's records before ``backfilled_until`` are backfilled."""
+    statement = storage.upsert(connection, backfill_state_table).values(
+        monitor_name=monitor_name,
+        backfilled_until=backfilled_until,
+        records_scanned=records_scanned,
+        buckets_inserted=buckets_inserted,
+        updated_at=datetime.now(),
+    )
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["monitor_name"],
+            set_={
+                "backfilled_until": statement.excluded.backfilled_until,
+                "records_scanned": backfill_state_table.c.records_scanned
+                + statement.excluded.records_scanned,
+                "buckets_inserted": backfill_state_table.c.buckets_inserted
+                + statement.excluded.buckets_inserted,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+    )
+
+
+def _missing_ranges(
+    start: datetime, end: datetime, covered
+) -> List[Tuple[datetime, datetime]]:
+    """Return the time ranges between ``start`` and ``end`` of buckets not covered."""
+    ranges = []
+    bucket_start = start
+    while bucket_start < end:
+        bucket_end = get_bucket_end(bucket_start, BACKFILL_INTERVAL)
+        if bucket_start not in covered:
+            if ranges and ranges[-1][1] == bucket_start:
+                ranges[-1] = (ranges[-1][0], bucket_end)
+            else:
+                ranges.append((bucket_start, bucket_end))
+        bucket_start = bucket_end
+    return ranges
+
+
+def backfill_chunk(
+    monitor_id: int,
+    start: datetime,
+    end: datetime,
+    max_record_id: int,
+    degraded_threshold_seconds: float,
+) -> Tuple[int, Dict[datetime, dict]]:
+    """Compute the missing hour buckets of a monitor between ``start`` and ``end``.
+
+    Runs in a backfill worker process. Only buckets without aggregate rows
+    are read, and only records up to ``max_record_id``, since later records
+    are counted by the record writer.
+
+    Returns:
+        tuple: Number of records read, and the running totals of each missing
+        bucket that has records, by bucket start.
+    """
+    buckets: Dict[datetime, dict] = {}
+    scanned = 0
+    with database.read_engine.connect() as connection:
+        covered = covered_buckets(connection, monitor_id, BACKFILL_INTERVAL, start, end)
+        for range_start, range_end in _missing_ranges(start, end, covered):
+            rows = read_records(
+                connection,
+                lambda table: select(table).where(
+                    table.c.monitor_id == monitor_id,
+                    table.c.timestamp >= range_start,
+                    table.c.timestamp < range_end,
+                    table.c.id <= max_record_id,
+                ),
+                since=range_start,
+                until=range_end,
+            )
+            for row in rows:
+                scanned += 1
+                bucket_start = get_bucket_start(row.timestamp, BACKFILL_INTERVAL)
+                if bucket_start not in buckets:
+                    buckets[bucket_start] = empty_totals()
+                add_record_to_totals(
+                    buckets[bucket_start], row, degraded_threshold_seconds
+                )
+    return scanned, buckets
+
+
+class AggregateBackfill:
+    """Background backfill of aggregate buckets missing for stored records.
+
+    Walks every monitor's records in chunks of ``backfill_chunk_days`` days,
+    from its oldest record up to the hour the backfill started. Hour buckets
+    that have records but no aggregate rows are computed by
+    ``backfill_workers`` worker processes, one monitor per worker at a time,
+    and merged into the aggregates by the record writer. The workers are
+    threads instead if other processes cannot see the database, as with the
+    in-memory backend.
+
+    Each monitor's progress is checkpointed in ``aggregate_backfill_state``
+    after every chunk, so a restarted backfill resumes where it stopped and
+    later runs only walk the records written since. Chunks already covered by
+    the aggregates cost one index lookup.
+    """
+
+    def __init__(self, writer, app_config: dict, migrations=None):
+        """Create a backfill.
+
+        Args:
+            writer (RecordWriter): Writer that merges the missing buckets.
+            app_config (dict): Application configuration. Reads
+                ``backfill_workers``, ``backfill_chunk_days`` and
+                ``degraded_threshold``.
+            migrations (OnlineMigrations, optional): Background migrations
+                to wait for, since legacy records not moved yet would be
+                skipped.
+        """
+        self.writer = writer
+        self.app_config = app_config
+        self.migrations = migrations
+        self.workers = max(
+            1, int(app_config.get("backfill_workers", DEFAULT_BACKFILL_WORKERS))
+        )
+        self.chunk = timedelta(
+            days=app_config.get("backfill_chunk_days", DEFAULT_BACKFILL_CHUNK_DAYS)
+        )
+        self.degraded_threshold_seconds = (
+            app_config.get("degraded_threshold", 200) / 1000
+        )
+        self._status = "waiting"
+        self._until: Optional[datetime] = None
+        self._max_record_id = 0
+        self._monitors = 0
+        self._monitors_done = 0
+        self._chunks = 0
+        self._chunks_done = 0
+        self._records_scanned = 0
+        self._buckets_inserted = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._last_progress_log = 0.0
+        self._chunk_latency = TimingCounter()
+
+    def _plan(self) -> List[Tuple[int, str, datetime]]:
+        """Return each monitor with records to check and where to resume it."""
+        plan = []
+        with database.read_engine.connect() as connection:
+            self._max_record_id = read_aggregate_watermark(connection) or 0
+            state = read_backfill_state(connection)
+            monitor_ids = read_monitor_ids(connection)
+            unplanned = [
+                monitor_id
+                for monitor_name, monitor_id in monitor_ids.items()
+                if monitor_name not in state
+            ]
+            oldest: Dict[int, datetime] = {}
+            for table in record_tables(connection):
+                for monitor_id in unplanned:
+                    timestamp = connection.execute(
+                        select(func.min(table.c.timestamp)).where(
+                            table.c.monitor_id == monitor_id
+                        )
+                    ).scalar()
+                    if timestamp is not None and (
+                        monitor_id not in oldest or timestamp < oldest[monitor_id]
+                    ):
+                        oldest[monitor_id] = timestamp
+
+            for monitor_name, monitor_id in sorted(monitor_ids.items()):
+                start = state.get(monitor_name)
+                if start is None:
+                    if monitor_id not in oldest:
+                        continue
+                    start = get_bucket_start(oldest[monitor_id], BACKFILL_INTERVAL)
+                if start < self._until:
+                    plan.append((monitor_id, monitor_name, start))
+        return plan
+
+    def _chunk_count(self, start: datetime) -> int:
+        return -(-(self._until - start) // self.chunk)
+
+    def _log_progress(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_progress_log < PROGRESS_LOG_INTERVAL:
+            return
+        self._last_progress_log = now
+        eta = self._eta()
+        logger.info(
+            f"Aggregate backfill {self._status}: {self._chunks_done}/{self._chunks} "
+            f"chunks, {self._monitors_done}/{self._monitors} monitors, "
+            f"{self._records_scanned} records read, "
+            f"{self._buckets_inserted} buckets inserted"
+            + (f", about {eta:.0f}s left" if eta is not None else "")
+        )
+
+    def _eta(self) -> Optional[float]:
+        if self._status != "running" or not self._chunks_done:
+            return None
+        elapsed = time.monotonic() - self._started
+        return elapsed / self._chunks_done * (self._chunks - self._chunks_done)
+
+    async def _backfill_monitors(self, pool, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            monitor_id, monitor_name, chunk_start = queue.get_nowait()
+            while chunk_start < self._until:
+                chunk_end = min(chunk_start + self.chunk, self._until)
+                started = time.perf_counter()
+                scanned, buckets = await loop.run_in_executor(
+                    pool,
+                    backfill_chunk,
+                    monitor_id,
+                    chunk_start,
+                    chunk_end,
+                    self._max_record_id,
+                    self.degraded_threshold_seconds,
+                )
+                inserted = await self.writer.merge_backfill(
+                    monitor_id,
+                    monitor_name,
+                    BACKFILL_INTERVAL,
+                    buckets,
+                    chunk_end,
+                    scanned,
+                )
+                self._chunk_latency.add(time.perf_counter() - started)
+                self._chunks_done += 1
+                self._records_scanned += scanned
+                self._buckets_inserted += inserted
+                self._log_progress()
+                chunk_start = chunk_end
+            self._monitors_done += 1
+
+    async def run(self):
+        """Backfill missing buckets of all monitors, then return.
+
+        Starts once the record writer has recovered its aggregates and the
+        background migrations are done. Errors are
+        logged and stop the backfill without affecting the writer; the next
+        run resumes from the last checkpoints.
+        """
+        await self.writer.ready.wait()
+        if self.migrations is not None:
+            await self.migrations.done.wait()
+        loop = asyncio.get_running_loop()
+        self._status = "planning"
+        self._started = time.monotonic()
+        self._until = get_bucket_start(datetime.now(), BACKFILL_INTERVAL)
+
+        pool = None
+        try:
+            plan = await loop.run_in_executor(None, self._plan)
+            self._monitors = len(plan)
+            self._chunks = sum(self._chunk_count(start) for _, _, start in plan)
+            self._status = "running"
+            self._log_progress(force=True)
+
+            if plan:
+                queue: asyncio.Queue = asyncio.Queue()
+                for item in plan:
+                    queue.put_nowait(item)
+                if database.backend.shared_between_processes:
+                    pool = ProcessPoolExecutor(
+                        max_workers=min(self.workers, len(plan)),
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=database.configure,
+                        initargs=(self.app_config,),
+                    )
+                else:
+                    pool = ThreadPoolExecutor(max_workers=min(self.workers, len(plan)))
+                await asyncio.gather(
+                    *(
+                        self._backfill_monitors(pool, queue)
+                        for _ in range(min(self.workers, len(plan)))
+                    )
+                )
+            self._status = "done"
+        except asyncio.CancelledError:
+            self._status = "cancelled"
+            raise
+        except Exception as e:
+            self._status = "failed"
+            logger.exception(f"Aggregate backfill failed: {e}")
+        finally:
+            self._finished = time.monotonic()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._log_progress(force=True)
+
+    def stats(self) -> dict:
+        """Return the progress of the backfill.
+
+        Returns:
+            dict: Status, the hour the backfill runs up to, monitor and chunk
+            totals and how many are done, records read, buckets inserted,
+            elapsed and estimated remaining seconds, and chunk latency in
+            seconds.
+        """
+        elapsed = None
+        if self._started is not None:
+            elapsed = (self._finished or time.monotonic()) - self._started
+        return {
+            "status": self._status,
+            "until": self._until.isoformat() if self._until else None,
+            "monitors": self._monitors,
+            "monitors_done": self._monitors_done,
+            "chunks": self._chunks,
+            "chunks_done": self._chunks_done,
+            "records_scanned": self._records_scanned,
+            "buckets_inserted": self._buckets_inserted,
+            "elapsed": elapsed,
+            "eta": self._eta(),
+            "chunk_latency": self._chunk_latency.as_dict(),
+        }
@@ -0,0 +1,206 @@
+"""Latency of API reads on the read pool against Starlette's threadpool.
+
+Seeds a temporary SQLite database with monitor records and their aggregates,
+then issues bursts of concurrent status reads, each reading a monitor's last
+day of history, the way API handlers dispatch them: either on Starlette's
+threadpool with a connection opened per read, like the sync handlers did, or
+awaited on the read pool. While a burst runs, a health check awaits a trivial
+call on the threadpool, like a sync endpoint that does not touch the
+database. Reports read throughput and latency, timed out and failed reads,
+and health check latency for each concurrency.
+
+Usage:
+    python benchmarks/api_benchmark.py
+    python benchmarks/api_benchmark.py --concurrency 8 64 256 --duration 10
+    python benchmarks/api_benchmark.py --read-timeout 500 --json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage_benchmark import _percentile, seed_database  # noqa: E402
+
+MODES = ("threadpool", "pool")
+HEALTH_INTERVAL = 0.01
+
+
+def _read_status(connection, monitor_id: int) -> int:
+    """Read and serialise a monitor's last day of history, like the status API."""
+    from records import read_history
+
+    records = read_history(
+        connection, [monitor_id], since=datetime.now() - timedelta(hours=24)
+    )
+    records.sort(key=lambda record: record.timestamp, reverse=True)
+    return len(
+        [
+            {
+                "timestamp": record.timestamp.isoformat(),
+                "is_up": record.is_up,
+                "response_time": record.response_time,
+            }
+            for record in records
+        ]
+    )
+
+
+def _threadpool_read(monitor_id: int) -> int:
+    import database
+
+    with database.read_engine.connect() as connection:
+        return _read_status(connection, monitor_id)
+
+
+async def _burst(mode: str, monitor_ids: list, concurrency: int, args) -> dict:
+    from fastapi import HTTPException
+    from starlette.concurrency import run_in_threadpool
+
+    from api.reads import ReadPool
+
+    pool = ReadPool({"api_read_timeout": args.read_timeout})
+    stop = asyncio.Event()
+    latencies: list = []
+    health: list = []
+    timeouts = failed = 0
+
+    async def client(rng: random.Random):
+        nonlocal timeouts, failed
+        while not stop.is_set():
+            monitor_id = rng.choice(monitor_ids)
+            started = time.perf_counter()
+            try:
+                if mode == "pool":
+                    await pool.run(
+                        lambda connection: _read_status(connection, monitor_id)
+                    )
+                else:
+                    await asyncio.wait_for(
+                        run_in_threadpool(_threadpool_read, monitor_id),
+                        args.read_timeout / 1000,
+                    )
+            except (HTTPException, asyncio.TimeoutError):
+                timeouts += 1
+                continue
+            except Exception:
+                failed += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async def health_check():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await run_in_threadpool(lambda: None)
+            health.append(time.perf_counter() - started)
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    tasks = [
+        asyncio.create_task(client(random.Random(index)))
+        for index in range(concurrency)
+    ]
+    tasks.append(asyncio.create_task(health_check()))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    pool._executor.shutdown()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "reads_per_sec": len(latencies) / args.duration,
+        "read_p50": _percentile(latencies, 0.50),
+        "read_p99": _percentile(latencies, 0.99),
+        "timeouts": timeouts,
+        "failed": failed,
+        "health_p50": _percentile(health, 0.50),
+        "health_p99": _percentile(health, 0.99),
+    }
+
+
+def run(args):
+    """Seed a database and yield the results of each concurrency and mode."""
+    import database
+    from registry import read_monitor_ids
+
+    monitors = [f"bench-{index:04d}" for index in range(args.monitors)]
+    with tempfile.TemporaryDirectory(prefix="amai-api-") as directory:
+        app_config = {"database_path": os.path.join(directory, "status.db")}
+        database.configure(app_config)
+        database.init_db()
+        seed_database(monitors, args.records, args.days, app_config)
+        with database.engine.connect() as connection:
+            monitor_ids = list(read_monitor_ids(connection).values())
+        for concurrency in args.concurrency:
+            for mode in MODES:
+                yield asyncio.run(_burst(mode, monitor_ids, concurrency, args))
+        database.engine.dispose()
+        database.read_engine.dispose()
+
+
+def format_row(result: dict) -> str:
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+    return (
+        f"{result['concurrency']:>6} {result['mode']:>10} "
+        f"{result['reads_per_sec']:>8.1f} "
+        f"{ms(result['read_p50'])} {ms(result['read_p99'])} "
+        f"{result['timeouts']:>8} {result['failed']:>6} "
+        f"{ms(result['health_p50'])} {ms(result['health_p99'])}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200000, help="seeded records")
+    parser.add_argument(
+        "--days", type=float, default=7, help="history of seeded records"
+    )
+    parser.add_argument("--monitors", type=int, default=50)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[8, 64, 256],
+        help="reads in flight",
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument(
+        "--read-timeout", type=float, default=10000, help="read timeout in ms"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    if not args.json:
+        print(
+            f"{'conc':>6} {'mode':>10} {'reads/s':>8} {'read':>8} {'read':>8} "
+            f"{'timeouts':>8} {'failed':>6} {'health':>8} {'health':>8}"
+        )
+        print(
+            f"{'':>6} {'':>10} {'':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'':>8} {'':>6} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+    results = []
+    for result in run(args):
+        results.append(result)
+        if not args.json:
+            print(format_row(result), flush=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
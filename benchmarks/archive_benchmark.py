@@ -0,0 +1,141 @@
+"""Storage size and long-range read speed of archived records against the tables.
+
+Seeds a temporary SQLite database with monitor records and their aggregates,
+reads every monitor's history of the closed months from the records tables,
+archives those months and reads the same history again from the archive.
+Reports the bytes the records took in the tables and in the archive, and the
+read throughput of both.
+
+Usage:
+    python benchmarks/archive_benchmark.py
+    python benchmarks/archive_benchmark.py --records 2000000 --days 120 --monitors 20
+    python benchmarks/archive_benchmark.py --partition-records --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage_benchmark import seed_database  # noqa: E402
+
+
+def _stored_bytes(app_config: dict) -> int:
+    """Vacuum the database and return the size of it and its partitions."""
+    import database
+
+    with database.engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+    partitions = database.backend.partitions
+    return os.path.getsize(app_config["database_path"]) + sum(
+        os.path.getsize(partitions.path(month)) for month in partitions.months()
+    )
+
+
+def _read_history(monitor_ids: list, until: datetime) -> tuple:
+    """Read each monitor's history before ``until``; return rows and seconds."""
+    import database
+    from records import read_history
+
+    rows = 0
+    started = time.perf_counter()
+    with database.read_engine.connect() as connection:
+        for monitor_id in monitor_ids:
+            rows += len(read_history(connection, [monitor_id], until=until))
+    return rows, time.perf_counter() - started
+
+
+def run(args) -> dict:
+    import database
+    from archive import RecordArchiver
+    from registry import read_monitor_ids
+    from storage.partitions import month_of
+
+    monitors = [f"bench-{index:04d}" for index in range(args.monitors)]
+    with tempfile.TemporaryDirectory(prefix="amai-archive-") as directory:
+        app_config = {
+            "database_path": os.path.join(directory, "status.db"),
+            "partition_records": args.partition_records,
+            "archive_after_days": 1,
+            "archive_batch_pause": 0,
+        }
+        database.configure(app_config)
+        database.init_db()
+        seed_database(monitors, args.records, args.days, app_config)
+        with database.engine.connect() as connection:
+            monitor_ids = list(read_monitor_ids(connection).values())
+        until = datetime.combine(month_of(datetime.now()), datetime.min.time())
+
+        before_bytes = _stored_bytes(app_config)
+        table_rows, table_seconds = _read_history(monitor_ids, until)
+        started = time.perf_counter()
+        archived = RecordArchiver(None, app_config).archive()
+        archive_seconds = time.perf_counter() - started
+        after_bytes = _stored_bytes(app_config)
+        archive_bytes = database.backend.archive.size()
+        archive_rows, archive_read_seconds = _read_history(monitor_ids, until)
+        database.engine.dispose()
+        database.read_engine.dispose()
+
+    table_bytes = before_bytes - after_bytes
+    return {
+        "records": args.records,
+        "archived": archived,
+        "table_bytes": table_bytes,
+        "archive_bytes": archive_bytes,
+        "compression": table_bytes / archive_bytes if archive_bytes else None,
+        "archive_seconds": archive_seconds,
+        "table_rows": table_rows,
+        "table_rows_per_sec": table_rows / table_seconds,
+        "archive_rows": archive_rows,
+        "archive_rows_per_sec": archive_rows / archive_read_seconds,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000, help="seeded records")
+    parser.add_argument(
+        "--days", type=float, default=90, help="history of seeded records"
+    )
+    parser.add_argument("--monitors", type=int, default=20)
+    parser.add_argument(
+        "--partition-records",
+        action="store_true",
+        help="write records to monthly partitions",
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(
+        f"archived {result['archived']} of {result['records']} records "
+        f"in {result['archive_seconds']:.1f}s"
+    )
+    print(
+        f"size     tables {result['table_bytes'] / 1e6:8.1f} MB   "
+        f"archive {result['archive_bytes'] / 1e6:8.1f} MB   "
+        f"{result['compression']:.1f}x smaller"
+    )
+    print(
+        f"reads    tables {result['table_rows_per_sec']:8.0f} rows/s   "
+        f"archive {result['archive_rows_per_sec']:8.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
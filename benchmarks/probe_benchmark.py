@@ -0,0 +1,292 @@
+"""Probe throughput benchmark against a local stub target farm.
+
+Starts aiohttp stub servers in a separate process, generates monitors that
+point at them, and runs the real probe loop and record writer against a
+temporary SQLite database. Reports checks per second, scheduling lag,
+database write latency and CPU use of the probing process.
+
+Usage:
+    python benchmarks/probe_benchmark.py --monitors 100 1000 5000 20000
+    python benchmarks/probe_benchmark.py --monitors 2000 --interval 5000 \\
+        --latency 50 --error-rate 0.05 --timeout-rate 0.01 --json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+logger = logging.getLogger("probe_benchmark")
+
+BASE_PORT = 19100
+HANG_SECONDS = 30
+
+
+def _run_stub_farm(ports, latency_ms, jitter_ms, ready):
+    from aiohttp import web
+
+    async def ok(request):
+        delay = latency_ms + random.uniform(0, jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        return web.Response(text="ok")
+
+    async def error(request):
+        return web.Response(status=500, text="error")
+
+    async def hang(request):
+        await asyncio.sleep(HANG_SECONDS)
+        return web.Response(text="late")
+
+    async def serve():
+        runners = []
+        for port in ports:
+            app = web.Application()
+            app.router.add_get("/ok", ok)
+            app.router.add_get("/error", error)
+            app.router.add_get("/hang", hang)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "0.0.0.0", port, backlog=4096).start()
+            runners.append(runner)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_stub_farm(servers: int, latency_ms: float, jitter_ms: float):
+    """Start the stub servers in a child process and return it with their ports."""
+    ports = [BASE_PORT + i for i in range(servers)]
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(
+        target=_run_stub_farm,
+        args=(ports, latency_ms, jitter_ms, ready),
+        daemon=True,
+    )
+    process.start()
+    if not ready.wait(30):
+        process.terminate()
+        raise RuntimeError("Stub farm did not start")
+    return process, ports
+
+
+def generate_monitors(
+    count: int,
+    ports: list,
+    hosts: int,
+    interval_ms: int,
+    error_rate: float,
+    timeout_rate: float,
+    seed: int = 0,
+) -> list:
+    """Generate monitor configurations spread over the stub hosts and ports.
+
+    Hosts are distinct loopback addresses, so every host and port pair is a
+    separate connection pool key in the prober.
+    """
+    rng = random.Random(seed)
+    monitors = []
+    for index in range(count):
+        roll = rng.random()
+        if roll < timeout_rate:
+            path = "hang"
+        elif roll < timeout_rate + error_rate:
+            path = "error"
+        else:
+            path = "ok"
+        host = f"127.0.0.{1 + index % hosts}"
+        port = ports[(index // hosts) % len(ports)]
+        monitors.append(
+            {
+                "name": f"bench-{index:05d}",
+                "url": f"http://{host}:{port}/{path}",
+                "interval": interval_ms,
+            }
+        )
+    return monitors
+
+
+async def run_probes(monitors: list, app_config: dict, warmup: float, duration: float):
+    """Run the probe loop and record writer, measuring the steady state window."""
+    import database
+    import monitor
+    from persistence import RecordWriter
+
+    logging.basicConfig(level=logging.ERROR)
+    database.configure(app_config)
+    database.init_db()
+
+    writer = RecordWriter(app_config)
+    writer_task = asyncio.create_task(writer.run())
+    probe_task = asyncio.create_task(
+        monitor.run_probe_loop(monitors, app_config, writer)
+    )
+
+    try:
+        await asyncio.sleep(warmup)
+        start_stats = monitor.active_scheduler.stats()
+        start_written = writer.stats()["written"]
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        await asyncio.sleep(duration)
+
+        end_stats = monitor.active_scheduler.stats()
+        writer_stats = writer.stats()
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        probe_stats = monitor.active_pool.stats()
+    finally:
+        probe_task.cancel()
+        await asyncio.gather(probe_task, return_exceptions=True)
+        writer_task.cancel()
+        await asyncio.gather(writer_task, return_exceptions=True)
+
+    dispatched = end_stats["dispatched"] - start_stats["dispatched"]
+    written = writer_stats["written"] - start_written
+    return {
+        "monitors": len(monitors),
+        "checks_per_sec": dispatched / wall,
+        "expected_checks_per_sec": sum(1000 / m["interval"] for m in monitors),
+        "records_written_per_sec": written / wall,
+        "skipped": end_stats["skipped"] - start_stats["skipped"],
+        "lag_p50": end_stats["lag_p50"],
+        "lag_p99": end_stats["lag_p99"],
+        "lag_max": end_stats["lag_max"],
+        "db_flush_avg": writer_stats["flush_latency"]["avg"],
+        "db_flush_max": writer_stats["flush_latency"]["max"],
+        "db_batch_avg": writer_stats["batch_size"]["avg"],
+        "writer_queue_depth": writer_stats["queue_depth"],
+        "writer_failed": writer_stats["failed"],
+        "request_time_avg": probe_stats["request_time"]["avg"],
+        "queue_wait_avg": probe_stats["queue_wait"]["avg"],
+        "cpu_percent": 100.0 * cpu / wall,
+    }
+
+
+def _run_case_process(monitors, app_config, args, results):
+    with tempfile.TemporaryDirectory(prefix="amai-bench-") as directory:
+        app_config = dict(
+            app_config, database_path=os.path.join(directory, "status.db")
+        )
+        results.put(
+            asyncio.run(run_probes(monitors, app_config, args.warmup, args.duration))
+        )
+
+
+def run_case(count: int, ports: list, args) -> dict:
+    """Run one benchmark case in a fresh process and temporary database.
+
+    Module state such as the active scheduler and the database engines is
+    global, so each case runs in a new process.
+    """
+    monitors = generate_monitors(
+        count,
+        ports,
+        args.hosts,
+        args.interval,
+        args.error_rate,
+        args.timeout_rate,
+    )
+    app_config = {
+        "scheduler_jitter": 1.0,
+        "probe_max_concurrency": args.concurrency,
+        "probe_connection_limit_per_host": args.per_host,
+    }
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=_run_case_process, args=(monitors, app_config, args, results)
+    )
+    process.start()
+    try:
+        return results.get()
+    finally:
+        process.join()
+
+
+def format_row(result: dict) -> str:
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+    return (
+        f"{result['monitors']:>7} "
+        f"{result['checks_per_sec']:>9.1f} "
+        f"{result['expected_checks_per_sec']:>9.1f} "
+        f"{ms(result['lag_p50'])} {ms(result['lag_p99'])} "
+        f"{ms(result['db_flush_avg'])} {ms(result['db_flush_max'])} "
+        f"{result['cpu_percent']:>6.1f}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--monitors", type=int, nargs="+", default=[100, 1000, 5000, 20000]
+    )
+    parser.add_argument(
+        "--interval", type=int, default=30000, help="check interval (ms)"
+    )
+    parser.add_argument("--latency", type=float, default=20, help="stub latency (ms)")
+    parser.add_argument(
+        "--jitter", type=float, default=10, help="extra random latency (ms)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--servers", type=int, default=8, help="stub server ports")
+    parser.add_argument("--hosts", type=int, default=32, help="loopback addresses")
+    parser.add_argument("--concurrency", type=int, default=1024)
+    parser.add_argument("--per-host", type=int, default=64)
+    parser.add_argument(
+        "--warmup", type=float, default=None, help="seconds (default: one interval)"
+    )
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    if args.warmup is None:
+        args.warmup = args.interval / 1000
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    farm, ports = start_stub_farm(args.servers, args.latency, args.jitter)
+    results = []
+    try:
+        if not args.json:
+            print(
+                f"{'mons':>7} {'checks/s':>9} {'expected':>9} {'lag p50':>8} "
+                f"{'lag p99':>8} {'db avg':>8} {'db max':>8} {'cpu%':>6}"
+            )
+            print(
+                f"{'':>7} {'':>9} {'':>9} {'(ms)':>8} {'(ms)':>8} {'(ms)':>8} {'(ms)':>8}"
+            )
+        for count in args.monitors:
+            result = run_case(count, ports, args)
+            results.append(result)
+            if not args.json:
+                print(format_row(result), flush=True)
+    finally:
+        farm.terminate()
+        farm.join(5)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Checks of the caching DNS resolver against a local stub DNS server.
+
+Starts a UDP DNS server on localhost whose answers and TTLs each check sets,
+points a ``CachingResolver`` at it through ``aiodns`` and checks that answers
+are cached for their record TTL, refreshed in the background before they
+expire, and served stale while the server fails. Prints one line per check.
+
+Usage:
+    python benchmarks/resolver_check.py
+    python benchmarks/resolver_check.py --verbose
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import struct
+import sys
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HOST = "probe.test"
+TTL = 2
+QTYPE_A = 1
+CLASS_IN = 1
+RCODE_SERVFAIL = 2
+
+
+class StubDNS(asyncio.DatagramProtocol):
+    """DNS server answering A queries with ``address`` for ``ttl`` seconds."""
+
+    def __init__(self, address: str, ttl: int):
+        self.address = address
+        self.ttl = ttl
+        self.fail = False
+        self.queries = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        self.queries += 1
+        query_id, _, question_count = struct.unpack("!HHH", data[:6])
+        end = 12
+        while data[end]:
+            end += data[end] + 1
+        question = data[12 : end + 5]
+        qtype = struct.unpack("!H", data[end + 1 : end + 3])[0]
+        answers = b""
+        if not self.fail and qtype == QTYPE_A:
+            answers = struct.pack(
+                "!HHHIH4s",
+                0xC00C,
+                QTYPE_A,
+                CLASS_IN,
+                self.ttl,
+                4,
+                bytes(int(part) for part in self.address.split(".")),
+            )
+        flags = 0x8180 | (RCODE_SERVFAIL if self.fail else 0)
+        header = struct.pack(
+            "!HHHHHH", query_id, flags, question_count, 1 if answers else 0, 0, 0
+        )
+        self.transport.sendto(header + question + answers, addr)
+
+
+async def _start_stub(address: str, ttl: int = TTL):
+    loop = asyncio.get_running_loop()
+    transport, stub = await loop.create_datagram_endpoint(
+        lambda: StubDNS(address, ttl), local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    return transport, stub, f"127.0.0.1:{port}"
+
+
+async def _resolve(resolver) -> str:
+    return (await resolver.resolve(HOST))[0]["host"]
+
+
+async def check_ttl_expiry():
+    """Answers are cached for their record TTL, then looked up again."""
+    from resolver import CachingResolver
+
+    transport, stub, nameserver = await _start_stub("10.0.0.1")
+    resolver = CachingResolver(min_ttl=1, prefetch=False, nameservers=[nameserver])
+    try:
+        assert resolver.stats()["ttl_source"] == "dns", "aiodns is not installed"
+        assert await _resolve(resolver) == "10.0.0.1"
+        stub.address = "10.0.0.2"
+        assert await _resolve(resolver) == "10.0.0.1", "cached answer not served"
+        assert stub.queries == 1, f"{stub.queries} queries within the TTL"
+        await asyncio.sleep(TTL + 0.1)
+        assert await _resolve(resolver) == "10.0.0.2", "expired answer served"
+        stats = resolver.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2), f"stats {stats}"
+    finally:
+        await resolver.close()
+        transport.close()
+
+
+async def check_prefetch():
+    """An answer used shortly before it expires is refreshed in the background."""
+    from resolver import PREFETCH_FRACTION, CachingResolver
+
+    transport, stub, nameserver = await _start_stub("10.0.0.1")
+    resolver = CachingResolver(min_ttl=1, nameservers=[nameserver])
+    try:
+        assert await _resolve(resolver) == "10.0.0.1"
+        stub.address = "10.0.0.2"
+        await asyncio.sleep(TTL * (1 - PREFETCH_FRACTION / 2))
+        assert await _resolve(resolver) == "10.0.0.1", "answer refreshed early"
+        await asyncio.sleep(TTL * PREFETCH_FRACTION)
+        assert stub.queries == 2, f"{stub.queries} queries, expected a prefetch"
+        assert await _resolve(resolver) == "10.0.0.2", "prefetched answer not used"
+        stats = resolver.stats()
+        assert stats["misses"] == 1, f"prefetch did not prevent a miss: {stats}"
+        assert stats["prefetches"] == 1, f"stats {stats}"
+    finally:
+        await resolver.close()
+        transport.close()
+
+
+async def check_stale():
+    """An expired answer is served while the DNS server fails."""
+    from resolver import CachingResolver
+
+    transport, stub, nameserver = await _start_stub("10.0.0.1")
+    resolver = CachingResolver(min_ttl=1, prefetch=False, nameservers=[nameserver])
+    try:
+        assert await _resolve(resolver) == "10.0.0.1"
+        stub.fail = True
+        await asyncio.sleep(TTL + 0.1)
+        assert await _resolve(resolver) == "10.0.0.1", "stale answer not served"
+        assert stub.queries > 1, "expired answer served without a lookup"
+        stats = resolver.stats()
+        assert stats["stale_served"] == 1, f"stats {stats}"
+        assert stats["failures"] == 1, f"stats {stats}"
+    finally:
+        await resolver.close()
+        transport.close()
+
+
+CHECKS = (check_ttl_expiry, check_prefetch, check_stale)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="print tracebacks")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+    passed = True
+    for check in CHECKS:
+        try:
+            asyncio.run(check())
+        except Exception as e:
+            passed = False
+            print(f"FAIL  {check.__name__}: {e}")
+            if args.verbose:
+                traceback.print_exc()
+        else:
+            print(f"ok    {check.__name__}")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Read latency of the API queries under sustained write load, per storage profile.
+
+Seeds a temporary SQLite database with monitor records and their aggregates,
+then runs the real record writer at a fixed rate of new records while reader
+processes, like separate API workers, issue the queries behind the status
+page and heartbeat API through the reader engine. Reports read latency
+percentiles, failed reads, and write throughput and flush latency for each
+storage profile.
+
+Usage:
+    python benchmarks/storage_benchmark.py
+    python benchmarks/storage_benchmark.py --profiles legacy fast safe \\
+        --records 500000 --write-rate 2000 --readers 8 --duration 30 --json
+    python benchmarks/storage_benchmark.py --profiles fast --partition-records
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+logger = logging.getLogger("storage_benchmark")
+
+SEED_BATCH_SIZE = 10000
+QUERIES = ("latest", "heartbeat")
+
+
+def _record(monitor_name: str, timestamp: datetime, rng: random.Random) -> dict:
+    up = rng.random() > 0.02
+    response_time = rng.uniform(0.02, 0.4) if up else None
+    return {
+        "monitor_name": monitor_name,
+        "timestamp": timestamp,
+        "status_code": 200 if up else None,
+        "is_up": up,
+        "response_time": response_time,
+        "ttfb": response_time and response_time / 2,
+        "check_interval": 30.0,
+    }
+
+
+def seed_database(monitors: list, records: int, days: float, app_config: dict):
+    """Insert historical records and build their hour aggregates and rollups."""
+    from sqlalchemy import select
+
+    import database
+    from accumulator import AggregateAccumulator
+    from aggregation import add_record_to_totals, empty_totals, get_bucket_start
+    from records import insert_records, read_records
+    from registry import register_monitors
+
+    rng = random.Random(0)
+    now = datetime.now()
+    with database.engine.begin() as connection:
+        monitor_ids = register_monitors(connection, monitors)
+    for offset in range(0, records, SEED_BATCH_SIZE):
+        rows = []
+        for index in range(offset, min(offset + SEED_BATCH_SIZE, records)):
+            row = _record(
+                monitors[index % len(monitors)],
+                now - timedelta(days=days) * (1 - index / records),
+                rng,
+            )
+            row["id"] = index + 1
+            row["monitor_id"] = monitor_ids[row.pop("monitor_name")]
+            rows.append(row)
+        with database.engine.begin() as connection:
+            insert_records(connection, rows)
+
+    buckets: dict = {}
+    with database.engine.connect() as connection:
+        for row in read_records(connection, lambda table: select(table)):
+            totals = buckets.setdefault(row.monitor_id, {}).setdefault(
+                get_bucket_start(row.timestamp, "hour"), empty_totals()
+            )
+            add_record_to_totals(totals, row, 0.2)
+
+    accumulator = AggregateAccumulator(database.engine, app_config)
+    accumulator.recover()
+    for monitor_id, monitor_buckets in buckets.items():
+        accumulator.merge_missing(monitor_id, "hour", monitor_buckets)
+    while accumulator.compact():
+        pass
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _reader_process(monitors: list, app_config: dict, start, stop, results):
+    from sqlalchemy import select
+
+    import database
+    from aggregation import read_aggregate_rows
+    from records import read_records
+    from registry import monitor_id_query
+
+    logging.basicConfig(level=logging.ERROR)
+    database.configure(app_config)
+    rng = random.Random(os.getpid())
+    latencies = {query: [] for query in QUERIES}
+    errors = []
+    start.wait()
+    while not stop.is_set():
+        monitor_name = rng.choice(monitors)
+        query = rng.choice(QUERIES)
+        started = time.perf_counter()
+        try:
+            if query == "latest":
+                since = datetime.now() - timedelta(hours=24)
+                with database.read_engine.connect() as connection:
+                    read_records(
+                        connection,
+                        lambda table: select(table)
+                        .where(
+                            table.c.monitor_id == monitor_id_query(monitor_name),
+                            table.c.timestamp >= since,
+                        )
+                        .order_by(table.c.timestamp.desc())
+                        .limit(100),
+                        since=since,
+                    )
+            else:
+                with database.read_engine.connect() as connection:
+                    read_aggregate_rows(
+                        connection,
+                        [monitor_name],
+                        "hour",
+                        datetime.now() - timedelta(hours=96),
+                        app_config,
+                    )
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies[query].append(time.perf_counter() - started)
+    results.put((latencies, errors))
+
+
+async def _write_load(monitors: list, app_config: dict, rate: float, stop):
+    from api.models import MonitorRecord
+    from persistence import RecordWriter
+
+    rng = random.Random(1)
+    writer = RecordWriter(app_config)
+    writer_task = asyncio.create_task(writer.run())
+    await writer.ready.wait()
+    started = time.perf_counter()
+    submitted = 0
+    try:
+        while not stop.is_set():
+            due = int((time.perf_counter() - started) * rate)
+            while submitted < due:
+                await writer.submit(
+                    MonitorRecord(
+                        **_record(
+                            monitors[submitted % len(monitors)], datetime.now(), rng
+                        )
+                    )
+                )
+                submitted += 1
+            await asyncio.sleep(0.01)
+    finally:
+        writer_task.cancel()
+        await asyncio.gather(writer_task, return_exceptions=True)
+    return writer.stats(), time.perf_counter() - started
+
+
+def run_profile(profile: str, args) -> dict:
+    """Seed a database and measure reads under write load for one profile."""
+    import database
+
+    logging.basicConfig(level=logging.ERROR)
+    monitors = [f"bench-{index:04d}" for index in range(args.monitors)]
+    with tempfile.TemporaryDirectory(prefix="amai-storage-") as directory:
+        app_config = {
+            "database_path": os.path.join(directory, "status.db"),
+            "storage_profile": profile,
+            "partition_records": args.partition_records,
+        }
+        database.configure(app_config)
+        database.init_db()
+        seed_database(monitors, args.records, args.days, app_config)
+
+        context = multiprocessing.get_context("spawn")
+        start = context.Event()
+        stop = context.Event()
+        results = context.Queue()
+        readers = [
+            context.Process(
+                target=_reader_process,
+                args=(monitors, app_config, start, stop, results),
+                daemon=True,
+            )
+            for _ in range(args.readers)
+        ]
+        for reader in readers:
+            reader.start()
+
+        async def measure():
+            write_task = asyncio.create_task(
+                _write_load(monitors, app_config, args.write_rate, stop)
+            )
+            await asyncio.sleep(args.warmup)
+            start.set()
+            await asyncio.sleep(args.duration)
+            stop.set()
+            return await write_task
+
+        writer_stats, write_seconds = asyncio.run(measure())
+        latencies = {query: [] for query in QUERIES}
+        errors: list = []
+        for _ in readers:
+            reader_latencies, reader_errors = results.get()
+            for query, values in reader_latencies.items():
+                latencies[query].extend(values)
+            errors.extend(reader_errors)
+        for reader in readers:
+            reader.join()
+        database.engine.dispose()
+        database.read_engine.dispose()
+
+    reads = [value for values in latencies.values() for value in values]
+    result = {
+        "profile": profile,
+        "reads_per_sec": len(reads) / args.duration,
+        "read_errors": len(errors),
+        "writes_per_sec": writer_stats["written"] / write_seconds,
+        "write_failed": writer_stats["failed"],
+        "db_flush_avg": writer_stats["flush_latency"]["avg"],
+        "db_flush_max": writer_stats["flush_latency"]["max"],
+    }
+    for query, values in latencies.items():
+        result[f"{query}_p50"] = _percentile(values, 0.50)
+        result[f"{query}_p99"] = _percentile(values, 0.99)
+        result[f"{query}_max"] = max(values) if values else None
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def _run_profile_process(profile, args, results):
+    results.put(run_profile(profile, args))
+
+
+def run_case(profile: str, args) -> dict:
+    """Run one profile in a fresh process, since the engines are module state."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=_run_profile_process, args=(profile, args, results)
+    )
+    process.start()
+    try:
+        return results.get()
+    finally:
+        process.join()
+
+
+def format_row(result: dict) -> str:
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+    return (
+        f"{result['profile']:>8} "
+        f"{ms(result['latest_p50'])} {ms(result['latest_p99'])} "
+        f"{ms(result['heartbeat_p50'])} {ms(result['heartbeat_p99'])} "
+        f"{ms(max(result['latest_max'] or 0, result['heartbeat_max'] or 0))} "
+        f"{result['reads_per_sec']:>8.1f} {result['read_errors']:>6} "
+        f"{result['writes_per_sec']:>8.1f} {ms(result['db_flush_avg'])}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["legacy", "fast"])
+    parser.add_argument("--records", type=int, default=200000, help="seeded records")
+    parser.add_argument(
+        "--days", type=float, default=7, help="history of seeded records"
+    )
+    parser.add_argument("--monitors", type=int, default=50)
+    parser.add_argument(
+        "--write-rate", type=float, default=1000, help="records per second"
+    )
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument(
+        "--partition-records",
+        action="store_true",
+        help="write records to monthly partitions",
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    results = []
+    if not args.json:
+        print(
+            f"{'profile':>8} {'latest':>8} {'latest':>8} {'hb':>8} {'hb':>8} "
+            f"{'read':>8} {'reads/s':>8} {'errors':>6} {'writes/s':>8} {'db avg':>8}"
+        )
+        print(
+            f"{'':>8} {'p50 ms':>8} {'p99 ms':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'max ms':>8} {'':>8} {'':>6} {'':>8} {'(ms)':>8}"
+        )
+    for profile in args.profiles:
+        result = run_case(profile, args)
+        results.append(result)
+        if not args.json:
+            print(format_row(result), flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
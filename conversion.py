@@ -0,0 +1,241 @@
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import MetaData, Table, delete, func, inspect, select, tuple_
+
+import storage
+from aggregation import (
+    empty_totals,
+    merge_totals,
+    totals_from_row,
+    totals_to_row,
+)
+from api.models import HeartbeatAggregate, MonitorRecord
+from records import insert_records, partition_batch
+from registry import register_monitors
+from watermarks import read_aggregate_watermark
+
+logger = logging.getLogger(__name__)
+
+LEGACY_RECORDS = "monitor_records"
+LEGACY_AGGREGATES = "heartbeat_aggregates"
+DEFAULT_DEGRADED_PERCENTAGE_THRESHOLD = 10
+
+records_table = MonitorRecord.__table__
+aggregates_table = HeartbeatAggregate.__table__
+
+
+def legacy_table(connection, name: str) -> Optional[Table]:
+    """Return a legacy table as it exists in the database, if it does."""
+    if not inspect(connection).has_table(name):
+        return None
+    return Table(name, MetaData(), autoload_with=connection)
+
+
+def _register(connection, rows: List[dict], monitor_ids: Dict[str, int]):
+    missing = {row["monitor_name"] for row in rows if row["monitor_name"]} - set(
+        monitor_ids
+    )
+    if missing:
+        monitor_ids.update(register_monitors(connection, missing))
+
+
+def _delete_moved(connection, legacy: Table, rows: List[dict]):
+    connection.execute(
+        delete(legacy).where(legacy.c.id.in_([row["id"] for row in rows]))
+    )
+
+
+def _move_records(
+    connection, legacy: Table, rows: List[dict], monitor_ids: Dict[str, int]
+):
+    """Copy legacy records into the records tables and delete them.
+
+    The monitors of ``rows`` must be registered in ``monitor_ids``. Records
+    without a monitor or a timestamp cannot be keyed and are dropped.
+    """
+    values = [
+        {
+            **{
+                column.name: row[column.name]
+                for column in records_table.columns
+                if column.name in row
+            },
+            "monitor_id": monitor_ids[row["monitor_name"]],
+        }
+        for row in rows
+        if row["monitor_name"] and row["timestamp"] is not None
+    ]
+    insert_records(connection, values, ignore_existing=True)
+    _delete_moved(connection, legacy, rows)
+
+
+def _move_aggregates(
+    connection, legacy: Table, rows: List[dict], monitor_ids: Dict[str, int]
+):
+    """Copy legacy aggregate buckets into ``aggregate_buckets`` and delete them.
+
+    SQLite kept bucket starts as text, so a bucket written with another
+    timestamp format got a row of its own. Such rows parse to the same start
+    here and their totals are merged, also with a row moved by an earlier
+    batch.
+    """
+    _register(connection, rows, monitor_ids)
+    groups: Dict[tuple, List[dict]] = {}
+    for row in rows:
+        key = (monitor_ids[row["monitor_name"]], row["interval"], row["bucket_start"])
+        groups.setdefault(key, []).append(row)
+    key_columns = (
+        aggregates_table.c.monitor_id,
+        aggregates_table.c.interval,
+        aggregates_table.c.bucket_start,
+    )
+    for row in connection.execute(
+        select(aggregates_table).where(tuple_(*key_columns).in_(list(groups)))
+    ).mappings():
+        groups[tuple(row[column.name] for column in key_columns)].insert(0, row)
+
+    values = []
+    for key, group in groups.items():
+        if len(group) == 1:
+            values.append(
+                {
+                    **{
+                        column.name: group[0][column.name]
+                        for column in aggregates_table.columns
+                        if column.name in group[0]
+                    },
+                    "monitor_id": key[0],
+                }
+            )
+            continue
+        totals = empty_totals()
+        for row in group:
+            merge_totals(totals, totals_from_row(row))
+        thresholds = [
+            row["degraded_threshold"]
+            for row in group
+            if row["degraded_threshold"] is not None
+        ]
+        values.append(
+            totals_to_row(
+                *key,
+                totals,
+                max(thresholds) if thresholds else None,
+                DEFAULT_DEGRADED_PERCENTAGE_THRESHOLD,
+                max(row["updated_at"] for row in group),
+            )
+        )
+
+    statement = storage.upsert(connection, aggregates_table)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[column.name for column in key_columns],
+            set_={
+                column.name: statement.excluded[column.name]
+                for column in aggregates_table.columns
+                if not column.primary_key
+            },
+        ),
+        values,
+    )
+    _delete_moved(connection, legacy, rows)
+
+
+def move_legacy_records(
+    engine, batch_size: int, monitor_ids: Dict[str, int], min_id: int = 0
+) -> int:
+    """Move the newest legacy records with an id of at least ``min_id``.
+
+    Moves at most ``batch_size`` records in one transaction, fewer if they
+    span more record partitions than can be written at once. New monitors
+    are registered in a transaction of their own first, so ``monitor_ids``
+    never holds an id that was rolled back.
+
+    Returns:
+        int: Number of legacy records moved or dropped; 0 once none are left.
+    """
+    with engine.connect() as connection:
+        legacy = legacy_table(connection, LEGACY_RECORDS)
+        if legacy is None:
+            return 0
+        rows = partition_batch(
+            connection.execute(
+                select(legacy)
+                .where(legacy.c.id >= min_id)
+                .order_by(legacy.c.id.desc())
+                .limit(batch_size)
+            )
+            .mappings()
+            .all()
+        )
+    if not rows:
+        return 0
+    with engine.begin() as connection:
+        _register(connection, rows, monitor_ids)
+    with engine.begin() as connection:
+        _move_records(connection, legacy, rows, monitor_ids)
+    return len(rows)
+
+
+def drop_legacy_records(engine) -> bool:
+    """Drop the legacy records table once every record has been moved.
+
+    Returns:
+        bool: Whether no legacy records table is left.
+    """
+    with engine.begin() as connection:
+        legacy = legacy_table(connection, LEGACY_RECORDS)
+        if legacy is None:
+            return True
+        if connection.execute(select(legacy.c.id).limit(1)).first() is not None:
+            return False
+        legacy.drop(connection)
+    return True
+
+
+def move_legacy_aggregates(engine, batch_size: int, monitor_ids: Dict[str, int]) -> int:
+    """Move the next ``batch_size`` legacy aggregate buckets.
+
+    The legacy table is dropped in the transaction that finds it empty.
+
+    Returns:
+        int: Number of buckets moved; 0 once none are left.
+    """
+    with engine.begin() as connection:
+        legacy = legacy_table(connection, LEGACY_AGGREGATES)
+        if legacy is None:
+            return 0
+        rows = (
+            connection.execute(select(legacy).order_by(legacy.c.id).limit(batch_size))
+            .mappings()
+            .all()
+        )
+        if not rows:
+            legacy.drop(connection)
+            return 0
+        _move_aggregates(connection, legacy, rows, monitor_ids)
+    return len(rows)
+
+
+def recent_records_start(engine) -> Optional[int]:
+    """Return the lowest id of the legacy records to move at startup.
+
+    Those are the records above the aggregate watermark, which the record
+    writer re-derives at startup, and at least the newest record, so new
+    records are numbered after every legacy one. An empty legacy table is
+    dropped.
+
+    Returns:
+        int: Lowest record id, ``None`` when there are no legacy records.
+    """
+    with engine.connect() as connection:
+        legacy = legacy_table(connection, LEGACY_RECORDS)
+        if legacy is None:
+            return None
+        newest = connection.execute(select(func.max(legacy.c.id))).scalar()
+        watermark = read_aggregate_watermark(connection)
+    if newest is None:
+        drop_legacy_records(engine)
+        return None
+    return newest if watermark is None else min(watermark + 1, newest)
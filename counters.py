@@ -0,0 +1,27 @@
+class TimingCounter:
+    """Running count, total and maximum of a duration in seconds."""
+
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def add(self, value: float):
+        """Record one duration sample."""
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> dict:
+        """Return the sample count with average, maximum and last value."""
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "max": self.max if self.count else None,
+            "last": self.last,
+        }
@@ -1,27 +1,66 @@
 import logging
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
-from api.models import Base
+from storage import StorageBackend, create_backend
 
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = "sqlite:///./status.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+backend: StorageBackend
+engine: Engine
+read_engine: Engine
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_settings: Optional[tuple] = None
+
+
+def configure(app_config: dict):
+    """Create the writer and reader engines from application configuration.
+
+    The database is chosen by ``storage_backend``, see ``storage.BACKENDS``.
+    All writes go through ``engine`` and ``SessionLocal``; API reads use
+    ``read_engine`` and ``ReadSessionLocal``, whose connections are opened
+    read-only where the backend supports it.
+
+    Called again with the same settings it keeps the existing engines.
+
+    Args:
+        app_config (dict): Application configuration. Reads
+            ``storage_backend`` and the settings of that backend.
+
+    Raises:
+        ValueError: If the backend or its settings are invalid.
+    """
+    global backend, engine, read_engine, _settings
+
+    new_backend = create_backend(app_config)
+    settings = new_backend.settings()
+    if settings == _settings:
+        return
+
+    if _settings is not None:
+        engine.dispose()
+        read_engine.dispose()
+    backend = new_backend
+    engine, read_engine = backend.create_engines()
+    SessionLocal.configure(bind=engine)
+    ReadSessionLocal.configure(bind=read_engine)
+    _settings = settings
+    logger.info(f"Using {backend.describe()}")
 
 
 def init_db():
     """Initialize database tables and run migrations.
 
-    Creates all database tables based on SQLAlchemy models and executes
-    pending migrations to ensure database schema is up to date.
+    Creates the database tables of an empty database, or executes the
+    migrations an existing one does not have yet; see
+    ``migrate.run_migrations``. A database that is up to date is only read.
 
     Raises:
         Exception: If migrations fail.
     """
-    Base.metadata.create_all(bind=engine)
-
     try:
         from migrate import run_migrations
 
@@ -30,3 +69,6 @@ def init_db():
     except Exception as e:
         logger.error(f"Migration failed: {e}")
         raise
+
+
+configure({})
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_TTL_MS = 30000
+PROBER_LEASE = "prober"
+
+_ACQUIRE_SQL = text(
+    """
+    INSERT INTO leader_leases (name, holder, acquired_at, expires_at)
+    VALUES (:name, :holder, :now, :expires_at)
+    ON CONFLICT (name) DO UPDATE SET
+        holder = excluded.holder,
+        acquired_at = CASE
+            WHEN leader_leases.holder = excluded.holder THEN leader_leases.acquired_at
+            ELSE excluded.acquired_at
+        END,
+        expires_at = excluded.expires_at
+    WHERE leader_leases.holder = excluded.holder OR leader_leases.expires_at < :now
+    """
+)
+
+
+class LeaderLease:
+    """Lease on a lock row in ``leader_leases`` electing one active process.
+
+    The holder renews the lease every third of its TTL. Other processes poll
+    at the same rate and take over once the lease has expired, so a crashed
+    holder is replaced within one TTL. A holder that cannot renew stops its
+    task once the TTL it last secured has run out, before anyone else can
+    acquire the lease.
+    """
+
+    def __init__(self, engine: Engine, app_config: dict, name: str = PROBER_LEASE):
+        """Create a lease handle.
+
+        Args:
+            engine (Engine): Database engine holding the ``leader_leases`` table.
+            app_config (dict): Application configuration. Reads ``monitor_lease_ttl``.
+            name (str): Name of the lock row.
+        """
+        self.engine = engine
+        self.name = name
+        self.ttl = app_config.get("monitor_lease_ttl", DEFAULT_LEASE_TTL_MS) / 1000
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        self.acquisitions = 0
+        self.losses = 0
+        self.renew_failures = 0
+        self.task_restarts = 0
+        self.last_renewed: Optional[float] = None
+
+    def try_acquire(self) -> bool:
+        """Acquire or renew the lease.
+
+        Returns:
+            bool: Whether this process holds the lease afterwards.
+        """
+        now = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(
+                _ACQUIRE_SQL,
+                {
+                    "name": self.name,
+                    "holder": self.holder,
+                    "now": now,
+                    "expires_at": now + self.ttl,
+                },
+            )
+            holder = connection.execute(
+                text("SELECT holder FROM leader_leases WHERE name = :name"),
+                {"name": self.name},
+            ).scalar()
+        return holder == self.holder
+
+    def release(self):
+        """Give up the lease so another process can take over immediately."""
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "DELETE FROM leader_leases WHERE name = :name AND holder = :holder"
+                ),
+                {"name": self.name, "holder": self.holder},
+            )
+
+    async def run(self, task_factory: Callable[[], Awaitable]):
+        """Run a task only while holding the lease, until cancelled.
+
+        The task is started when the lease is acquired and cancelled when it is
+        lost, or when it expires before a renewal succeeds. A task that stops
+        or fails while the lease is held is logged and started again after the
+        next renewal. The lease is released on exit.
+
+        Args:
+            task_factory (Callable[[], Awaitable]): Creates the coroutine to run
+                while this process is the leader.
+        """
+        loop = asyncio.get_running_loop()
+        task: Optional[asyncio.Task] = None
+        valid_until = 0.0
+        announced_standby = False
+
+        try:
+            while True:
+                attempt_started = loop.time()
+                acquire = loop.run_in_executor(None, self.try_acquire)
+                if task is not None:
+                    # Another process may take the lease over once it expires,
+                    # so a renewal blocked on the database stops the task then.
+                    await asyncio.wait(
+                        {acquire}, timeout=max(0.0, valid_until - loop.time())
+                    )
+                    if not acquire.done():
+                        logger.warning(f"{self.name} lease expired while renewing")
+                        self.losses += 1
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                        task = None
+                        self.held = False
+                try:
+                    held = await acquire
+                    if held:
+                        valid_until = attempt_started + self.ttl
+                        self.last_renewed = time.time()
+                except Exception as e:
+                    self.renew_failures += 1
+                    logger.warning(f"Could not renew {self.name} lease: {e}")
+                    held = task is not None and loop.time() < valid_until
+
+                if held and task is None:
+                    logger.info(f"Acquired {self.name} lease as {self.holder}")
+                    self.acquisitions += 1
+                    announced_standby = False
+                    task = asyncio.create_task(task_factory())
+                elif held and task.done():
+                    logger.info(f"Restarting {self.name} task")
+                    self.task_restarts += 1
+                    task = asyncio.create_task(task_factory())
+                elif not held and task is not None:
+                    logger.warning(f"Lost {self.name} lease, stopping")
+                    self.losses += 1
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    task = None
+                elif not held and not announced_standby:
+                    logger.info(f"{self.name} lease is held elsewhere, standing by")
+                    announced_standby = True
+                self.held = task is not None
+
+                if task is None:
+                    await asyncio.sleep(self.ttl / 3)
+                    continue
+                await asyncio.wait(
+                    {task}, timeout=min(self.ttl / 3, valid_until - loop.time())
+                )
+                if task.done():
+                    if task.cancelled():
+                        logger.error(f"{self.name} task was cancelled")
+                    elif task.exception() is not None:
+                        logger.error(
+                            f"{self.name} task failed", exc_info=task.exception()
+                        )
+                    else:
+                        logger.error(f"{self.name} task stopped")
+                    # Back off for one renewal interval so a task that fails
+                    # immediately is not restarted in a tight loop.
+                    await asyncio.sleep(self.ttl / 3)
+        finally:
+            self.held = False
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                try:
+                    await loop.run_in_executor(None, self.release)
+                except Exception as e:
+                    logger.warning(f"Could not release {self.name} lease: {e}")
+
+    def stats(self) -> dict:
+        """Return the state of the lease as seen by this process.
+
+        Returns:
+            dict: Lease name, this process's holder id, whether it holds the
+            lease, TTL, counts of acquisitions, losses, failed renewals and task
+            restarts, and the time of the last successful renewal.
+        """
+        return {
+            "name": self.name,
+            "holder": self.holder,
+            "held": self.held,
+            "ttl": self.ttl,
+            "acquisitions": self.acquisitions,
+            "losses": self.losses,
+            "renew_failures": self.renew_failures,
+            "task_restarts": self.task_restarts,
+            "last_renewed": self.last_renewed,
+        }
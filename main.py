@@ -24,6 +24,9 @@ async def lifespan(app: FastAPI):
     - On startup: Loads configuration, initializes database, starts monitoring service
     - On shutdown: Cancels the monitoring service
 
+    With ``monitor_in_api: false`` the API only serves reads and monitors are
+    probed by a separate ``worker.py`` process.
+
     Args:
         app (FastAPI): The FastAPI application instance.
 
@@ -31,10 +34,15 @@ async def lifespan(app: FastAPI):
         None
     """
     monitors_config, app_config, _ = config.load_config()
+    database.configure(app_config)
+    if not app_config.get("monitor_in_api", True):
+        logger.info("Monitoring disabled in the API process, serving read-only")
+        yield
+        return
+
     database.init_db()
-    aggregation.merge_duplicate_aggregates(database.engine, app_config)
-    aggregation.backfill_missing_aggregates(database.engine, app_config)
-    task = asyncio.create_task(monitor.monitor_service(monitors_config, app_config))
+    aggregation.reevaluate_degraded_status(database.engine, app_config)
+    task = asyncio.create_task(monitor.run_monitor(monitors_config, app_config))
     yield
     task.cancel()
     try:
@@ -77,6 +85,7 @@ def create_app():
 
     try:
         monitors_config, app_config, _ = config.load_config()
+        database.configure(app_config)
 
         routers = init_routers(monitors_config, app_config)
         for router in routers:
@@ -1,39 +1,328 @@
+import asyncio
+import importlib
+import json
 import logging
-from database import engine
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, insert, select, update
+
+import database
+from api.models import Base, SchemaVersion
+from counters import TimingCounter
 from migrations.versions import MIGRATIONS, CURRENT_VERSION
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MIGRATION_BATCH_SIZE = 5000
+DEFAULT_MIGRATION_BATCH_PAUSE_MS = 50
+MIGRATION_RETRY_DELAY = 60.0
+
+schema_version_table = SchemaVersion.__table__
+
+
+def _module(migration: dict):
+    return importlib.import_module(migration["module"])
+
+
+def read_schema_versions(connection) -> Optional[Dict[str, dict]]:
+    """Return the rows of ``schema_version`` by version.
+
+    Returns:
+        dict: Applied migrations, ``None`` when the table does not exist yet.
+    """
+    if not inspect(connection).has_table(schema_version_table.name):
+        return None
+    return {
+        row["version"]: dict(row)
+        for row in connection.execute(select(schema_version_table)).mappings()
+    }
+
+
+def _record_version(connection, migration: dict, complete: bool):
+    now = datetime.now()
+    connection.execute(
+        insert(schema_version_table).values(
+            version=migration["version"],
+            description=migration["description"],
+            applied_at=now,
+            completed_at=now if complete else None,
+        )
+    )
+
+
+def _stamp_fresh(connection) -> bool:
+    """Create the current schema in an empty database and mark it migrated.
+
+    Returns:
+        bool: Whether the database was empty.
+    """
+    if inspect(connection).get_table_names():
+        return False
+    Base.metadata.create_all(bind=connection)
+    for migration in MIGRATIONS:
+        _record_version(connection, migration, complete=True)
+    return True
+
+
+def _apply(engine, migration: dict) -> bool:
+    """Apply one migration and record it, unless another process did.
+
+    Returns:
+        bool: Whether the migration was applied here.
+    """
+    module = _module(migration)
+    with engine.begin() as connection:
+        database.backend.lock_migrations(connection)
+        applied = read_schema_versions(connection)
+        if applied is not None and migration["version"] in applied:
+            return False
+        module.upgrade(connection)
+        _record_version(
+            connection, migration, complete=not hasattr(module, "migrate_batch")
+        )
+    return True
+
+
+def migrate_batch(engine, migration: dict, checkpoint, batch_size: int) -> tuple:
+    """Run the next batch of a migration and store its checkpoint.
+
+    The checkpoint is stored after the batch commits, so a batch must be
+    safe to run again from the previous checkpoint. The migration is marked
+    complete once a batch moves nothing.
+
+    Returns:
+        tuple: Rows the batch moved and the new checkpoint.
+    """
+    moved, checkpoint = _module(migration).migrate_batch(engine, checkpoint, batch_size)
+    values = {"checkpoint": json.dumps(checkpoint) if checkpoint is not None else None}
+    if not moved:
+        values["completed_at"] = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(
+            update(schema_version_table)
+            .where(schema_version_table.c.version == migration["version"])
+            .values(**values)
+        )
+    return moved, checkpoint
+
+
+def _checkpoint(row: dict):
+    return json.loads(row["checkpoint"]) if row["checkpoint"] is not None else None
 
-def run_migrations():
-    """Execute all pending database migrations.
 
-    Dynamically loads and executes migration modules in order, applying schema
-    changes and other database modifications. Each migration is logged for
-    tracking and debugging purposes.
+def _finish(engine, migration: dict, row: dict):
+    """Run the batches of a migration until it completes."""
+    checkpoint = _checkpoint(row)
+    total = 0
+    started = time.perf_counter()
+    while True:
+        moved, checkpoint = migrate_batch(
+            engine, migration, checkpoint, DEFAULT_MIGRATION_BATCH_SIZE
+        )
+        if not moved:
+            break
+        total += moved
+    if total:
+        logger.info(
+            f"Migration {migration['version']} moved {total} rows in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+
+def pending_background(applied: Optional[Dict[str, dict]]) -> List[dict]:
+    """Return the applied migrations whose background batches are not done."""
+    return [
+        migration
+        for migration in MIGRATIONS
+        if applied
+        and migration["version"] in applied
+        and applied[migration["version"]]["completed_at"] is None
+        and getattr(_module(migration), "BACKGROUND", False)
+    ]
+
+
+def run_migrations(engine=None):
+    """Apply the migrations the database does not have yet.
+
+    Applied migrations are recorded in ``schema_version``, each in the
+    transaction that applies it, so every migration runs once. When the
+    database is current this only reads ``schema_version``. An empty
+    database gets the current schema at once and is recorded as migrated.
+    A database from before ``schema_version`` existed gets every migration
+    once; they all check what exists first.
+
+    A migration may move data in batches, with ``migrate_batch``, after its
+    schema change. Its batches run here before the next migration, unless
+    it sets ``BACKGROUND``, in which case ``OnlineMigrations`` runs them
+    while the service runs. Either way an interrupted migration resumes
+    from its last checkpoint.
+
+    Migrations change the database file only: record partitions are created
+    from the current ``monitor_checks`` model, so a migration changing that
+    table has to change existing partitions as well.
+
+    Args:
+        engine (Engine, optional): Database to migrate, ``database.engine``
+            by default.
 
     Raises:
         Exception: If any migration fails during execution, the exception is
                   logged and re-raised to halt the migration process.
     """
-    logger.info(f"Running migrations up to version {CURRENT_VERSION}")
+    engine = engine or database.engine
+    with engine.connect() as connection:
+        applied = read_schema_versions(connection)
+    if applied is not None and all(
+        migration["version"] in applied
+        and (
+            applied[migration["version"]]["completed_at"] is not None
+            or getattr(_module(migration), "BACKGROUND", False)
+        )
+        for migration in MIGRATIONS
+    ):
+        logger.info(f"Database schema is at version {CURRENT_VERSION}")
+        return
+
+    if applied is None:
+        with engine.begin() as connection:
+            database.backend.lock_migrations(connection)
+            if _stamp_fresh(connection):
+                logger.info(f"Created database schema version {CURRENT_VERSION}")
+                return
+    Base.metadata.create_all(bind=engine)
 
+    logger.info(f"Running migrations up to version {CURRENT_VERSION}")
     for migration in MIGRATIONS:
+        version = migration["version"]
         try:
-            module_name = migration["module"]
-            version = migration["version"]
-            description = migration["description"]
+            if _apply(engine, migration):
+                logger.info(
+                    f"✓ Migration {version} applied: {migration['description']}"
+                )
+            module = _module(migration)
+            if hasattr(module, "migrate_batch") and not getattr(
+                module, "BACKGROUND", False
+            ):
+                with engine.connect() as connection:
+                    row = read_schema_versions(connection)[version]
+                if row["completed_at"] is None:
+                    _finish(engine, migration, row)
+        except Exception as e:
+            logger.error(f"✗ Migration {version} failed: {e}")
+            raise
 
-            logger.info(f"Applying migration {version}: {description}")
 
-            parts = module_name.split(".")
-            module = __import__(module_name, fromlist=[parts[-1]])
+class OnlineMigrations:
+    """Background batches of migrations that set ``BACKGROUND``.
 
-            module.upgrade(engine)
-            logger.info(f"✓ Migration {version} applied successfully")
-        except Exception as e:
-            logger.error(f"✗ Migration {version} failed: {e}")
+    Each pending migration runs ``migration_batch_size`` rows per batch with
+    a pause of ``migration_batch_pause`` milliseconds in between, and its
+    checkpoint is stored in ``schema_version`` after every batch, so a
+    stopped migration resumes where it left off.
+
+    Until the migrations are ``done``, tasks reading the migrated data, such
+    as the aggregate backfill, wait.
+    """
+
+    def __init__(self, app_config: dict):
+        """Create the background migrations.
+
+        Args:
+            app_config (dict): Application configuration. Reads
+                ``migration_batch_size`` and ``migration_batch_pause``.
+        """
+        self.batch_size = max(
+            1,
+            int(app_config.get("migration_batch_size", DEFAULT_MIGRATION_BATCH_SIZE)),
+        )
+        self.batch_pause = (
+            app_config.get("migration_batch_pause", DEFAULT_MIGRATION_BATCH_PAUSE_MS)
+            / 1000
+        )
+        self.done = asyncio.Event()
+        self._stopping = False
+        self._status = "waiting"
+        self._running: Optional[str] = None
+        self._moved = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._batch_latency = TimingCounter()
+
+    def _migrate(self) -> bool:
+        """Run every pending migration; return whether they all completed."""
+        with database.engine.connect() as connection:
+            applied = read_schema_versions(connection)
+        for migration in pending_background(applied):
+            self._running = migration["version"]
+            checkpoint = _checkpoint(applied[migration["version"]])
+            while True:
+                started = time.perf_counter()
+                moved, checkpoint = migrate_batch(
+                    database.engine, migration, checkpoint, self.batch_size
+                )
+                if not moved:
+                    break
+                self._batch_latency.add(time.perf_counter() - started)
+                self._moved += moved
+                if self._stopping:
+                    return False
+                if self.batch_pause:
+                    time.sleep(self.batch_pause)
+        self._running = None
+        return True
+
+    async def run(self):
+        """Run the pending migrations, then set ``done`` and return.
+
+        Errors are logged and the migrations retried after
+        ``MIGRATION_RETRY_DELAY`` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        self._started = time.monotonic()
+        try:
+            while True:
+                self._status = "migrating"
+                try:
+                    if await loop.run_in_executor(None, self._migrate):
+                        break
+                except Exception as e:
+                    logger.exception(f"Migration {self._running} failed: {e}")
+                self._status = "retrying"
+                await asyncio.sleep(MIGRATION_RETRY_DELAY)
+        except asyncio.CancelledError:
+            # The running batch finishes on its own thread.
+            self._stopping = True
+            self._status = "stopped"
             raise
+        self._status = "done"
+        self._finished = time.monotonic()
+        self.done.set()
+        if self._moved:
+            logger.info(
+                f"Migrations moved {self._moved} rows in the background in "
+                f"{self._finished - self._started:.1f}s"
+            )
+
+    def stats(self) -> dict:
+        """Return the progress of the migrations.
+
+        Returns:
+            dict: Status, version migrating, rows moved, elapsed seconds, rows
+            per second and batch latency in seconds.
+        """
+        elapsed = None
+        if self._started is not None:
+            elapsed = (self._finished or time.monotonic()) - self._started
+        return {
+            "status": self._status,
+            "version": self._running,
+            "moved": self._moved,
+            "elapsed": elapsed,
+            "rows_per_sec": self._moved / elapsed if elapsed else None,
+            "batch_latency": self._batch_latency.as_dict(),
+        }
 
 
 if __name__ == "__main__":
@@ -18,11 +18,11 @@ class MonitorRecord(Base):
     response_time = Column(Float, nullable=True)
 
 
-def upgrade(engine):
+def upgrade(connection):
     """Apply migration."""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=connection)
 
 
-def downgrade(engine):
+def downgrade(connection):
     """Revert migration."""
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=connection)
@@ -0,0 +1,48 @@
+"""Description: Add request phase timing columns to records and aggregates."""
+
+from sqlalchemy import inspect, text
+
+RECORD_COLUMNS = {
+    "dns_time": "FLOAT",
+    "connect_time": "FLOAT",
+    "tls_time": "FLOAT",
+    "ttfb": "FLOAT",
+}
+
+AGGREGATE_COLUMNS = {
+    "phase_sample_count": "INTEGER NOT NULL DEFAULT 0",
+    "avg_dns_time": "FLOAT",
+    "avg_connect_time": "FLOAT",
+    "avg_tls_time": "FLOAT",
+    "avg_ttfb": "FLOAT",
+}
+
+
+def _existing_columns(connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def upgrade(connection):
+    """Apply migration - add phase timing columns missing from existing tables."""
+    for table, columns in (
+        ("monitor_records", RECORD_COLUMNS),
+        ("heartbeat_aggregates", AGGREGATE_COLUMNS),
+    ):
+        existing = _existing_columns(connection, table)
+        for column, definition in columns.items():
+            if column not in existing:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                )
+
+
+def downgrade(connection):
+    """Revert migration - drop phase timing columns."""
+    for table, columns in (
+        ("monitor_records", RECORD_COLUMNS),
+        ("heartbeat_aggregates", AGGREGATE_COLUMNS),
+    ):
+        existing = _existing_columns(connection, table)
+        for column in columns:
+            if column in existing:
+                connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
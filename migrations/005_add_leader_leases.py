@@ -0,0 +1,24 @@
+"""Description: Add leader_leases table for electing the active prober."""
+
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    """Apply migration - create lease table."""
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS leader_leases (
+                name VARCHAR NOT NULL PRIMARY KEY,
+                holder VARCHAR NOT NULL,
+                acquired_at FLOAT NOT NULL,
+                expires_at FLOAT NOT NULL
+            )
+            """
+        )
+    )
+
+
+def downgrade(connection):
+    """Revert migration - drop lease table."""
+    connection.execute(text("DROP TABLE IF EXISTS leader_leases"))
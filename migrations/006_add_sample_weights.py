@@ -0,0 +1,43 @@
+"""Description: Add time weights for uneven check frequency to records and aggregates."""
+
+from sqlalchemy import inspect, text
+
+RECORD_COLUMNS = {
+    "check_interval": "FLOAT",
+}
+
+AGGREGATE_COLUMNS = {
+    "sample_weight": "FLOAT NOT NULL DEFAULT 0",
+    "issue_weight": "FLOAT NOT NULL DEFAULT 0",
+    "response_weight": "FLOAT NOT NULL DEFAULT 0",
+}
+
+
+def _existing_columns(connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def upgrade(connection):
+    """Apply migration - add weight columns missing from existing tables."""
+    for table, columns in (
+        ("monitor_records", RECORD_COLUMNS),
+        ("heartbeat_aggregates", AGGREGATE_COLUMNS),
+    ):
+        existing = _existing_columns(connection, table)
+        for column, definition in columns.items():
+            if column not in existing:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                )
+
+
+def downgrade(connection):
+    """Revert migration - drop weight columns."""
+    for table, columns in (
+        ("monitor_records", RECORD_COLUMNS),
+        ("heartbeat_aggregates", AGGREGATE_COLUMNS),
+    ):
+        existing = _existing_columns(connection, table)
+        for column in columns:
+            if column in existing:
+                connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
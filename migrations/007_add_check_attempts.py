@@ -0,0 +1,19 @@
+"""Description: Add attempts column holding confirmation retry sub-samples."""
+
+from sqlalchemy import inspect, text
+
+
+def _existing_columns(connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def upgrade(connection):
+    """Apply migration - add attempts column to monitor records."""
+    if "attempts" not in _existing_columns(connection, "monitor_records"):
+        connection.execute(text("ALTER TABLE monitor_records ADD COLUMN attempts TEXT"))
+
+
+def downgrade(connection):
+    """Revert migration - drop attempts column."""
+    if "attempts" in _existing_columns(connection, "monitor_records"):
+        connection.execute(text("ALTER TABLE monitor_records DROP COLUMN attempts"))
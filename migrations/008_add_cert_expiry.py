@@ -0,0 +1,27 @@
+"""Description: Add certificate expiry column for TLS monitors."""
+
+from sqlalchemy import DateTime, inspect, text
+
+
+def _existing_columns(connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def upgrade(connection):
+    """Apply migration - add cert_expires_at column to monitor records."""
+    if "cert_expires_at" not in _existing_columns(connection, "monitor_records"):
+        datetime_type = DateTime().compile(dialect=connection.dialect)
+        connection.execute(
+            text(
+                "ALTER TABLE monitor_records "
+                f"ADD COLUMN cert_expires_at {datetime_type}"
+            )
+        )
+
+
+def downgrade(connection):
+    """Revert migration - drop cert_expires_at column."""
+    if "cert_expires_at" in _existing_columns(connection, "monitor_records"):
+        connection.execute(
+            text("ALTER TABLE monitor_records DROP COLUMN cert_expires_at")
+        )
@@ -0,0 +1,24 @@
+"""Description: Add aggregate_watermarks table for crash recovery of buffered buckets."""
+
+from sqlalchemy import DateTime, text
+
+
+def upgrade(connection):
+    """Apply migration - create watermark table."""
+    datetime_type = DateTime().compile(dialect=connection.dialect)
+    connection.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS aggregate_watermarks (
+                name VARCHAR NOT NULL PRIMARY KEY,
+                record_id INTEGER NOT NULL,
+                updated_at {datetime_type} NOT NULL
+            )
+            """
+        )
+    )
+
+
+def downgrade(connection):
+    """Revert migration - drop watermark table."""
+    connection.execute(text("DROP TABLE IF EXISTS aggregate_watermarks"))
@@ -0,0 +1,35 @@
+"""Description: Add latency sketch and degraded threshold columns to aggregates."""
+
+from sqlalchemy import Float, LargeBinary, inspect, text
+
+AGGREGATE_COLUMNS = {
+    "response_sketch": LargeBinary(),
+    "degraded_threshold": Float(),
+}
+
+
+def _existing_columns(connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def upgrade(connection):
+    """Apply migration - add sketch columns missing from heartbeat_aggregates."""
+    existing = _existing_columns(connection, "heartbeat_aggregates")
+    for column, column_type in AGGREGATE_COLUMNS.items():
+        if column not in existing:
+            definition = column_type.compile(dialect=connection.dialect)
+            connection.execute(
+                text(
+                    f"ALTER TABLE heartbeat_aggregates ADD COLUMN {column} {definition}"
+                )
+            )
+
+
+def downgrade(connection):
+    """Revert migration - drop sketch columns."""
+    existing = _existing_columns(connection, "heartbeat_aggregates")
+    for column in AGGREGATE_COLUMNS:
+        if column in existing:
+            connection.execute(
+                text(f"ALTER TABLE heartbeat_aggregates DROP COLUMN {column}")
+            )
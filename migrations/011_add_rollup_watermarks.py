@@ -0,0 +1,26 @@
+"""Description: Add rollup_watermarks table tracking compaction between intervals."""
+
+from sqlalchemy import DateTime, text
+
+
+def upgrade(connection):
+    """Apply migration - create rollup watermark table."""
+    datetime_type = DateTime().compile(dialect=connection.dialect)
+    connection.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                child VARCHAR NOT NULL,
+                parent VARCHAR NOT NULL,
+                compacted_until {datetime_type} NOT NULL,
+                updated_at {datetime_type} NOT NULL,
+                PRIMARY KEY (child, parent)
+            )
+            """
+        )
+    )
+
+
+def downgrade(connection):
+    """Revert migration - drop rollup watermark table."""
+    connection.execute(text("DROP TABLE IF EXISTS rollup_watermarks"))
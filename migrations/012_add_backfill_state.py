@@ -0,0 +1,26 @@
+"""Description: Add aggregate_backfill_state table checkpointing the aggregate backfill."""
+
+from sqlalchemy import DateTime, text
+
+
+def upgrade(connection):
+    """Apply migration - create aggregate backfill state table."""
+    datetime_type = DateTime().compile(dialect=connection.dialect)
+    connection.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS aggregate_backfill_state (
+                monitor_name VARCHAR NOT NULL PRIMARY KEY,
+                backfilled_until {datetime_type} NOT NULL,
+                records_scanned INTEGER NOT NULL DEFAULT 0,
+                buckets_inserted INTEGER NOT NULL DEFAULT 0,
+                updated_at {datetime_type} NOT NULL
+            )
+            """
+        )
+    )
+
+
+def downgrade(connection):
+    """Revert migration - drop aggregate backfill state table."""
+    connection.execute(text("DROP TABLE IF EXISTS aggregate_backfill_state"))
@@ -0,0 +1,47 @@
+"""Description: Move records and aggregates to compact tables keyed by monitor id."""
+
+from typing import Optional, Tuple
+
+from api.models import HeartbeatAggregate, Monitor, MonitorRecord
+from conversion import move_legacy_aggregates, move_legacy_records, recent_records_start
+
+
+def upgrade(connection):
+    """Apply migration - create the compact tables.
+
+    Existing rows are moved by ``migrate_batch`` at startup.
+    """
+    Monitor.metadata.create_all(
+        bind=connection,
+        tables=[
+            Monitor.__table__,
+            MonitorRecord.__table__,
+            HeartbeatAggregate.__table__,
+        ],
+    )
+
+
+def migrate_batch(
+    engine, checkpoint: Optional[int], batch_size: int
+) -> Tuple[int, Optional[int]]:
+    """Move a batch of aggregate buckets, then of recent records.
+
+    Recent records are those the aggregates do not include yet, from the
+    id in the checkpoint up; older records are moved in the background by
+    migration 1.0.13.
+    """
+    moved = move_legacy_aggregates(engine, batch_size, {})
+    if moved:
+        return moved, checkpoint
+    if checkpoint is None:
+        checkpoint = recent_records_start(engine)
+        if checkpoint is None:
+            return 0, None
+    return move_legacy_records(engine, batch_size, {}, checkpoint), checkpoint
+
+
+def downgrade(connection):
+    """Revert migration - not supported, the legacy tables are dropped."""
+    raise NotImplementedError(
+        "Records and aggregates cannot be moved back to the legacy tables"
+    )
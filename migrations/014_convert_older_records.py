@@ -0,0 +1,32 @@
+"""Description: Move the remaining legacy records to the compact records table."""
+
+from typing import Optional, Tuple
+
+from conversion import drop_legacy_records, move_legacy_records
+
+# Records are moved while the service runs; until then raw history older
+# than the records moved so far is missing from the API.
+BACKGROUND = True
+
+
+def upgrade(connection):
+    """Apply migration - nothing to change, records are moved in batches."""
+
+
+def migrate_batch(
+    engine, checkpoint: Optional[int], batch_size: int
+) -> Tuple[int, Optional[int]]:
+    """Move the newest legacy records left, dropping the table once empty.
+
+    A batch is copied and deleted in one transaction, so the table itself
+    tracks the progress.
+    """
+    moved = move_legacy_records(engine, batch_size, {})
+    if not moved and not drop_legacy_records(engine):
+        raise RuntimeError("Legacy records were added while they were moved")
+    return moved, None
+
+
+def downgrade(connection):
+    """Revert migration - not supported, the legacy records table is dropped."""
+    raise NotImplementedError("Records cannot be moved back to the legacy table")
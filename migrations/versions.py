@@ -1,4 +1,4 @@
-CURRENT_VERSION = "1.0.2"
+CURRENT_VERSION = "1.0.13"
 
 MIGRATIONS = [
     {
@@ -16,4 +16,59 @@ MIGRATIONS = [
         "description": "Add heartbeat aggregate buckets table",
         "module": "migrations.003_add_heartbeat_aggregates",
     },
+    {
+        "version": "1.0.3",
+        "description": "Add request phase timing columns",
+        "module": "migrations.004_add_phase_timings",
+    },
+    {
+        "version": "1.0.4",
+        "description": "Add leader lease table",
+        "module": "migrations.005_add_leader_leases",
+    },
+    {
+        "version": "1.0.5",
+        "description": "Add sample time weights",
+        "module": "migrations.006_add_sample_weights",
+    },
+    {
+        "version": "1.0.6",
+        "description": "Add confirmation retry attempts",
+        "module": "migrations.007_add_check_attempts",
+    },
+    {
+        "version": "1.0.7",
+        "description": "Add TLS certificate expiry",
+        "module": "migrations.008_add_cert_expiry",
+    },
+    {
+        "version": "1.0.8",
+        "description": "Add aggregate flush watermark",
+        "module": "migrations.009_add_aggregate_watermarks",
+    },
+    {
+        "version": "1.0.9",
+        "description": "Add aggregate latency sketches",
+        "module": "migrations.010_add_latency_sketches",
+    },
+    {
+        "version": "1.0.10",
+        "description": "Add aggregate rollup watermarks",
+        "module": "migrations.011_add_rollup_watermarks",
+    },
+    {
+        "version": "1.0.11",
+        "description": "Add aggregate backfill progress",
+        "module": "migrations.012_add_backfill_state",
+    },
+    {
+        "version": "1.0.12",
+        "description": "Move records and aggregates to the compact schema",
+        "module": "migrations.013_compact_schema",
+    },
+    {
+        "version": "1.0.13",
+        "description": "Move older records to the compact schema in the background",
+        "module": "migrations.014_convert_older_records",
+    },
 ]
@@ -1,222 +1,474 @@
 import asyncio
+import json
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from typing import Optional
 
 import aiohttp
 
 import database
-from aggregation import upsert_aggregates_for_record
 from api.models import MonitorRecord
+from archive import RecordArchiver
+from backfill import AggregateBackfill
+from lease import LeaderLease
+from migrate import OnlineMigrations
+from notifications import NotificationDispatcher
+from persistence import RecordWriter
+from probe_pool import ProbePool
+from probe_timing import RequestTimings
+from probes import (
+    DEFAULT_CERT_EXPIRY_DAYS,
+    DEFAULT_MAX_BANNER_BYTES,
+    BodyMatcher,
+    get_confirm_options,
+    get_http_options,
+    get_monitor_type,
+    get_socket_target,
+    probe_dns,
+    probe_tcp,
+    probe_tls,
+    read_body,
+)
+from retention import RetentionPruner
+from scheduler import MonitorScheduler
+from sharding import ShardSupervisor
 
 logger = logging.getLogger(__name__)
 
 monitor_last_status = {}
+active_scheduler: Optional[MonitorScheduler] = None
+active_pool: Optional[ProbePool] = None
+active_writer: Optional[RecordWriter] = None
+active_backfill: Optional[AggregateBackfill] = None
+active_migrations: Optional[OnlineMigrations] = None
+active_retention: Optional[RetentionPruner] = None
+active_archiver: Optional[RecordArchiver] = None
+active_notifier: Optional[NotificationDispatcher] = None
+active_shards: Optional[ShardSupervisor] = None
+active_lease: Optional[LeaderLease] = None
+confirmation_counters = {"retried": 0, "recovered": 0, "confirmed": 0}
+unknown_cert_expiry = set()
+
+
+async def check_socket_monitor(
+    monitor: dict, pool: ProbePool, monitor_type: str
+) -> MonitorRecord:
+    """Check a TCP, DNS or TLS monitor.
+
+    ``tcp`` monitors connect to the port and, with ``banner`` or
+    ``banner_regex``, are DOWN unless the greeting the server sends matches.
+    ``dns`` monitors resolve the host without caching and, with
+    ``expected_addresses``, are DOWN unless one of them is returned.
+    ``tls`` monitors complete a handshake, record the certificate expiry, and
+    are DOWN when it expires within ``cert_expiry_days``. With ``verify: false``
+    the expiry is only known when ``cryptography`` is installed.
 
+    Args:
+        monitor (dict): Monitor configuration.
+        pool (ProbePool): Probe pool providing the resolver, SSL contexts and
+            concurrency slots.
+        monitor_type (str): ``tcp``, ``dns`` or ``tls``.
+
+    Returns:
+        MonitorRecord: Unsaved record describing the check result.
+    """
+    name = monitor["name"]
+    response_time = None
+    is_up = False
+    cert_expires_at = None
+    timings = RequestTimings()
+    problem = None
 
-def _save_record(db, record: MonitorRecord, app_config: dict, monitor_name: str):
-    """Persist a monitor record and keep session state clean on DB failures."""
     try:
-        db.add(record)
-        upsert_aggregates_for_record(db, record, app_config)
-        db.commit()
+        host, port = get_socket_target(monitor, monitor_type)
+        async with pool.slot(), asyncio.timeout(10):
+            start_time = time.perf_counter()
+            if monitor_type == "tcp":
+                keyword = monitor.get("banner")
+                regex = monitor.get("banner_regex")
+                matcher = BodyMatcher(keyword, regex) if keyword or regex else None
+                matched = await probe_tcp(
+                    pool.resolver,
+                    host,
+                    port,
+                    timings,
+                    matcher,
+                    int(monitor.get("max_banner_bytes", DEFAULT_MAX_BANNER_BYTES)),
+                )
+                is_up = matched is not False
+                if not is_up:
+                    problem = "banner not matched"
+            elif monitor_type == "dns":
+                addresses = await probe_dns(
+                    host,
+                    monitor.get("record_type", "A"),
+                    monitor.get("nameservers"),
+                )
+                timings.dns_time = time.perf_counter() - start_time
+                expected = monitor.get("expected_addresses")
+                is_up = not expected or bool(set(expected) & set(addresses))
+                if not is_up:
+                    problem = f"unexpected answer {addresses}"
+            else:
+                verify = monitor.get("verify", True)
+                cert_expires_at = await probe_tls(
+                    pool.resolver, host, port, timings, pool.ssl_context(verify)
+                )
+                if cert_expires_at is None and not verify:
+                    if name not in unknown_cert_expiry:
+                        unknown_cert_expiry.add(name)
+                        logger.warning(
+                            f"{name}: certificate expiry unknown, unverified "
+                            "certificates require cryptography "
+                            "(pip install cryptography)"
+                        )
+                min_days = monitor.get("cert_expiry_days", DEFAULT_CERT_EXPIRY_DAYS)
+                is_up = cert_expires_at is None or (
+                    cert_expires_at - datetime.now() >= timedelta(days=min_days)
+                )
+                if not is_up:
+                    problem = f"certificate expires {cert_expires_at.isoformat()}"
+            response_time = time.perf_counter() - start_time
+        pool.record_timings(timings)
+
+        if is_up:
+            logger.info(f"{name}: {monitor_type} ({response_time:.2f}s) - UP")
+        else:
+            logger.warning(f"{name}: {monitor_type} {problem} - DOWN")
+    except asyncio.TimeoutError:
+        logger.warning(f"{name}: TIMEOUT - DOWN")
     except Exception as e:
-        db.rollback()
-        logger.exception(f"{monitor_name}: Failed to persist monitor record: {e}")
-
-
-async def send_discord_notification(
-    name: str,
-    is_up: bool,
-    status_code: Optional[int],
-    response_time: Optional[float],
-    monitor: dict,
-):
-    """Send status change notification to Discord.
+        logger.error(f"{name}: ERROR - {str(e)}")
 
-    Posts an embed message to the configured Discord webhook URL with
-    monitor status information.
+    return MonitorRecord(
+        monitor_name=name,
+        timestamp=datetime.now(),
+        status_code=None,
+        is_up=is_up,
+        response_time=response_time,
+        cert_expires_at=cert_expires_at,
+        **timings.as_dict(),
+    )
 
-    Args:
-        name (str): Name of the monitor.
-        is_up (bool): Whether the monitor is up or down.
-        status_code (Optional[int]): HTTP status code, None if error/timeout.
-        response_time (Optional[float]): Response time in seconds, None if error/timeout.
-        monitor (dict): Monitor configuration containing Discord webhook URL.
-    """
-    webhook_url = monitor.get("discordIntegration", {}).get("webhookUrl")
-    if not webhook_url:
-        return
-
-    status_text = "✅ UP" if is_up else "❌ DOWN"
-    color = 3066993 if is_up else 15158332
-
-    embed = {
-        "title": f"{name} - {status_text}",
-        "color": color,
-        "fields": [
-            {"name": "URL", "value": monitor["url"], "inline": False},
-            {
-                "name": "Status Code",
-                "value": str(status_code) if status_code else "N/A",
-                "inline": True,
-            },
-            {
-                "name": "Response Time",
-                "value": f"{response_time:.2f}s" if response_time else "N/A",
-                "inline": True,
-            },
-            {"name": "Timestamp", "value": datetime.now().isoformat(), "inline": False},
-        ],
-    }
 
-    try:
-        async with (
-            aiohttp.ClientSession() as session,
-            session.post(webhook_url, json={"embeds": [embed]}) as response,
-        ):
-            if response.status not in [200, 204]:
-                logger.warning(f"Discord webhook failed for {name}: {response.status}")
-    except Exception as e:
-        logger.error(f"Failed to send Discord notification: {str(e)}")
+async def check_monitor(monitor: dict, pool: ProbePool) -> MonitorRecord:
+    """Check a single monitor's status.
 
+    Makes an HTTP request to the monitor URL within the probe pool's concurrency
+    budget. The response time is measured on a monotonic clock, and the DNS,
+    connect, TLS and time-to-first-byte phases are recorded alongside it.
+    Timeouts and errors are reported as a DOWN result.
 
-async def check_monitor(
-    monitor: dict, session: aiohttp.ClientSession, app_config: dict
-):
-    """Check a single monitor's status and record results.
+    Monitors may probe with ``method: HEAD``, which never reads a body. GET
+    probes read at most ``max_body_bytes`` of the body before releasing the
+    connection, and a ``keyword`` or ``keyword_regex`` assertion is scanned as
+    chunks arrive, stopping at the first match. A missing match marks the
+    monitor DOWN.
 
-    Makes an HTTP request to the monitor URL, records the result to the database,
-    and sends Discord notifications if the status changes.
+    Monitors of another ``type`` are checked by ``check_socket_monitor``.
 
     Args:
         monitor (dict): Monitor configuration with URL and settings.
-        session (aiohttp.ClientSession): HTTP session for making requests.
-        app_config (dict): Application configuration.
+        pool (ProbePool): Probe pool providing the HTTP session and concurrency slots.
+
+    Returns:
+        MonitorRecord: Unsaved record describing the check result.
     """
+    monitor_type = get_monitor_type(monitor)
+    if monitor_type != "http":
+        return await check_socket_monitor(monitor, pool, monitor_type)
+
     name = monitor["name"]
     url = monitor["url"]
     accepted_codes = set(monitor.get("accepted_status_codes", [200]))
     verify_ssl = monitor.get("verify", True)
-    db = database.SessionLocal()
+    method, max_body_bytes, matcher = get_http_options(monitor)
+
+    timestamp = None
+    status_code = None
+    response_time = None
+    is_up = False
+    timings = RequestTimings()
 
     try:
-        start_time = datetime.now()
-        async with session.get(
-            url, ssl=verify_ssl, timeout=aiohttp.ClientTimeout(total=10)
-        ) as response:
-            end_time = datetime.now()
-            response_time = (end_time - start_time).total_seconds()
-            status_code = response.status
-            is_up = status_code in accepted_codes
-
-            record = MonitorRecord(
-                monitor_name=name,
-                timestamp=end_time,
-                status_code=status_code,
-                is_up=is_up,
-                response_time=response_time,
-            )
-            _save_record(db, record, app_config, name)
+        async with pool.slot():
+            start_time = time.perf_counter()
+            async with pool.session.request(
+                method,
+                url,
+                ssl=pool.ssl_context(verify_ssl),
+                timeout=aiohttp.ClientTimeout(total=10),
+                trace_request_ctx=timings,
+            ) as response:
+                response_time = time.perf_counter() - start_time
+                timestamp = datetime.now()
+                status_code = response.status
+                is_up = status_code in accepted_codes
+                matched = None
+                if method == "GET" and (is_up or matcher is None):
+                    _, matched = await read_body(response, max_body_bytes, matcher)
+        pool.record_timings(timings)
+
+        if matched is False:
+            is_up = False
+            logger.warning(f"{name}: {status_code} - keyword not found - DOWN")
+        else:
             logger.info(
                 f"{name}: {status_code} ({response_time:.2f}s) - {'UP' if is_up else 'DOWN'}"
             )
+    except asyncio.TimeoutError:
+        logger.warning(f"{name}: TIMEOUT - DOWN")
+    except Exception as e:
+        logger.error(f"{name}: ERROR - {str(e)}")
 
-            last_status = monitor_last_status.get(name)
-            monitor_last_status[name] = is_up
+    return MonitorRecord(
+        monitor_name=name,
+        timestamp=timestamp or datetime.now(),
+        status_code=status_code,
+        is_up=is_up,
+        response_time=response_time,
+        **timings.as_dict(),
+    )
+
+
+def _attempt_summary(record: MonitorRecord) -> dict:
+    return {
+        "timestamp": record.timestamp.isoformat(),
+        "status_code": record.status_code,
+        "is_up": record.is_up,
+        "response_time": record.response_time,
+    }
 
-            if monitor.get("discordIntegration", {}).get("webhookUrl") and (
-                last_status is None or last_status != is_up
-            ):
-                await send_discord_notification(
-                    name, is_up, status_code, response_time, monitor
-                )
 
-    except asyncio.TimeoutError:
-        record = MonitorRecord(
-            monitor_name=name,
-            timestamp=datetime.now(),
-            status_code=None,
-            is_up=False,
-            response_time=None,
-        )
-        _save_record(db, record, app_config, name)
-        logger.warning(f"{name}: TIMEOUT - DOWN")
+async def confirm_failure(
+    monitor: dict, pool: ProbePool, record: MonitorRecord, retries: int, delay: float
+) -> MonitorRecord:
+    """Retry a failed check before a monitor is recorded as going DOWN.
 
-        last_status = monitor_last_status.get(name)
-        monitor_last_status[name] = False
+    Only called when the monitor was last recorded as UP, or has no result
+    yet, so a monitor that stays DOWN is not retried on every check. Retries
+    run immediately instead of waiting for the monitor's next tick, with the
+    delay doubling after each attempt. The first successful retry is returned
+    as the check result; if all retries fail, the original failure is returned.
+    Either way the other attempts are attached to the returned record as
+    sub-samples in ``attempts``.
 
-        if monitor.get("discordIntegration", {}).get("webhookUrl") and (
-            last_status is None or last_status is not False
-        ):
-            await send_discord_notification(name, False, None, None, monitor)
-    except Exception as e:
-        record = MonitorRecord(
-            monitor_name=name,
-            timestamp=datetime.now(),
-            status_code=None,
-            is_up=False,
-            response_time=None,
-        )
-        _save_record(db, record, app_config, name)
+    Args:
+        monitor (dict): Monitor configuration.
+        pool (ProbePool): Probe pool used for the retries.
+        record (MonitorRecord): Failed result of the scheduled check.
+        retries (int): Maximum number of retries.
+        delay (float): Seconds to wait before the first retry.
+
+    Returns:
+        MonitorRecord: The check result to record.
+    """
+    attempts = []
+    confirmation_counters["retried"] += 1
+    for attempt in range(retries):
+        await asyncio.sleep(delay * 2**attempt)
+        retry = await check_monitor(monitor, pool)
+        if retry.is_up:
+            confirmation_counters["recovered"] += 1
+            logger.info(
+                f"{record.monitor_name}: Recovered on retry {attempt + 1}, "
+                "not recording DOWN"
+            )
+            retry.attempts = json.dumps([_attempt_summary(record), *attempts])
+            return retry
+        attempts.append(_attempt_summary(retry))
 
-        logger.error(f"{name}: ERROR - {str(e)}")
+    confirmation_counters["confirmed"] += 1
+    record.attempts = json.dumps(attempts) if attempts else None
+    return record
 
-        last_status = monitor_last_status.get(name)
-        monitor_last_status[name] = False
 
-        if monitor.get("discordIntegration", {}).get("webhookUrl") and (
-            last_status is None or last_status is not False
-        ):
-            await send_discord_notification(name, False, None, None, monitor)
-    finally:
-        db.close()
+async def record_result(
+    monitor: dict,
+    record: MonitorRecord,
+    writer: RecordWriter,
+    notifier: NotificationDispatcher,
+):
+    """Persist a check result and notify on status changes.
+
+    Queues the record for the record writer and hands the transition to the
+    notification dispatcher if the monitor's status changed.
+
+    Args:
+        monitor (dict): Monitor configuration.
+        record (MonitorRecord): Result returned by ``check_monitor``.
+        writer (RecordWriter): Writer that persists the check result.
+        notifier (NotificationDispatcher): Dispatcher for status change notifications.
+    """
+    await writer.submit(record)
+
+    last_status = monitor_last_status.get(record.monitor_name)
+    monitor_last_status[record.monitor_name] = record.is_up
+
+    if last_status is None or last_status != record.is_up:
+        notifier.notify(monitor, record.is_up, record.status_code, record.response_time)
+
+
+async def run_probe_loop(monitors_config: list, app_config: dict, writer):
+    """Probe monitors on the running event loop until cancelled.
+
+    Schedules every monitor at its own interval, checks it through a shared
+    probe pool and hands each result to ``writer``. Each result is reported
+    back to the scheduler, which adjusts adaptive intervals and stamps the
+    record with the interval until the monitor's next check.
+
+    Args:
+        monitors_config (list): Monitor configurations to probe.
+        app_config (dict): Application configuration.
+        writer: Object with an async ``submit(record)`` method, the
+            ``RecordWriter`` or a shard's forwarding sink.
+    """
+    global active_scheduler, active_pool, active_notifier
+
+    async with (
+        ProbePool(app_config) as pool,
+        NotificationDispatcher(app_config) as notifier,
+    ):
+        active_pool = pool
+        active_notifier = notifier
+
+        async def run_check(monitor: dict):
+            record = await check_monitor(monitor, pool)
+            # Failures of a monitor already recorded as DOWN are not retried.
+            if (
+                not record.is_up
+                and monitor_last_status.get(record.monitor_name) is not False
+            ):
+                retries, delay = get_confirm_options(monitor, app_config)
+                if retries:
+                    record = await confirm_failure(
+                        monitor, pool, record, retries, delay
+                    )
+            record.check_interval = scheduler.observe(
+                record.monitor_name, record.is_up, record.response_time
+            )
+            await record_result(monitor, record, writer, notifier)
+
+        active_scheduler = scheduler = MonitorScheduler(
+            monitors_config,
+            run_check,
+            jitter=app_config.get("scheduler_jitter", 1.0),
+            adaptive=app_config.get("adaptive_checks", False),
+        )
+        try:
+            await scheduler.run()
+        finally:
+            active_scheduler = None
+            active_pool = None
+            active_notifier = None
 
 
 async def monitor_service(monitors_config: list, app_config: dict):
     """Main monitoring service loop.
 
-    Continuously checks all configured monitors at their configured intervals
-    and records their status. Runs in a background task for the lifetime of
-    the application.
+    Schedules every configured monitor at its own interval and records their
+    status. Runs in a background task for the lifetime of the application.
+
+    With ``probe_shards`` greater than 1, probing runs in that many worker
+    processes and their results are persisted by this process's writer.
+
+    Background migrations are completed, aggregate buckets
+    missing for stored records backfilled, rows past their ``retention``
+    pruned and closed months archived, in the background while probing runs.
 
     Args:
         monitors_config (list): List of monitor configurations.
+        app_config (dict): Application configuration.
     """
+    global active_writer, active_migrations, active_backfill, active_retention
+    global active_archiver, active_shards
+
     await asyncio.sleep(2)
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                tasks = []
-                for monitor in monitors_config:
-                    tasks.append(check_monitor(monitor, session, app_config))
-
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    for result in results:
-                        if isinstance(result, Exception):
-                            logger.error(
-                                "Unexpected monitor task exception that was recovered: %s",
-                                result,
-                                exc_info=(
-                                    type(result),
-                                    result,
-                                    result.__traceback__,
-                                ),
-                            )
-
-                interval_ms = (
-                    monitors_config[0].get("interval", 30000)
-                    if monitors_config
-                    else 30000
-                )
-                if not isinstance(interval_ms, (int, float)) or interval_ms <= 0:
-                    logger.warning(
-                        f"Invalid monitor interval '{interval_ms}', using default 30000ms"
-                    )
-                    interval_ms = 30000
-                await asyncio.sleep(interval_ms / 1000)
-            except Exception as e:
-                logger.exception(f"Monitor service loop recovered from error: {e}")
-                await asyncio.sleep(1)
+    active_writer = writer = RecordWriter(app_config)
+    active_migrations = OnlineMigrations(app_config)
+    active_backfill = AggregateBackfill(writer, app_config, active_migrations)
+    active_retention = RetentionPruner(writer, app_config)
+    active_archiver = RecordArchiver(writer, app_config, active_migrations)
+    writer_task = asyncio.create_task(writer.run())
+    migration_task = asyncio.create_task(active_migrations.run())
+    backfill_task = asyncio.create_task(active_backfill.run())
+    retention_task = asyncio.create_task(active_retention.run())
+    archive_task = asyncio.create_task(active_archiver.run())
+
+    shard_count = int(app_config.get("probe_shards", 1))
+    try:
+        if shard_count > 1:
+            active_shards = ShardSupervisor(monitors_config, app_config, shard_count)
+            await active_shards.run(writer)
+        else:
+            await run_probe_loop(monitors_config, app_config, writer)
+    finally:
+        active_shards = None
+        migration_task.cancel()
+        backfill_task.cancel()
+        retention_task.cancel()
+        archive_task.cancel()
+        await asyncio.gather(
+            migration_task,
+            backfill_task,
+            retention_task,
+            archive_task,
+            return_exceptions=True,
+        )
+        writer_task.cancel()
+        await asyncio.gather(writer_task, return_exceptions=True)
+        active_writer = None
+        active_migrations = None
+        active_backfill = None
+        active_retention = None
+        active_archiver = None
+
+
+async def run_monitor(monitors_config: list, app_config: dict):
+    """Run the monitoring service while this process holds the prober lease.
+
+    Several API workers or standalone workers may call this concurrently; the
+    lease in ``leader_leases`` ensures only one of them probes and writes
+    results at a time, and the others take over if it stops renewing.
+
+    Args:
+        monitors_config (list): List of monitor configurations.
+        app_config (dict): Application configuration.
+    """
+    global active_lease
+
+    active_lease = lease = LeaderLease(database.engine, app_config)
+    try:
+        await lease.run(lambda: monitor_service(monitors_config, app_config))
+    finally:
+        active_lease = None
+
+
+def get_monitor_stats() -> dict:
+    """Return runtime counters of the monitoring service in this process.
+
+    With probe shards, scheduler, probe and notification counters are lists
+    of what each shard last reported, and confirmation counters their totals.
+    """
+    stats = {
+        "scheduler": active_scheduler.stats() if active_scheduler else None,
+        "probes": active_pool.stats() if active_pool else None,
+        "writer": active_writer.stats() if active_writer else None,
+        "migrations": active_migrations.stats() if active_migrations else None,
+        "backfill": active_backfill.stats() if active_backfill else None,
+        "retention": active_retention.stats() if active_retention else None,
+        "archive": active_archiver.stats() if active_archiver else None,
+        "notifications": active_notifier.stats() if active_notifier else None,
+        "shards": active_shards.stats() if active_shards else None,
+        "lease": active_lease.stats() if active_lease else None,
+        "confirmation": dict(confirmation_counters),
+    }
+    if active_shards:
+        for key in ("scheduler", "probes", "notifications"):
+            stats[key] = active_shards.reported_stats(key)
+        for counters in active_shards.reported_stats("confirmation"):
+            for key, value in (counters or {}).items():
+                stats["confirmation"][key] += value
+    return stats
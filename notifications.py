@@ -0,0 +1,372 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_WINDOW_MS = 2000
+DEFAULT_FLAP_WINDOW_MS = 300000
+DEFAULT_FLAP_THRESHOLD = 4
+MAX_SEND_ATTEMPTS = 5
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_DESCRIPTION = 4000
+
+UP_COLOR = 3066993
+DOWN_COLOR = 15158332
+
+
+class StatusEvent:
+    """A monitor status transition waiting to be sent."""
+
+    __slots__ = (
+        "name",
+        "url",
+        "is_up",
+        "status_code",
+        "response_time",
+        "timestamp",
+        "queued_at",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        is_up: bool,
+        status_code: Optional[int],
+        response_time: Optional[float],
+        queued_at: float,
+    ):
+        self.name = name
+        self.url = url
+        self.is_up = is_up
+        self.status_code = status_code
+        self.response_time = response_time
+        self.timestamp = datetime.now()
+        self.queued_at = queued_at
+
+
+class _MonitorNotifyState:
+    """Transition history and last delivered status of one monitor."""
+
+    __slots__ = ("transitions", "notified_is_up")
+
+    def __init__(self):
+        self.transitions: deque = deque()
+        self.notified_is_up: Optional[bool] = None
+
+
+class _WebhookState:
+    """Pending events and rate limit state of one webhook URL."""
+
+    __slots__ = ("pending", "blocked_until", "task")
+
+    def __init__(self):
+        self.pending: Dict[str, StatusEvent] = {}
+        self.blocked_until = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+
+def build_discord_embed(event: StatusEvent) -> dict:
+    """Build the Discord embed describing a single status transition."""
+    status_text = "✅ UP" if event.is_up else "❌ DOWN"
+    return {
+        "title": f"{event.name} - {status_text}",
+        "color": UP_COLOR if event.is_up else DOWN_COLOR,
+        "fields": [
+            {"name": "URL", "value": event.url, "inline": False},
+            {
+                "name": "Status Code",
+                "value": str(event.status_code) if event.status_code else "N/A",
+                "inline": True,
+            },
+            {
+                "name": "Response Time",
+                "value": (
+                    f"{event.response_time:.2f}s" if event.response_time else "N/A"
+                ),
+                "inline": True,
+            },
+            {
+                "name": "Timestamp",
+                "value": event.timestamp.isoformat(),
+                "inline": False,
+            },
+        ],
+    }
+
+
+def build_summary_embeds(events: List[StatusEvent]) -> List[dict]:
+    """Build one summary embed per direction for a large batch of transitions."""
+    embeds = []
+    for is_up in (False, True):
+        names = sorted(e.name for e in events if e.is_up == is_up)
+        if not names:
+            continue
+
+        lines = []
+        length = 0
+        for index, name in enumerate(names):
+            line = f"• {name}"
+            if length + len(line) + 1 > MAX_EMBED_DESCRIPTION:
+                lines.append(f"…and {len(names) - index} more")
+                break
+            lines.append(line)
+            length += len(line) + 1
+
+        status_text = "✅ UP" if is_up else "❌ DOWN"
+        embeds.append(
+            {
+                "title": f"{len(names)} monitors - {status_text}",
+                "color": UP_COLOR if is_up else DOWN_COLOR,
+                "description": "\n".join(lines),
+                "timestamp": datetime.now().astimezone().isoformat(),
+            }
+        )
+    return embeds
+
+
+def _parse_seconds(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class NotificationDispatcher:
+    """Background dispatcher for Discord status notifications.
+
+    Probes hand transitions to ``notify`` without waiting for any HTTP call.
+    Transitions are buffered per webhook for a short batch window and then
+    delivered over one pooled session, with up to ten transitions as separate
+    embeds in a single message and larger bursts collapsed into summary embeds.
+
+    A monitor that flips back before its pending transition is delivered
+    produces no notification. A monitor with ``notification_flap_threshold``
+    transitions inside ``notification_flap_window`` is considered flapping,
+    and its notifications are held until it has been stable for a full window.
+
+    Discord rate limit headers and 429 ``Retry-After`` responses are honoured
+    per webhook.
+    """
+
+    def __init__(self, app_config: dict):
+        """Create a notification dispatcher from application configuration.
+
+        Args:
+            app_config (dict): Application configuration. Reads the
+                ``notification_queue_size``, ``notification_batch_window``,
+                ``notification_flap_window`` and ``notification_flap_threshold``
+                settings.
+        """
+        self.queue_size = int(
+            app_config.get("notification_queue_size", DEFAULT_QUEUE_SIZE)
+        )
+        self.batch_window = (
+            app_config.get("notification_batch_window", DEFAULT_BATCH_WINDOW_MS) / 1000
+        )
+        self.flap_window = (
+            app_config.get("notification_flap_window", DEFAULT_FLAP_WINDOW_MS) / 1000
+        )
+        self.flap_threshold = int(
+            app_config.get("notification_flap_threshold", DEFAULT_FLAP_THRESHOLD)
+        )
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._webhooks: Dict[str, _WebhookState] = {}
+        self._monitors: Dict[str, _MonitorNotifyState] = {}
+        self._pending_count = 0
+        self._counters = {
+            "queued": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "flap_suppressed": 0,
+            "messages_sent": 0,
+            "events_sent": 0,
+            "rate_limited": 0,
+            "failed": 0,
+        }
+
+    async def __aenter__(self) -> "NotificationDispatcher":
+        self.session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        tasks = [s.task for s in self._webhooks.values() if s.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _is_flapping(self, state: _MonitorNotifyState, now: float) -> bool:
+        while state.transitions and state.transitions[0] < now - self.flap_window:
+            state.transitions.popleft()
+        return len(state.transitions) >= self.flap_threshold
+
+    def notify(
+        self,
+        monitor: dict,
+        is_up: bool,
+        status_code: Optional[int],
+        response_time: Optional[float],
+    ):
+        """Queue a status transition for delivery without blocking.
+
+        Args:
+            monitor (dict): Monitor configuration containing the Discord webhook URL.
+            is_up (bool): Whether the monitor is up or down.
+            status_code (Optional[int]): HTTP status code, None if error/timeout.
+            response_time (Optional[float]): Response time in seconds, None if error/timeout.
+        """
+        webhook_url = monitor.get("discordIntegration", {}).get("webhookUrl")
+        if not webhook_url:
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        name = monitor["name"]
+
+        monitor_state = self._monitors.setdefault(name, _MonitorNotifyState())
+        monitor_state.transitions.append(now)
+
+        webhook = self._webhooks.setdefault(webhook_url, _WebhookState())
+        if name in webhook.pending:
+            self._counters["coalesced"] += 1
+        elif self._pending_count >= self.queue_size:
+            self._counters["dropped"] += 1
+            logger.warning(f"{name}: Notification queue full, dropping transition")
+            return
+        else:
+            self._pending_count += 1
+
+        webhook.pending[name] = StatusEvent(
+            name, monitor["url"], is_up, status_code, response_time, now
+        )
+        self._counters["queued"] += 1
+
+        if webhook.task is None:
+            webhook.task = asyncio.create_task(self._run_webhook(webhook_url, webhook))
+
+    def _ready_at(self, event: StatusEvent, now: float) -> float:
+        ready_at = event.queued_at + self.batch_window
+        state = self._monitors[event.name]
+        if self._is_flapping(state, now):
+            ready_at = max(ready_at, state.transitions[-1] + self.flap_window)
+        return ready_at
+
+    async def _run_webhook(self, webhook_url: str, webhook: _WebhookState):
+        loop = asyncio.get_running_loop()
+        try:
+            while webhook.pending:
+                now = loop.time()
+                ready_times = {
+                    name: self._ready_at(event, now)
+                    for name, event in webhook.pending.items()
+                }
+                wake_at = max(min(ready_times.values()), webhook.blocked_until)
+                if wake_at > now:
+                    await asyncio.sleep(wake_at - now)
+                    continue
+
+                events = []
+                for name, ready_at in ready_times.items():
+                    if ready_at > now:
+                        continue
+                    event = webhook.pending.pop(name)
+                    self._pending_count -= 1
+                    monitor_state = self._monitors[name]
+                    if monitor_state.notified_is_up == event.is_up:
+                        self._counters["flap_suppressed"] += 1
+                        continue
+                    events.append(event)
+
+                if events and await self._deliver(webhook_url, webhook, events):
+                    for event in events:
+                        self._monitors[event.name].notified_is_up = event.is_up
+        finally:
+            webhook.task = None
+
+    async def _deliver(
+        self, webhook_url: str, webhook: _WebhookState, events: List[StatusEvent]
+    ) -> bool:
+        if len(events) <= MAX_EMBEDS_PER_MESSAGE:
+            embeds = [build_discord_embed(event) for event in events]
+        else:
+            embeds = build_summary_embeds(events)
+
+        if await self._post(webhook_url, webhook, {"embeds": embeds}):
+            self._counters["messages_sent"] += 1
+            self._counters["events_sent"] += len(events)
+            return True
+        self._counters["failed"] += 1
+        return False
+
+    async def _post(
+        self, webhook_url: str, webhook: _WebhookState, payload: dict
+    ) -> bool:
+        loop = asyncio.get_running_loop()
+        for _ in range(MAX_SEND_ATTEMPTS):
+            delay = webhook.blocked_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                async with self.session.post(
+                    webhook_url, json=payload, timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    if response.headers.get("X-RateLimit-Remaining") == "0":
+                        reset_after = _parse_seconds(
+                            response.headers.get("X-RateLimit-Reset-After")
+                        )
+                        if reset_after:
+                            webhook.blocked_until = loop.time() + reset_after
+
+                    if response.status == 429:
+                        retry_after = _parse_seconds(
+                            response.headers.get("Retry-After")
+                        )
+                        if retry_after is None:
+                            try:
+                                body = await response.json(content_type=None)
+                                retry_after = _parse_seconds(body.get("retry_after"))
+                            except Exception:
+                                retry_after = None
+                        retry_after = retry_after if retry_after is not None else 1.0
+                        webhook.blocked_until = loop.time() + retry_after
+                        self._counters["rate_limited"] += 1
+                        logger.warning(
+                            f"Discord webhook rate limited, retrying in {retry_after:.2f}s"
+                        )
+                        continue
+
+                    if response.status not in [200, 204]:
+                        logger.warning(f"Discord webhook failed: {response.status}")
+                        return False
+                    return True
+            except Exception as e:
+                logger.error(f"Failed to send Discord notification: {str(e)}")
+                return False
+
+        logger.error("Discord webhook still rate limited, giving up on notification")
+        return False
+
+    def stats(self) -> dict:
+        """Return delivery counters of the dispatcher.
+
+        Returns:
+            dict: Pending event count and totals for queued, coalesced, suppressed,
+            dropped, sent and failed notifications.
+        """
+        return {
+            "pending": self._pending_count,
+            "queue_capacity": self.queue_size,
+            **self._counters,
+        }
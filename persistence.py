@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+import database
+from accumulator import AggregateAccumulator
+from api.models import MonitorRecord
+from backfill import write_backfill_checkpoint
+from counters import TimingCounter
+from records import insert_records, max_record_id, record_values
+from registry import register_monitors
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_QUEUE_SIZE = 10000
+# Attempts of a batch failing with a database error such as "database is
+# locked", and the pause before the first retry, doubled after each.
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_DELAY = 0.1
+
+
+def _is_transient(error: Exception) -> bool:
+    """Return whether a write failed because of the database, not the data."""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+class RecordWriter:
+    """Single writer that persists check results in batches.
+
+    Check results are put on an asyncio queue by the probes and drained by one
+    writer task. Each batch of records is committed in one transaction on a
+    dedicated thread that owns its own database session, so SQLite I/O never
+    runs on the event loop thread.
+
+    A batch is flushed once it reaches ``writer_batch_size`` records or when
+    ``writer_flush_interval`` milliseconds have passed since its first record.
+    The writer resolves each record's monitor name to its id in ``monitors``
+    and numbers records in commit order; records go to the partition of
+    their month when ``partition_records`` is on. Committed records update
+    the aggregate buckets in an ``AggregateAccumulator``, which writes them
+    back every ``aggregate_flush_interval`` milliseconds.
+
+    A batch failing with a transient database error, like a lock held by
+    retention or archiving, is retried with backoff and then kept for the
+    next flush. A batch failing because of its data is split in halves until
+    the records that cannot be stored are found; only those are dropped.
+    """
+
+    def __init__(self, app_config: dict):
+        """Create a record writer from application configuration.
+
+        Args:
+            app_config (dict): Application configuration. Reads the
+                ``writer_batch_size``, ``writer_flush_interval`` and
+                ``writer_queue_size`` settings, and the aggregate settings
+                read by ``AggregateAccumulator``.
+        """
+        self.app_config = app_config
+        self.batch_size = max(
+            1, int(app_config.get("writer_batch_size", DEFAULT_BATCH_SIZE))
+        )
+        self.flush_interval = (
+            app_config.get("writer_flush_interval", DEFAULT_FLUSH_INTERVAL_MS) / 1000
+        )
+        self._queue: asyncio.Queue = asyncio.Queue(
+            maxsize=int(app_config.get("writer_queue_size", DEFAULT_QUEUE_SIZE))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="record-writer"
+        )
+        self._session = None
+        self._aggregates = AggregateAccumulator(database.engine, app_config)
+        self._pending: List[MonitorRecord] = []
+        self._monitor_ids: Dict[str, int] = {}
+        self._next_id: Optional[int] = None
+        self._batch_ready = asyncio.Event()
+        self.ready = asyncio.Event()
+        self._submitted = 0
+        self._written = 0
+        self._failed = 0
+        self._retries = 0
+        self._batches = 0
+        self._flush_latency = TimingCounter()
+        self._batch_sizes = TimingCounter()
+
+    async def submit(self, record: MonitorRecord):
+        """Queue a check result for persistence.
+
+        Waits for space when the queue is full, which applies backpressure to
+        the probes instead of dropping results.
+
+        Args:
+            record (MonitorRecord): Unsaved monitor record.
+        """
+        await self._queue.put(record)
+        self._submitted += 1
+        if self._queue.qsize() >= self.batch_size - 1:
+            self._batch_ready.set()
+
+    def _assign_ids(self, records: List[MonitorRecord]):
+        """Set the monitor id and the next record id of each record."""
+        missing = {record.monitor_name for record in records} - set(self._monitor_ids)
+        if missing:
+            with database.engine.begin() as connection:
+                self._monitor_ids.update(register_monitors(connection, missing))
+        if self._next_id is None:
+            with database.engine.connect() as connection:
+                self._next_id = max_record_id(connection) + 1
+        for record in records:
+            record.monitor_id = self._monitor_ids[record.monitor_name]
+            record.id = self._next_id
+            self._next_id += 1
+
+    def _insert(self, records: List[MonitorRecord]):
+        """Insert ``records`` in one transaction, rolling back on failure."""
+        if self._session is None:
+            self._session = database.SessionLocal(expire_on_commit=False)
+        db = self._session
+        try:
+            self._assign_ids(records)
+            insert_records(
+                db.connection(), [record_values(record) for record in records]
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Ids are numbered again from the database on the next attempt.
+            self._next_id = None
+            raise
+        finally:
+            db.expunge_all()
+
+    def _persist(
+        self, records: List[MonitorRecord]
+    ) -> Tuple[List[MonitorRecord], List[MonitorRecord]]:
+        """Insert ``records``, retrying transient errors and isolating bad rows.
+
+        Returns:
+            tuple: Records written and records to retry at the next flush.
+        """
+        delay = WRITE_RETRY_DELAY
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                self._insert(records)
+                return records, []
+            except Exception as e:
+                if not _is_transient(e):
+                    error = e
+                    break
+                if attempt == WRITE_ATTEMPTS:
+                    logger.warning(
+                        f"Keeping {len(records)} monitor records for the next "
+                        f"flush after {attempt} attempts: {e}"
+                    )
+                    return [], records
+                self._retries += 1
+                time.sleep(delay)
+                delay *= 2
+        if len(records) == 1:
+            self._failed += 1
+            logger.error(
+                f"Dropping monitor record of {records[0].monitor_name} at "
+                f"{records[0].timestamp}: {error}"
+            )
+            return [], []
+        middle = len(records) // 2
+        first_written, first_kept = self._persist(records[:middle])
+        last_written, last_kept = self._persist(records[middle:])
+        return first_written + last_written, first_kept + last_kept
+
+    def _write_batch(self, records: List[MonitorRecord]) -> List[MonitorRecord]:
+        """Persist a batch and count it into the aggregates.
+
+        Returns:
+            list: Records kept for the next flush.
+        """
+        written, kept = self._persist(records)
+        self._written += len(written)
+        if not written:
+            return kept
+        try:
+            self._aggregates.add(written)
+            self._aggregates.maybe_flush()
+            self._aggregates.maybe_compact()
+        except Exception as e:
+            logger.exception(f"Failed to update aggregates: {e}")
+        return kept
+
+    def _recover_aggregates(self):
+        try:
+            self._aggregates.recover()
+        except Exception as e:
+            logger.exception(f"Failed to recover aggregates: {e}")
+
+    def _merge_backfill(
+        self,
+        monitor_id: int,
+        monitor_name: str,
+        interval: str,
+        buckets: Dict[datetime, dict],
+        backfilled_until: datetime,
+        records_scanned: int,
+    ) -> int:
+        inserted = self._aggregates.merge_missing(monitor_id, interval, buckets)
+        with database.engine.begin() as connection:
+            write_backfill_checkpoint(
+                connection, monitor_name, backfilled_until, records_scanned, inserted
+            )
+        return inserted
+
+    async def merge_backfill(
+        self,
+        monitor_id: int,
+        monitor_name: str,
+        interval: str,
+        buckets: Dict[datetime, dict],
+        backfilled_until: datetime,
+        records_scanned: int,
+    ) -> int:
+        """Merge backfilled buckets on the writer thread and checkpoint the backfill.
+
+        Args:
+            monitor_id (int): Monitor the buckets belong to.
+            monitor_name (str): Its name, which the checkpoint is kept under.
+            interval (str): Interval of the buckets.
+            buckets (Dict[datetime, dict]): Running totals of missing buckets
+                by bucket start.
+            backfilled_until (datetime): End of the backfilled time range.
+            records_scanned (int): Records read to compute the buckets.
+
+        Returns:
+            int: Number of missing buckets inserted.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            self._merge_backfill,
+            monitor_id,
+            monitor_name,
+            interval,
+            buckets,
+            backfilled_until,
+            records_scanned,
+        )
+
+    def _flush_aggregates(self):
+        try:
+            self._aggregates.flush()
+        except Exception as e:
+            logger.exception(f"Failed to flush aggregates: {e}")
+
+    def _close_session(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def _flush(self, records: List[MonitorRecord]) -> List[MonitorRecord]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        kept = await loop.run_in_executor(self._executor, self._write_batch, records)
+        self._flush_latency.add(time.perf_counter() - started)
+        self._batch_sizes.add(len(records))
+        self._batches += 1
+        return kept
+
+    async def _fill_batch(self):
+        # Records kept by a failed flush are retried after the flush interval
+        # even when no new result arrives.
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+
+        if self._queue.qsize() < self.batch_size - 1:
+            self._batch_ready.clear()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        while len(self._pending) < self.batch_size and not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+
+    async def run(self):
+        """Drain the queue until cancelled.
+
+        Aggregates of records committed after the last aggregate flush of a
+        previous run are recovered first, after which ``ready`` is set. Records
+        still queued when the writer is cancelled are flushed, along with the
+        aggregates, before the writer thread is shut down.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._recover_aggregates)
+        self.ready.set()
+        flushing = None
+        try:
+            while True:
+                await self._fill_batch()
+                batch, self._pending = self._pending, []
+                # Cancelling the writer leaves the running flush alone, so
+                # the records it keeps are flushed again below.
+                flushing = asyncio.ensure_future(self._flush(batch))
+                self._pending = await asyncio.shield(flushing)
+                flushing = None
+        finally:
+            remaining, self._pending = self._pending, []
+            if flushing is not None:
+                remaining = await flushing + remaining
+            while not self._queue.empty():
+                remaining.append(self._queue.get_nowait())
+            while remaining:
+                kept = await self._flush(remaining[: self.batch_size])
+                if kept:
+                    self._failed += len(kept)
+                    logger.error(f"Lost {len(kept)} monitor records at shutdown")
+                remaining = remaining[self.batch_size :]
+            await loop.run_in_executor(self._executor, self._flush_aggregates)
+            await loop.run_in_executor(self._executor, self._close_session)
+            self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """Return queue and flush counters of the writer.
+
+        Returns:
+            dict: Queue depth, record totals, records dropped, retried
+            batches, batch sizes, flush latency in seconds and the counters of
+            the aggregate accumulator.
+        """
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "submitted": self._submitted,
+            "written": self._written,
+            "failed": self._failed,
+            "retries": self._retries,
+            "batches": self._batches,
+            "batch_size": self._batch_sizes.as_dict(),
+            "flush_latency": self._flush_latency.as_dict(),
+            "aggregates": self._aggregates.stats(),
+        }
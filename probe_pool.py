@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiohttp
+
+from counters import TimingCounter
+from probe_timing import RequestTimings, add_phase_hooks, create_ssl_context
+from resolver import CachingResolver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 256
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 8
+DEFAULT_KEEPALIVE_TIMEOUT = 75
+DEFAULT_DNS_CACHE_TTL = 300
+DEFAULT_DNS_MAX_STALE = 86400
+
+
+class ProbePool:
+    """Shared HTTP session with a global concurrency budget for probes.
+
+    Wraps a single ``aiohttp.ClientSession`` whose connector is sized from the
+    application configuration, so monitors sharing a host reuse keep-alive
+    connections and no host receives more than the per-host connection limit.
+    Probes acquire a slot from a global semaphore before sending a request.
+    Host names are resolved through a shared TTL-aware ``CachingResolver``.
+
+    Time spent waiting for a slot, waiting for a free connection in the
+    connector, and performing the request are tracked separately.
+    """
+
+    def __init__(self, app_config: dict):
+        """Create a probe pool from application configuration.
+
+        Args:
+            app_config (dict): Application configuration. Reads the
+                ``probe_max_concurrency``, ``probe_connection_limit``,
+                ``probe_connection_limit_per_host``, ``probe_keepalive_timeout``
+                and ``probe_dns_*`` settings.
+        """
+        self.max_concurrency = int(
+            app_config.get("probe_max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        )
+        if self.max_concurrency <= 0:
+            logger.warning(
+                f"Invalid probe_max_concurrency '{self.max_concurrency}', "
+                f"using default {DEFAULT_MAX_CONCURRENCY}"
+            )
+            self.max_concurrency = DEFAULT_MAX_CONCURRENCY
+
+        self.connection_limit = int(
+            app_config.get("probe_connection_limit", self.max_concurrency)
+        )
+        self.connection_limit_per_host = int(
+            app_config.get(
+                "probe_connection_limit_per_host", DEFAULT_CONNECTION_LIMIT_PER_HOST
+            )
+        )
+        self.keepalive_timeout = float(
+            app_config.get("probe_keepalive_timeout", DEFAULT_KEEPALIVE_TIMEOUT)
+        )
+        self.dns_cache_ttl = app_config.get(
+            "probe_dns_cache_ttl", DEFAULT_DNS_CACHE_TTL
+        )
+        self.dns_max_stale = app_config.get(
+            "probe_dns_max_stale", DEFAULT_DNS_MAX_STALE
+        )
+        self.dns_prefetch = bool(app_config.get("probe_dns_prefetch", True))
+        self.dns_nameservers = app_config.get("probe_dns_nameservers") or None
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.resolver: Optional[CachingResolver] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._queue_wait = TimingCounter()
+        self._connection_wait = TimingCounter()
+        self._request_time = TimingCounter()
+        self._phases = {phase: TimingCounter() for phase in RequestTimings().as_dict()}
+        self._ssl_contexts = {}
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_queued_start(session, ctx, params):
+            ctx.connection_queued_at = time.perf_counter()
+
+        async def on_connection_queued_end(session, ctx, params):
+            self._connection_wait.add(time.perf_counter() - ctx.connection_queued_at)
+
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(on_connection_queued_end)
+        add_phase_hooks(trace_config)
+        return trace_config
+
+    def ssl_context(self, verify: bool):
+        """Return the shared SSL context for verified or unverified probes."""
+        if verify not in self._ssl_contexts:
+            self._ssl_contexts[verify] = create_ssl_context(verify)
+        return self._ssl_contexts[verify]
+
+    def record_timings(self, timings: RequestTimings):
+        """Add the phases measured for one request to the pool counters."""
+        for phase, value in timings.as_dict().items():
+            if value is not None:
+                self._phases[phase].add(value)
+
+    async def __aenter__(self) -> "ProbePool":
+        self.resolver = CachingResolver(
+            default_ttl=self.dns_cache_ttl,
+            max_stale=self.dns_max_stale,
+            prefetch=self.dns_prefetch,
+            nameservers=self.dns_nameservers,
+        )
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            resolver=self.resolver,
+            use_dns_cache=False,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, trace_configs=[self._create_trace_config()]
+        )
+        logger.info(
+            f"Probe pool started: concurrency={self.max_concurrency}, "
+            f"connections={self.connection_limit or 'unlimited'}, "
+            f"per_host={self.connection_limit_per_host or 'unlimited'}"
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.resolver is not None:
+            await self.resolver.close()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot of the global probe concurrency budget.
+
+        Time spent waiting for the slot is counted as queue wait, and time
+        spent inside the block as request time.
+        """
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        started_at = time.perf_counter()
+        self._queue_wait.add(started_at - queued_at)
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._request_time.add(time.perf_counter() - started_at)
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Return concurrency and timing counters of the pool.
+
+        Returns:
+            dict: Configured limits, current in-flight and waiting probes, and
+            queue wait, connection wait, request time and per-phase counters
+            in seconds.
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "connection_limit": self.connection_limit,
+            "connection_limit_per_host": self.connection_limit_per_host,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "queue_wait": self._queue_wait.as_dict(),
+            "connection_wait": self._connection_wait.as_dict(),
+            "request_time": self._request_time.as_dict(),
+            "dns": self.resolver.stats() if self.resolver else None,
+            "phases": {
+                phase: counter.as_dict() for phase, counter in self._phases.items()
+            },
+        }
@@ -0,0 +1,167 @@
+import ssl
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import aiohttp
+
+_active_timings: ContextVar[Optional["RequestTimings"]] = ContextVar(
+    "active_request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Per-phase durations of one probe request, in seconds.
+
+    Phases are measured with ``time.perf_counter`` from aiohttp trace hooks.
+    ``dns_time``, ``connect_time`` and ``tls_time`` stay ``None`` when the
+    request reused a pooled keep-alive connection, and ``tls_time`` stays
+    ``None`` for plain HTTP. With redirects, connection phases are summed over
+    all hops and ``ttfb`` is taken from the final hop.
+    """
+
+    __slots__ = (
+        "dns_time",
+        "connect_time",
+        "tls_time",
+        "ttfb",
+        "_connection_started",
+        "_dns_started",
+        "_dns_elapsed",
+        "_tls_started",
+        "_headers_sent",
+    )
+
+    def __init__(self):
+        self.dns_time: Optional[float] = None
+        self.connect_time: Optional[float] = None
+        self.tls_time: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self._connection_started: Optional[float] = None
+        self._dns_started: Optional[float] = None
+        self._dns_elapsed = 0.0
+        self._tls_started: Optional[float] = None
+        self._headers_sent: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        """Return the measured phases keyed by record column name."""
+        return {
+            "dns_time": self.dns_time,
+            "connect_time": self.connect_time,
+            "tls_time": self.tls_time,
+            "ttfb": self.ttfb,
+        }
+
+
+def _add(current: Optional[float], value: float) -> float:
+    return value if current is None else current + value
+
+
+class TimedSSLContext(ssl.SSLContext):
+    """SSL context that marks the start of the TLS handshake for probe timings.
+
+    asyncio wraps the socket with ``wrap_bio`` once the TCP connection is
+    established, so the call separates TCP connect time from TLS handshake
+    time within aiohttp's single connection-create phase.
+    """
+
+    def wrap_bio(self, *args, **kwargs):
+        timings = _active_timings.get()
+        if timings is not None:
+            timings._tls_started = time.perf_counter()
+        return super().wrap_bio(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"TimedSSLContext(verify={self.verify_mode != ssl.CERT_NONE})"
+
+
+def create_ssl_context(verify: bool) -> TimedSSLContext:
+    """Create a client SSL context with handshake timing.
+
+    Args:
+        verify (bool): Whether to verify certificates and hostnames.
+
+    Returns:
+        TimedSSLContext: Context to pass as ``ssl=`` to aiohttp requests.
+    """
+    context = TimedSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if verify:
+        context.load_default_certs()
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def add_phase_hooks(trace_config: aiohttp.TraceConfig):
+    """Register hooks recording request phases into ``RequestTimings``.
+
+    Hooks only record when the request was made with a ``RequestTimings``
+    instance as ``trace_request_ctx``.
+
+    Args:
+        trace_config (aiohttp.TraceConfig): Trace config to extend.
+    """
+
+    def timings_of(ctx) -> Optional[RequestTimings]:
+        timings = ctx.trace_request_ctx
+        return timings if isinstance(timings, RequestTimings) else None
+
+    async def on_request_start(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None:
+            _active_timings.set(timings)
+
+    async def on_connection_create_start(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None:
+            timings._connection_started = time.perf_counter()
+            timings._dns_elapsed = 0.0
+            timings._tls_started = None
+
+    async def on_dns_resolvehost_start(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None:
+            timings._dns_started = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None and timings._dns_started is not None:
+            timings._dns_elapsed += time.perf_counter() - timings._dns_started
+            timings._dns_started = None
+
+    async def on_connection_create_end(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is None or timings._connection_started is None:
+            return
+        now = time.perf_counter()
+        handshake_started = timings._tls_started or now
+        timings.dns_time = _add(timings.dns_time, timings._dns_elapsed)
+        timings.connect_time = _add(
+            timings.connect_time,
+            max(
+                0.0,
+                handshake_started - timings._connection_started - timings._dns_elapsed,
+            ),
+        )
+        if timings._tls_started is not None:
+            timings.tls_time = _add(timings.tls_time, now - timings._tls_started)
+        timings._connection_started = None
+
+    async def on_request_headers_sent(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None:
+            timings._headers_sent = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        timings = timings_of(ctx)
+        if timings is not None and timings._headers_sent is not None:
+            timings.ttfb = time.perf_counter() - timings._headers_sent
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_headers_sent.append(on_request_headers_sent)
+    trace_config.on_request_end.append(on_request_end)
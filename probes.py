@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import re
+import socket
+import ssl
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+from probe_timing import RequestTimings
+from resolver import split_nameservers
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+try:
+    from cryptography import x509
+except ImportError:
+    x509 = None
+
+logger = logging.getLogger(__name__)
+
+PROBE_METHODS = ("GET", "HEAD")
+DEFAULT_MAX_BODY_BYTES = 64 * 1024
+DEFAULT_KEYWORD_MAX_BODY_BYTES = 1024 * 1024
+REGEX_OVERLAP_BYTES = 1024
+CHUNK_SIZE = 16 * 1024
+MONITOR_TYPES = ("http", "tcp", "dns", "tls")
+DEFAULT_PORTS = {"tls": 443}
+DEFAULT_MAX_BANNER_BYTES = 4096
+DEFAULT_CERT_EXPIRY_DAYS = 7
+DNS_RECORD_FAMILIES = {"A": socket.AF_INET, "AAAA": socket.AF_INET6}
+DEFAULT_CONFIRM_RETRIES = 0
+DEFAULT_CONFIRM_DELAY_MS = 1000
+
+
+@lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str) -> "re.Pattern[bytes]":
+    return re.compile(pattern.encode("utf-8"))
+
+
+class BodyMatcher:
+    """Streaming keyword or regex assertion over a response body.
+
+    Chunks are scanned as they arrive. The tail of the previous chunk is kept
+    so matches spanning a chunk boundary are found: ``len(keyword) - 1`` bytes
+    for keywords and ``REGEX_OVERLAP_BYTES`` for regular expressions, which
+    bounds the length of a regex match that can straddle two chunks.
+    """
+
+    def __init__(self, keyword: Optional[str] = None, regex: Optional[str] = None):
+        if regex:
+            self._pattern = _compile_pattern(regex)
+            self._keyword = None
+            self._overlap = REGEX_OVERLAP_BYTES
+        else:
+            self._pattern = None
+            self._keyword = keyword.encode("utf-8")
+            self._overlap = max(len(self._keyword) - 1, 0)
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> bool:
+        """Scan the next chunk and return whether the assertion matched."""
+        window = self._tail + chunk
+        if self._keyword is not None:
+            found = self._keyword in window
+        else:
+            found = self._pattern.search(window) is not None
+        self._tail = window[-self._overlap :] if self._overlap else b""
+        return found
+
+
+def get_http_options(monitor: dict) -> Tuple[str, int, Optional[BodyMatcher]]:
+    """Return the HTTP method, body byte cap and body matcher for a monitor.
+
+    Args:
+        monitor (dict): Monitor configuration. Reads ``method``,
+            ``max_body_bytes``, ``keyword`` and ``keyword_regex``.
+
+    Returns:
+        tuple: Method name, maximum body bytes to read, and a fresh
+        ``BodyMatcher`` or None when the monitor has no body assertion.
+    """
+    method = str(monitor.get("method", "GET")).upper()
+    if method not in PROBE_METHODS:
+        logger.warning(f"{monitor['name']}: Unsupported method '{method}', using GET")
+        method = "GET"
+
+    keyword = monitor.get("keyword")
+    regex = monitor.get("keyword_regex")
+    matcher = None
+    if method == "GET" and (keyword or regex):
+        matcher = BodyMatcher(keyword=keyword, regex=regex)
+
+    default_max_bytes = (
+        DEFAULT_KEYWORD_MAX_BODY_BYTES if matcher else DEFAULT_MAX_BODY_BYTES
+    )
+    max_body_bytes = int(monitor.get("max_body_bytes", default_max_bytes))
+    return method, max(max_body_bytes, 0), matcher
+
+
+def get_confirm_options(monitor: dict, app_config: dict) -> Tuple[int, float]:
+    """Return the number of confirmation retries and the first retry delay.
+
+    Args:
+        monitor (dict): Monitor configuration. Reads ``confirm_retries`` and
+            ``confirm_retry_delay`` (milliseconds).
+        app_config (dict): Application configuration with the defaults for
+            both settings.
+
+    Returns:
+        tuple: Retry count and delay in seconds before the first retry.
+    """
+    retries = monitor.get(
+        "confirm_retries",
+        app_config.get("confirm_retries", DEFAULT_CONFIRM_RETRIES),
+    )
+    delay_ms = monitor.get(
+        "confirm_retry_delay",
+        app_config.get("confirm_retry_delay", DEFAULT_CONFIRM_DELAY_MS),
+    )
+    return max(int(retries), 0), max(delay_ms, 0) / 1000
+
+
+async def read_body(
+    response: aiohttp.ClientResponse,
+    max_bytes: int,
+    matcher: Optional[BodyMatcher] = None,
+) -> Tuple[int, Optional[bool]]:
+    """Read a response body up to a byte cap, stopping early on a match.
+
+    A fully read body leaves the connection reusable by the pool. When reading
+    stops early, aiohttp closes the connection on release instead of draining
+    the rest of the body.
+
+    Args:
+        response (aiohttp.ClientResponse): Response whose body to read.
+        max_bytes (int): Maximum number of body bytes to read.
+        matcher (Optional[BodyMatcher]): Assertion to evaluate on the body.
+
+    Returns:
+        tuple: Number of bytes read, and whether the matcher matched (None
+        without a matcher).
+    """
+    read = 0
+    matched = False if matcher else None
+    while read < max_bytes:
+        chunk = await response.content.read(min(CHUNK_SIZE, max_bytes - read))
+        if not chunk:
+            break
+        read += len(chunk)
+        if matcher is not None and matcher.feed(chunk):
+            matched = True
+            break
+    return read, matched
+
+
+def get_monitor_type(monitor: dict) -> str:
+    """Return a monitor's check type.
+
+    The ``type`` setting wins; otherwise a ``tcp://``, ``dns://`` or ``tls://``
+    URL scheme selects the type, and anything else is checked over HTTP.
+    """
+    monitor_type = monitor.get("type")
+    if monitor_type is None:
+        scheme = urlsplit(monitor["url"]).scheme.lower()
+        monitor_type = scheme if scheme in MONITOR_TYPES else "http"
+    monitor_type = str(monitor_type).lower()
+    if monitor_type not in MONITOR_TYPES:
+        logger.warning(
+            f"{monitor['name']}: Unsupported type '{monitor_type}', using http"
+        )
+        monitor_type = "http"
+    return monitor_type
+
+
+def get_socket_target(monitor: dict, monitor_type: str) -> Tuple[str, Optional[int]]:
+    """Return the host and port checked by a TCP, DNS or TLS monitor.
+
+    ``host`` and ``port`` settings override the host and port of the URL. TLS
+    monitors default to port 443.
+
+    Raises:
+        ValueError: If the monitor has no host, or a TCP or TLS monitor has no port.
+    """
+    parsed = urlsplit(monitor["url"])
+    host = monitor.get("host", parsed.hostname)
+    port = monitor.get("port", parsed.port or DEFAULT_PORTS.get(monitor_type))
+    if not host:
+        raise ValueError(f"no host in '{monitor['url']}'")
+    if monitor_type != "dns" and not port:
+        raise ValueError(f"no port in '{monitor['url']}'")
+    return host, int(port) if port else None
+
+
+async def open_tcp(
+    resolver: AbstractResolver,
+    host: str,
+    port: int,
+    timings: RequestTimings,
+    ssl_context: Optional[ssl.SSLContext] = None,
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a TCP connection, optionally upgraded to TLS, recording its phases.
+
+    Addresses from ``resolver`` are tried in order until one accepts the
+    connection.
+
+    Args:
+        resolver (AbstractResolver): Resolver for the host name.
+        host (str): Host to connect to, also used for SNI and hostname checks.
+        port (int): TCP port.
+        timings (RequestTimings): Receives the DNS, connect and TLS phases.
+        ssl_context (Optional[ssl.SSLContext]): Context for a TLS handshake.
+
+    Returns:
+        tuple: Stream reader and writer of the open connection.
+    """
+    started = time.perf_counter()
+    addresses = await resolver.resolve(host, port, socket.AF_UNSPEC)
+    connect_started = time.perf_counter()
+    timings.dns_time = connect_started - started
+
+    error: Optional[Exception] = None
+    for address in addresses:
+        try:
+            reader, writer = await asyncio.open_connection(address["host"], port)
+            break
+        except OSError as e:
+            error = e
+    else:
+        raise error or OSError(f"No addresses found for {host}")
+    tls_started = time.perf_counter()
+    timings.connect_time = tls_started - connect_started
+
+    if ssl_context is not None:
+        try:
+            await writer.start_tls(ssl_context, server_hostname=host)
+        except BaseException:
+            writer.close()
+            raise
+        timings.tls_time = time.perf_counter() - tls_started
+    return reader, writer
+
+
+async def _close(writer: asyncio.StreamWriter):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+
+
+async def probe_tcp(
+    resolver: AbstractResolver,
+    host: str,
+    port: int,
+    timings: RequestTimings,
+    matcher: Optional[BodyMatcher] = None,
+    max_bytes: int = DEFAULT_MAX_BANNER_BYTES,
+) -> Optional[bool]:
+    """Connect to a TCP port and optionally match the banner the server sends.
+
+    Args:
+        resolver (AbstractResolver): Resolver for the host name.
+        host (str): Host to connect to.
+        port (int): TCP port.
+        timings (RequestTimings): Receives the DNS and connect phases, and the
+            time to the first banner byte as ``ttfb``.
+        matcher (Optional[BodyMatcher]): Assertion on the banner.
+        max_bytes (int): Maximum number of banner bytes to read.
+
+    Returns:
+        Optional[bool]: Whether the banner matched, None without a matcher.
+    """
+    reader, writer = await open_tcp(resolver, host, port, timings)
+    try:
+        if matcher is None:
+            return None
+        started = time.perf_counter()
+        read = 0
+        while read < max_bytes:
+            chunk = await reader.read(min(CHUNK_SIZE, max_bytes - read))
+            if not chunk:
+                break
+            if read == 0:
+                timings.ttfb = time.perf_counter() - started
+            read += len(chunk)
+            if matcher.feed(chunk):
+                return True
+        return False
+    finally:
+        await _close(writer)
+
+
+def certificate_expiry(ssl_object: ssl.SSLObject) -> Optional[datetime]:
+    """Return the expiry of the peer certificate as a naive local datetime.
+
+    The certificate is only decoded by ``ssl`` when it was verified; unverified
+    certificates are decoded with ``cryptography`` if it is installed.
+    """
+    cert = ssl_object.getpeercert()
+    if cert and cert.get("notAfter"):
+        return datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notAfter"]))
+    der = ssl_object.getpeercert(binary_form=True)
+    if der and x509 is not None:
+        not_after = x509.load_der_x509_certificate(der).not_valid_after
+        return not_after.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return None
+
+
+async def probe_tls(
+    resolver: AbstractResolver,
+    host: str,
+    port: int,
+    timings: RequestTimings,
+    ssl_context: ssl.SSLContext,
+) -> Optional[datetime]:
+    """Complete a TLS handshake and return the certificate expiry.
+
+    Args:
+        resolver (AbstractResolver): Resolver for the host name.
+        host (str): Host to connect to, also used for SNI and hostname checks.
+        port (int): TCP port.
+        timings (RequestTimings): Receives the DNS, connect and TLS phases.
+        ssl_context (ssl.SSLContext): Context for the handshake.
+
+    Returns:
+        Optional[datetime]: Expiry of the server certificate, None if it
+        could not be decoded.
+    """
+    reader, writer = await open_tcp(resolver, host, port, timings, ssl_context)
+    try:
+        return certificate_expiry(writer.get_extra_info("ssl_object"))
+    finally:
+        await _close(writer)
+
+
+async def probe_dns(
+    host: str, record_type: str = "A", nameservers: Optional[List[str]] = None
+) -> List[str]:
+    """Resolve a host name without any caching and return its addresses.
+
+    Queries go to ``nameservers`` through ``aiodns`` when it is installed, and
+    to the system resolver otherwise.
+
+    Args:
+        host (str): Host name to resolve.
+        record_type (str): ``A`` or ``AAAA``.
+        nameservers (Optional[List[str]]): DNS servers to query, as ``ip`` or
+            ``ip:port``.
+
+    Returns:
+        List[str]: Resolved addresses; an exception is raised if there are none.
+    """
+    record_type = record_type.upper()
+    if record_type not in DNS_RECORD_FAMILIES:
+        raise ValueError(f"unsupported DNS record type '{record_type}'")
+
+    if aiodns is not None:
+        addresses, port = split_nameservers(nameservers or [])
+        options = {"udp_port": port, "tcp_port": port} if port else {}
+        resolver = aiodns.DNSResolver(nameservers=addresses or None, **options)
+        try:
+            answers = await resolver.query(host, record_type)
+        finally:
+            if hasattr(resolver, "cancel"):
+                resolver.cancel()
+        return [answer.host for answer in answers]
+
+    if nameservers:
+        logger.warning(
+            "DNS monitor nameservers require aiodns (pip install aiodns), "
+            "using the system resolver"
+        )
+    infos = await asyncio.get_running_loop().getaddrinfo(
+        host, None, family=DNS_RECORD_FAMILIES[record_type], type=socket.SOCK_STREAM
+    )
+    return list(dict.fromkeys(info[4][0] for info in infos))
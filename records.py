@@ -0,0 +1,278 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import MetaData, Table, func, insert, select
+from sqlalchemy.sql import Select
+from sqlalchemy.types import TypeDecorator
+
+import database
+import storage
+from api.models import MonitorRecord
+from storage.partitions import MAX_ATTACHED_PARTITIONS, month_of
+from storage.types import EPOCH, EpochMillis, Milliseconds, to_epoch_millis
+from watermarks import read_aggregate_watermark
+
+records_table = MonitorRecord.__table__
+# Records read from the archive, with the attributes of table rows.
+ArchivedRecord = namedtuple(
+    "ArchivedRecord", [column.name for column in records_table.columns]
+)
+_partition_metadata = MetaData()
+
+
+def partition_table(alias: str) -> Table:
+    """Return ``monitor_checks`` of the partition attached as ``alias``."""
+    key = f"{alias}.{records_table.name}"
+    if key in _partition_metadata.tables:
+        return _partition_metadata.tables[key]
+    return records_table.to_metadata(_partition_metadata, schema=alias)
+
+
+def attached_partition(connection, month: date) -> Table:
+    """Attach the partition of ``month`` alone and return its records table."""
+    partitions = database.backend.partitions
+    partitions.attach(connection, [month])
+    return partition_table(partitions.alias(month))
+
+
+def _skip_unpartitioned(connection, partitions) -> bool:
+    if partitions is None or not partitions.enabled:
+        return False
+    if not partitions.unpartitioned_empty:
+        partitions.unpartitioned_empty = (
+            connection.execute(select(records_table.c.id).limit(1)).first() is None
+        )
+    return partitions.unpartitioned_empty
+
+
+def record_tables(
+    connection,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    newest_first: bool = False,
+) -> Iterator[Table]:
+    """Yield the tables that may hold records timestamped in ``[since, until)``.
+
+    That is ``monitor_checks`` first, unless partitioning is on and it has
+    been emptied, then, where the backend has record partitions, every
+    partition overlapping the range in month order. The partitions are
+    attached to ``connection`` a few at a time as they are reached, so fetch
+    the rows of a table before taking the next one.
+
+    Args:
+        connection: Database connection.
+        since (datetime, optional): Start of the range, unbounded if omitted.
+        until (datetime, optional): End of the range, unbounded if omitted.
+        newest_first (bool): Yield partitions from the newest month back.
+    """
+    partitions = database.backend.partitions
+    if not _skip_unpartitioned(connection, partitions):
+        yield records_table
+    if partitions is None:
+        return
+    months = partitions.overlapping(since, until)
+    if newest_first:
+        months.reverse()
+    for offset in range(0, len(months), MAX_ATTACHED_PARTITIONS):
+        group = months[offset : offset + MAX_ATTACHED_PARTITIONS]
+        partitions.attach(connection, group)
+        for month in group:
+            yield partition_table(partitions.alias(month))
+
+
+def read_records(
+    connection,
+    query: Callable[[Table], Select],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list:
+    """Run ``query`` against every table of ``record_tables`` and return all rows.
+
+    Rows come table by table; sort them where the order matters.
+
+    Args:
+        connection: Database connection.
+        query (Callable): Builds the SELECT for one records table.
+        since (datetime, optional): Start of the time range ``query`` reads.
+        until (datetime, optional): End of the time range ``query`` reads.
+    """
+    rows = []
+    for table in record_tables(connection, since, until):
+        rows.extend(connection.execute(query(table)).all())
+    return rows
+
+
+def _result_values(column, values: list) -> list:
+    """Return stored values of ``column`` as a query of it returns them."""
+    if isinstance(column.type, EpochMillis):
+        return [
+            None if value is None else EPOCH + timedelta(milliseconds=value)
+            for value in values
+        ]
+    if isinstance(column.type, Milliseconds):
+        return [None if value is None else value / 1000 for value in values]
+    if isinstance(column.type, TypeDecorator):
+        process = column.type.process_result_value
+        return [None if value is None else process(value, None) for value in values]
+    return values
+
+
+def read_archived(
+    monitor_ids: Iterable[int],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[ArchivedRecord]:
+    """Return the archived records of monitors timestamped in ``[since, until)``.
+
+    Empty where the backend has no record archive.
+    """
+    archive = database.backend.archive
+    if archive is None:
+        return []
+    records = []
+    for columns in archive.read(
+        monitor_ids,
+        since,
+        until,
+        since_value=None if since is None else to_epoch_millis(since),
+        until_value=None if until is None else to_epoch_millis(until),
+    ):
+        records.extend(
+            map(
+                ArchivedRecord._make,
+                zip(
+                    *(
+                        _result_values(column, columns[column.name])
+                        for column in records_table.columns
+                    )
+                ),
+            )
+        )
+    return records
+
+
+def read_history(
+    connection,
+    monitor_ids: Iterable[int],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list:
+    """Return every record of monitors timestamped in ``[since, until)``.
+
+    Reads the records tables and then the record archive, whose records
+    have the same attributes. Archiving writes a month's archive before
+    deleting its records from the tables, so reading in this order never
+    misses a record; one read by both is returned once. Rows are not sorted.
+
+    Args:
+        connection: Database connection.
+        monitor_ids (Iterable[int]): Monitors to read.
+        since (datetime, optional): Start of the range, unbounded if omitted.
+        until (datetime, optional): End of the range, unbounded if omitted.
+    """
+    monitor_ids = list(monitor_ids)
+    if not monitor_ids:
+        return []
+
+    def query(table: Table) -> Select:
+        statement = select(table).where(table.c.monitor_id.in_(monitor_ids))
+        if since is not None:
+            statement = statement.where(table.c.timestamp >= since)
+        if until is not None:
+            statement = statement.where(table.c.timestamp < until)
+        return statement
+
+    rows = read_records(connection, query, since, until)
+    archived = read_archived(monitor_ids, since, until)
+    if archived:
+        stored = {row.id for row in rows}
+        rows.extend(record for record in archived if record.id not in stored)
+    return rows
+
+
+def max_record_id(connection) -> int:
+    """Return the highest record id handed out, 0 without records.
+
+    That is the highest id in any records table or the archive, or the
+    aggregate watermark if higher, since records counted in the aggregates
+    may have been pruned since; their ids are never reused.
+    """
+    newest = read_aggregate_watermark(connection) or 0
+    for table in record_tables(connection):
+        newest = max(
+            newest, connection.execute(select(func.max(table.c.id))).scalar() or 0
+        )
+    archive = database.backend.archive
+    if archive is not None:
+        newest = max(newest, archive.max_id())
+    return newest
+
+
+def record_values(record: MonitorRecord) -> dict:
+    """Return the column values of a record to insert."""
+    return {
+        column.name: getattr(record, column.name) for column in records_table.columns
+    }
+
+
+def partition_batch(values: List[dict]) -> List[dict]:
+    """Return the leading ``values`` one ``insert_records`` call can write.
+
+    With record partitions, a call writes to at most
+    ``MAX_ATTACHED_PARTITIONS`` months; the values of later months are left
+    for the next call. Values without a timestamp belong to no month.
+    """
+    partitions = database.backend.partitions
+    if partitions is None or not partitions.enabled:
+        return values
+    months = set()
+    for index, value in enumerate(values):
+        if value["timestamp"] is None:
+            continue
+        months.add(month_of(value["timestamp"]))
+        if len(months) > MAX_ATTACHED_PARTITIONS:
+            return values[:index]
+    return values
+
+
+def insert_records(connection, values: List[dict], ignore_existing: bool = False):
+    """Insert records into the table their timestamp belongs in.
+
+    Without record partitions, or with ``partition_records`` off, that is
+    ``monitor_checks``. Otherwise each record goes to the partition of its
+    month, which is created if missing. Partitions are attached before
+    anything is written, so call this before other writes of a transaction.
+
+    Args:
+        connection: Database connection.
+        values (List[dict]): Column values of the records, with ids.
+        ignore_existing (bool): Skip records already stored instead of
+            failing.
+
+    Raises:
+        ValueError: If the records span more than ``MAX_ATTACHED_PARTITIONS``
+            months; see ``partition_batch``.
+    """
+    if not values:
+        return
+    partitions = database.backend.partitions
+    by_table: Dict[Table, List[dict]] = {}
+    if partitions is None or not partitions.enabled:
+        by_table[records_table] = values
+    else:
+        by_month: Dict[date, List[dict]] = {}
+        for value in values:
+            by_month.setdefault(month_of(value["timestamp"]), []).append(value)
+        for month in by_month:
+            partitions.create(month, records_table)
+        partitions.attach(connection, list(by_month))
+        for month, month_values in by_month.items():
+            by_table[partition_table(partitions.alias(month))] = month_values
+
+    for table, table_values in by_table.items():
+        if ignore_existing:
+            statement = storage.upsert(connection, table).on_conflict_do_nothing()
+        else:
+            statement = insert(table)
+        connection.execute(statement, table_values)
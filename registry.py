@@ -0,0 +1,65 @@
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+
+import storage
+from api.models import Monitor
+
+monitors_table = Monitor.__table__
+
+
+def read_monitor_ids(
+    connection, monitor_names: Optional[Iterable[str]] = None
+) -> Dict[str, int]:
+    """Return the ids of monitors by name.
+
+    Args:
+        connection: Database connection.
+        monitor_names (Iterable[str], optional): Monitors to look up; all
+            monitors if omitted. Names never recorded are left out.
+
+    Returns:
+        dict: Monitor ids keyed by monitor name.
+    """
+    query = select(monitors_table.c.name, monitors_table.c.id)
+    if monitor_names is not None:
+        query = query.where(monitors_table.c.name.in_(list(monitor_names)))
+    return dict(connection.execute(query).all())
+
+
+def monitor_id_query(monitor_name: str):
+    """Return a scalar subquery of a monitor's id, to filter by name in SQL."""
+    return (
+        select(monitors_table.c.id)
+        .where(monitors_table.c.name == monitor_name)
+        .scalar_subquery()
+    )
+
+
+def read_monitor_names(connection) -> Dict[int, str]:
+    """Return the names of all monitors by id."""
+    return {
+        monitor_id: name for name, monitor_id in read_monitor_ids(connection).items()
+    }
+
+
+def register_monitors(connection, monitor_names: Iterable[str]) -> Dict[str, int]:
+    """Return the ids of monitors by name, adding the monitors not seen before.
+
+    Safe to call concurrently; a monitor added by another connection first
+    keeps its id.
+    """
+    monitor_names = set(monitor_names)
+    if not monitor_names:
+        return {}
+    ids = read_monitor_ids(connection, monitor_names)
+    missing = monitor_names - set(ids)
+    if missing:
+        connection.execute(
+            storage.upsert(connection, monitors_table).on_conflict_do_nothing(
+                index_elements=["name"]
+            ),
+            [{"name": name} for name in sorted(missing)],
+        )
+        ids.update(read_monitor_ids(connection, missing))
+    return ids
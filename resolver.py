@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import socket
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+DEFAULT_MIN_TTL = 5
+DEFAULT_MAX_TTL = 3600
+DEFAULT_MAX_STALE = 86400
+DEFAULT_IDLE_TIMEOUT = 900
+PREFETCH_FRACTION = 0.1
+REFRESH_CHECK_INTERVAL = 1.0
+
+
+def split_nameservers(nameservers: List[str]) -> Tuple[List[str], Optional[int]]:
+    """Split ``ip:port`` DNS servers into addresses and the port they share.
+
+    c-ares sends every query to the same port, so servers with different
+    ports cannot be combined.
+
+    Returns:
+        tuple: Server addresses, and their port if not the default.
+
+    Raises:
+        ValueError: If the servers have different ports.
+    """
+    addresses = []
+    ports = set()
+    for nameserver in nameservers:
+        address, port = nameserver, ""
+        if nameserver.startswith("["):
+            address, _, port = nameserver[1:].partition("]")
+            port = port.lstrip(":")
+        elif nameserver.count(":") == 1:
+            address, port = nameserver.split(":")
+        addresses.append(address)
+        ports.add(int(port) if port else 53)
+    if len(ports) > 1:
+        raise ValueError(f"DNS servers must share one port: {nameservers}")
+    port = ports.pop() if ports else 53
+    return addresses, port if port != 53 else None
+
+
+class _CacheEntry:
+    """Resolved addresses of one hostname and address family."""
+
+    __slots__ = ("addresses", "ttl", "expires_at", "last_used", "refreshing")
+
+    def __init__(self, addresses: List[Tuple[int, str]], ttl: float, now: float):
+        self.addresses = addresses
+        self.ttl = ttl
+        self.expires_at = now + ttl
+        self.last_used = now
+        self.refreshing = False
+
+
+class CachingResolver(AbstractResolver):
+    """TTL-aware caching resolver for the probe connector.
+
+    Answers are cached per hostname and address family for the record TTL,
+    clamped to ``min_ttl``/``max_ttl``. Record TTLs are read from DNS when
+    ``aiodns`` is installed; otherwise addresses come from the system resolver
+    and are cached for ``default_ttl`` seconds.
+
+    Entries used within ``idle_timeout`` seconds are refreshed in the
+    background shortly before they expire, so probes rarely wait for a
+    lookup. When the upstream resolver fails, expired entries are served for
+    up to ``max_stale`` seconds past their expiry.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = DEFAULT_TTL,
+        min_ttl: float = DEFAULT_MIN_TTL,
+        max_ttl: float = DEFAULT_MAX_TTL,
+        max_stale: float = DEFAULT_MAX_STALE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        prefetch: bool = True,
+        nameservers: Optional[List[str]] = None,
+        upstream: Optional[AbstractResolver] = None,
+    ):
+        """Create a caching resolver. Must be called with a running event loop.
+
+        Args:
+            default_ttl (float): Seconds to cache answers that carry no TTL.
+            min_ttl (float): Lower bound applied to record TTLs.
+            max_ttl (float): Upper bound applied to record TTLs.
+            max_stale (float): Seconds past expiry an entry may be served while
+                the upstream resolver is failing.
+            idle_timeout (float): Entries unused for longer are not prefetched.
+            prefetch (bool): Whether to refresh entries before they expire.
+            nameservers (Optional[List[str]]): DNS servers as ``ip`` or
+                ``ip:port`` strings for TTL-aware lookups, all on one port.
+                Requires ``aiodns``.
+            upstream (Optional[AbstractResolver]): Resolver used instead of the
+                system resolver for lookups without record TTLs.
+        """
+        self._loop = asyncio.get_running_loop()
+        self.default_ttl = float(default_ttl)
+        self.min_ttl = float(min_ttl)
+        self.max_ttl = float(max_ttl)
+        self.max_stale = float(max_stale)
+        self.idle_timeout = float(idle_timeout)
+        self.prefetch = prefetch
+
+        self._upstream = upstream or ThreadedResolver()
+        self._dns = None
+        if aiodns is not None and upstream is None:
+            addresses, port = split_nameservers(nameservers or [])
+            options = {"udp_port": port, "tcp_port": port} if port else {}
+            self._dns = aiodns.DNSResolver(nameservers=addresses or None, **options)
+        elif nameservers:
+            logger.warning(
+                "probe_dns_nameservers requires aiodns (pip install aiodns), "
+                "using the system resolver"
+            )
+
+        self._cache: Dict[Tuple[str, int], _CacheEntry] = {}
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "prefetches": 0,
+            "stale_served": 0,
+            "failures": 0,
+        }
+
+    def _clamp_ttl(self, ttl: Optional[float]) -> float:
+        if ttl is None:
+            ttl = self.default_ttl
+        return min(max(float(ttl), self.min_ttl), self.max_ttl)
+
+    async def _query_records(self, host: str, family: int):
+        queries = []
+        if family in (socket.AF_INET, socket.AF_UNSPEC):
+            queries.append((socket.AF_INET, "A"))
+        if family in (socket.AF_INET6, socket.AF_UNSPEC):
+            queries.append((socket.AF_INET6, "AAAA"))
+
+        results = await asyncio.gather(
+            *(self._dns.query(host, qtype) for _, qtype in queries),
+            return_exceptions=True,
+        )
+
+        addresses = []
+        ttls = []
+        errors = []
+        for (record_family, _), result in zip(queries, results):
+            if isinstance(result, Exception):
+                errors.append(result)
+                continue
+            for answer in result:
+                addresses.append((record_family, answer.host))
+                ttls.append(answer.ttl)
+
+        if not addresses:
+            raise errors[0] if errors else OSError(f"No addresses found for {host}")
+        return addresses, min(ttls)
+
+    async def _lookup(
+        self, host: str, family: int
+    ) -> Tuple[List[Tuple[int, str]], float]:
+        if self._dns is not None:
+            try:
+                addresses, ttl = await self._query_records(host, family)
+                return addresses, self._clamp_ttl(ttl)
+            except Exception as e:
+                logger.debug(
+                    f"DNS query for {host} failed ({e}), using system resolver"
+                )
+
+        infos = await self._upstream.resolve(host, 0, family)
+        addresses = []
+        for info in infos:
+            address = (info["family"], info["host"])
+            if address not in addresses:
+                addresses.append(address)
+        if not addresses:
+            raise OSError(f"No addresses found for {host}")
+        return addresses, self._clamp_ttl(None)
+
+    async def _refresh(self, key: Tuple[str, int]) -> _CacheEntry:
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The caller that started the lookup was cancelled; start another.
+            return await self._refresh(key)
+
+        future = self._loop.create_future()
+        self._inflight[key] = future
+        try:
+            addresses, ttl = await self._lookup(*key)
+            now = self._loop.time()
+            entry = _CacheEntry(addresses, ttl, now)
+            previous = self._cache.get(key)
+            if previous is not None:
+                entry.last_used = previous.last_used
+            self._cache[key] = entry
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self._counters["failures"] += 1
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+            entry = self._cache.get(key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def _start_prefetch(self, key: Tuple[str, int], entry: _CacheEntry):
+        if entry.refreshing or key in self._inflight:
+            return
+        entry.refreshing = True
+        self._counters["prefetches"] += 1
+        task = self._loop.create_task(self._refresh(key))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(REFRESH_CHECK_INTERVAL)
+            now = self._loop.time()
+            for key, entry in list(self._cache.items()):
+                if now - entry.last_used > self.idle_timeout:
+                    if now > entry.expires_at + self.max_stale:
+                        del self._cache[key]
+                    continue
+                if entry.expires_at - now <= entry.ttl * PREFETCH_FRACTION:
+                    self._start_prefetch(key, entry)
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[Dict[str, Any]]:
+        """Resolve a hostname, serving cached answers while they are fresh.
+
+        Args:
+            host (str): Hostname to resolve.
+            port (int): Port copied into the returned address records.
+            family (int): Address family, ``AF_UNSPEC`` for both IPv4 and IPv6.
+
+        Returns:
+            List[Dict[str, Any]]: Address records in the format aiohttp expects.
+        """
+        if self.prefetch and self._refresh_task is None:
+            self._refresh_task = self._loop.create_task(self._refresh_loop())
+
+        key = (host, family)
+        now = self._loop.time()
+        entry = self._cache.get(key)
+
+        if entry is not None and now < entry.expires_at:
+            self._counters["hits"] += 1
+            entry.last_used = now
+            if (
+                self.prefetch
+                and entry.expires_at - now <= entry.ttl * PREFETCH_FRACTION
+            ):
+                self._start_prefetch(key, entry)
+        else:
+            self._counters["misses"] += 1
+            try:
+                entry = await self._refresh(key)
+                entry.last_used = now
+            except Exception as e:
+                if entry is None or now > entry.expires_at + self.max_stale:
+                    raise
+                self._counters["stale_served"] += 1
+                entry.last_used = now
+                logger.warning(
+                    f"DNS lookup for {host} failed ({e}), serving stale answer"
+                )
+
+        return [
+            {
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": address_family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+            for address_family, address in entry.addresses
+        ]
+
+    async def close(self) -> None:
+        """Stop background prefetching and close the upstream resolvers."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        await self._upstream.close()
+        if self._dns is not None and hasattr(self._dns, "cancel"):
+            self._dns.cancel()
+
+    def stats(self) -> dict:
+        """Return cache counters of the resolver.
+
+        Returns:
+            dict: Cache size, hit ratio and counts of hits, misses, prefetches,
+            stale answers served and upstream failures.
+        """
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            "entries": len(self._cache),
+            "ttl_source": "dns" if self._dns is not None else "default",
+            "hit_ratio": self._counters["hits"] / lookups if lookups else None,
+            **self._counters,
+        }
@@ -0,0 +1,443 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+
+import database
+import storage
+from aggregation import (
+    AGGREGATE_INTERVALS,
+    ROLLUP_EPOCH,
+    ROLLUPS,
+    aggregates_table,
+    covered_buckets,
+    get_bucket_end,
+    get_bucket_start,
+    read_rollup_watermarks,
+)
+from counters import TimingCounter
+from records import attached_partition, records_table
+from storage.partitions import next_month
+from watermarks import read_aggregate_watermark
+
+logger = logging.getLogger(__name__)
+
+RAW = "raw"
+GRANULARITIES = (RAW,) + AGGREGATE_INTERVALS
+# Raw records are only deleted once their hour bucket holds their totals.
+RAW_COVERAGE_INTERVAL = "hour"
+DEFAULT_PRUNE_INTERVAL_MS = 3600000
+DEFAULT_PRUNE_BATCH_SIZE = 2000
+DEFAULT_PRUNE_BATCH_PAUSE_MS = 50
+
+
+def retention_policy(app_config: dict) -> Dict[str, Optional[timedelta]]:
+    """Return how long each granularity is kept, ``None`` for forever.
+
+    Reads ``retention``, a mapping of ``raw`` or an aggregate interval to a
+    number of days. Granularities not listed are kept forever.
+
+    Raises:
+        ValueError: If a granularity is unknown, a number of days is not
+            positive, or an interval would be kept shorter than the finer
+            data it covers, which could then never be pruned.
+    """
+    configured = app_config.get("retention") or {}
+    policy: Dict[str, Optional[timedelta]] = dict.fromkeys(GRANULARITIES)
+    for granularity, days in configured.items():
+        if granularity not in GRANULARITIES:
+            raise ValueError(
+                f"Unknown retention granularity '{granularity}'. "
+                f"Must be one of: {', '.join(GRANULARITIES)}"
+            )
+        if days is None:
+            continue
+        if not isinstance(days, (int, float)) or days <= 0:
+            raise ValueError(
+                f"Retention of '{granularity}' must be a positive number of days"
+            )
+        policy[granularity] = timedelta(days=days)
+
+    for child, parent in ((RAW, RAW_COVERAGE_INTERVAL),) + ROLLUPS:
+        if (
+            policy[child] is not None
+            and policy[parent] is not None
+            and policy[child] > policy[parent]
+        ):
+            raise ValueError(
+                f"Retention of '{parent}' must be at least that of '{child}', "
+                "which it covers"
+            )
+    return policy
+
+
+def month_coverage(
+    connection, table, month: date, watermark: int
+) -> Tuple[Dict[int, int], int]:
+    """Count the records of ``table`` in ``month`` and those not yet aggregated.
+
+    A record is aggregated once its id is at most the aggregate
+    ``watermark`` and its hour has an aggregate row.
+
+    Returns:
+        tuple: Records per monitor id, and the number of records whose hour
+        has no aggregates yet.
+    """
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(next_month(month), datetime.min.time())
+    hour = storage.bucket_start(connection, table.c.timestamp, RAW_COVERAGE_INTERVAL)
+    hours = connection.execute(
+        select(table.c.monitor_id, hour, func.count(), func.max(table.c.id))
+        .where(table.c.timestamp >= start, table.c.timestamp < end)
+        .group_by(table.c.monitor_id, hour)
+    ).all()
+    counts: Dict[int, int] = defaultdict(int)
+    for monitor_id, _, count, _ in hours:
+        counts[monitor_id] += count
+    covered = {
+        monitor_id: covered_buckets(
+            connection, monitor_id, RAW_COVERAGE_INTERVAL, start, end
+        )
+        for monitor_id in counts
+    }
+    uncovered = sum(
+        count
+        for monitor_id, bucket_start, count, newest_id in hours
+        if newest_id > watermark or bucket_start not in covered[monitor_id]
+    )
+    return dict(counts), uncovered
+
+
+class RetentionPruner:
+    """Background pruning of raw records and aggregates past their retention.
+
+    Every ``prune_interval`` milliseconds, deletes the rows of each
+    granularity in ``retention`` older than its retention, in batches of
+    ``prune_batch_size`` rows with a pause of ``prune_batch_pause``
+    milliseconds in between, so the record writer never waits long for the
+    database.
+
+    Nothing is deleted that the remaining data does not cover. Raw records
+    are kept until the aggregates include them, that is up to the aggregate
+    watermark and in hours with aggregate rows; records of hours still
+    missing aggregates wait for the backfill. Aggregate rows are kept until
+    they have been rolled up into every coarser interval.
+
+    Records in monthly partitions are not deleted row by row: once a whole
+    month is past the raw retention and covered by the aggregates, its
+    partition file is removed. Archived months, covered when archived, are
+    removed once past the raw retention.
+    """
+
+    def __init__(self, writer, app_config: dict):
+        """Create a pruner.
+
+        Args:
+            writer (RecordWriter): Writer whose aggregate recovery must finish
+                before the watermarks are read.
+            app_config (dict): Application configuration. Reads
+                ``retention``, ``prune_interval``, ``prune_batch_size`` and
+                ``prune_batch_pause``.
+
+        Raises:
+            ValueError: If the retention policy is invalid.
+        """
+        self.writer = writer
+        self.policy = retention_policy(app_config)
+        self.interval = (
+            app_config.get("prune_interval", DEFAULT_PRUNE_INTERVAL_MS) / 1000
+        )
+        self.batch_size = max(
+            1, int(app_config.get("prune_batch_size", DEFAULT_PRUNE_BATCH_SIZE))
+        )
+        self.batch_pause = (
+            app_config.get("prune_batch_pause", DEFAULT_PRUNE_BATCH_PAUSE_MS) / 1000
+        )
+        self._stopping = False
+        self._status = "waiting"
+        self._runs = 0
+        self._deleted: Dict[str, int] = dict.fromkeys(GRANULARITIES, 0)
+        self._partitions_removed = 0
+        self._archives_removed = 0
+        self._kept_uncovered = 0
+        self._reclaimed_bytes = 0
+        self._free_bytes: Optional[int] = None
+        self._last_run: Optional[datetime] = None
+        self._last_duration: Optional[float] = None
+        self._last_deleted = 0
+        self._batch_latency = TimingCounter()
+
+    def _delete_batch(self, statement):
+        started = time.perf_counter()
+        with database.engine.begin() as connection:
+            connection.execute(statement)
+        self._batch_latency.add(time.perf_counter() - started)
+        if self.batch_pause:
+            time.sleep(self.batch_pause)
+
+    def _covered_ids(self, connection, rows) -> List[int]:
+        """Return the ids of raw records whose hour bucket has aggregates."""
+        by_monitor = defaultdict(list)
+        for row in rows:
+            by_monitor[row.monitor_id].append(row)
+        ids = []
+        for monitor_id, monitor_rows in by_monitor.items():
+            start = get_bucket_start(
+                min(row.timestamp for row in monitor_rows), RAW_COVERAGE_INTERVAL
+            )
+            end = get_bucket_end(
+                get_bucket_start(
+                    max(row.timestamp for row in monitor_rows), RAW_COVERAGE_INTERVAL
+                ),
+                RAW_COVERAGE_INTERVAL,
+            )
+            covered = covered_buckets(
+                connection, monitor_id, RAW_COVERAGE_INTERVAL, start, end
+            )
+            ids.extend(
+                row.id
+                for row in monitor_rows
+                if get_bucket_start(row.timestamp, RAW_COVERAGE_INTERVAL) in covered
+            )
+        return ids
+
+    def _prune_records(self, cutoff: datetime) -> Tuple[int, int]:
+        """Delete raw records before ``cutoff`` counted in the aggregates.
+
+        Returns:
+            tuple: Records deleted and records kept because their hour has no
+            aggregates yet.
+        """
+        deleted = kept = 0
+        last_id = 0
+        with database.engine.connect() as connection:
+            watermark = read_aggregate_watermark(connection) or 0
+        while not self._stopping:
+            with database.engine.connect() as connection:
+                rows = connection.execute(
+                    select(
+                        records_table.c.id,
+                        records_table.c.monitor_id,
+                        records_table.c.timestamp,
+                    )
+                    .where(
+                        records_table.c.id > last_id,
+                        records_table.c.id <= watermark,
+                        records_table.c.timestamp < cutoff,
+                    )
+                    .order_by(records_table.c.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                ids = self._covered_ids(connection, rows)
+            kept += len(rows) - len(ids)
+            if ids:
+                self._delete_batch(
+                    delete(records_table).where(records_table.c.id.in_(ids))
+                )
+                deleted += len(ids)
+                self._deleted[RAW] += len(ids)
+        return deleted, kept
+
+    def _remove_partitions(self, cutoff: datetime) -> Tuple[int, int]:
+        """Remove the record partitions of months that ended before ``cutoff``.
+
+        A partition is only removed once the aggregates include every one of
+        its records; until then it is kept whole.
+
+        Returns:
+            tuple: Records removed and records kept because their hour has no
+            aggregates yet.
+        """
+        partitions = database.backend.partitions
+        if partitions is None:
+            return 0, 0
+        deleted = kept = 0
+        with database.engine.connect() as connection:
+            watermark = read_aggregate_watermark(connection) or 0
+        for month in partitions.months():
+            end = datetime.combine(next_month(month), datetime.min.time())
+            if self._stopping or end > cutoff:
+                break
+            with database.engine.connect() as connection:
+                table = attached_partition(connection, month)
+                counts, uncovered = month_coverage(connection, table, month, watermark)
+                partitions.attach(connection, [])
+            if uncovered:
+                kept += uncovered
+                continue
+            partitions.remove(month)
+            records = sum(counts.values())
+            deleted += records
+            self._deleted[RAW] += records
+            self._partitions_removed += 1
+        return deleted, kept
+
+    def _remove_archives(self, cutoff: datetime) -> int:
+        """Remove the record archives of months that ended before ``cutoff``.
+
+        Returns:
+            int: Records removed.
+        """
+        archive = database.backend.archive
+        if archive is None:
+            return 0
+        deleted = 0
+        for month in archive.months():
+            end = datetime.combine(next_month(month), datetime.min.time())
+            if self._stopping or end > cutoff:
+                break
+            archived = archive.open(month)
+            records = archived.count if archived is not None else 0
+            archive.remove(month)
+            deleted += records
+            self._deleted[RAW] += records
+            self._archives_removed += 1
+        return deleted
+
+    def _prune_aggregates(self, interval: str, cutoff: datetime) -> int:
+        """Delete ``interval`` buckets before ``cutoff`` already rolled up."""
+        with database.engine.connect() as connection:
+            watermarks = read_rollup_watermarks(connection)
+        for child, parent in ROLLUPS:
+            if child == interval:
+                cutoff = min(cutoff, watermarks.get((child, parent), ROLLUP_EPOCH))
+
+        key_columns = tuple_(
+            aggregates_table.c.monitor_id, aggregates_table.c.bucket_start
+        )
+        deleted = 0
+        while not self._stopping:
+            with database.engine.connect() as connection:
+                keys = connection.execute(
+                    select(
+                        aggregates_table.c.monitor_id, aggregates_table.c.bucket_start
+                    )
+                    .where(
+                        aggregates_table.c.interval == interval,
+                        aggregates_table.c.bucket_start < cutoff,
+                    )
+                    .order_by(aggregates_table.c.bucket_start)
+                    .limit(self.batch_size)
+                ).all()
+            if not keys:
+                break
+            self._delete_batch(
+                delete(aggregates_table).where(
+                    aggregates_table.c.interval == interval,
+                    key_columns.in_([tuple(key) for key in keys]),
+                )
+            )
+            deleted += len(keys)
+            self._deleted[interval] += len(keys)
+        return deleted
+
+    def _free_space(self) -> Optional[int]:
+        with database.engine.connect() as connection:
+            return database.backend.free_bytes(connection)
+
+    def prune(self) -> int:
+        """Delete everything past its retention once.
+
+        Returns:
+            int: Number of rows deleted.
+        """
+        started = time.perf_counter()
+        now = datetime.now()
+        free_before = self._free_space()
+        deleted = 0
+        kept = 0
+        for granularity, retention in self.policy.items():
+            if retention is None or self._stopping:
+                continue
+            cutoff = now - retention
+            if granularity == RAW:
+                granularity_deleted, kept = self._prune_records(cutoff)
+                removed, kept_partitioned = self._remove_partitions(cutoff)
+                granularity_deleted += removed + self._remove_archives(cutoff)
+                kept += kept_partitioned
+            else:
+                granularity_deleted = self._prune_aggregates(granularity, cutoff)
+            deleted += granularity_deleted
+
+        self._free_bytes = self._free_space()
+        if free_before is not None and self._free_bytes is not None:
+            self._reclaimed_bytes += max(0, self._free_bytes - free_before)
+        self._runs += 1
+        self._kept_uncovered = kept
+        self._last_run = now
+        self._last_duration = time.perf_counter() - started
+        self._last_deleted = deleted
+        if deleted or kept:
+            logger.info(
+                f"Pruned {deleted} rows past retention in {self._last_duration:.1f}s"
+                + (f", kept {kept} records without aggregates" if kept else "")
+            )
+        return deleted
+
+    async def run(self):
+        """Prune every ``prune_interval`` until cancelled.
+
+        Does nothing without a ``retention`` setting. Errors are logged and
+        retried at the next interval.
+        """
+        if all(retention is None for retention in self.policy.values()):
+            self._status = "disabled"
+            return
+        await self.writer.ready.wait()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._status = "pruning"
+                try:
+                    await loop.run_in_executor(None, self.prune)
+                except Exception as e:
+                    logger.exception(f"Pruning past retention failed: {e}")
+                self._status = "idle"
+                await asyncio.sleep(self.interval)
+        finally:
+            # The running batch finishes on its own thread.
+            self._stopping = True
+            self._status = "stopped"
+
+    def stats(self) -> dict:
+        """Return the retention policy and pruning counters.
+
+        Returns:
+            dict: Status, retention in days per granularity (``None`` keeps
+            forever), completed runs, rows deleted per granularity, records
+            kept by the last run for lack of aggregates, record partitions
+            and archives removed, the last run's start, duration, rows
+            deleted and rows per second, bytes freed for reuse by pruning and
+            free bytes in the database where the backend reports them, and
+            batch latency in seconds.
+        """
+        return {
+            "status": self._status,
+            "retention_days": {
+                granularity: retention.total_seconds() / 86400 if retention else None
+                for granularity, retention in self.policy.items()
+            },
+            "runs": self._runs,
+            "deleted": dict(self._deleted),
+            "kept_uncovered": self._kept_uncovered,
+            "partitions_removed": self._partitions_removed,
+            "archives_removed": self._archives_removed,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_duration": self._last_duration,
+            "last_deleted": self._last_deleted,
+            "rows_per_sec": (
+                self._last_deleted / self._last_duration
+                if self._last_duration
+                else None
+            ),
+            "reclaimed_bytes": self._reclaimed_bytes,
+            "free_bytes": self._free_bytes,
+            "batch_latency": self._batch_latency.as_dict(),
+        }
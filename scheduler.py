@@ -0,0 +1,347 @@
+import asyncio
+import heapq
+import logging
+import random
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_MS = 30000
+LAG_SAMPLE_SIZE = 2048
+
+ADAPTIVE_BACKOFF = 1.5
+ADAPTIVE_STABLE_CHECKS = 5
+TREND_FAST_ALPHA = 0.3
+TREND_SLOW_ALPHA = 0.05
+TREND_RATIO = 1.5
+TREND_MIN_INCREASE = 0.05
+
+
+class _MonitorState:
+    """Scheduling state for a single monitor."""
+
+    __slots__ = (
+        "monitor",
+        "interval",
+        "adaptive",
+        "last_due",
+        "next_due",
+        "task",
+        "dispatched",
+        "skipped",
+        "last_lag",
+        "last_duration",
+    )
+
+    def __init__(
+        self, monitor: dict, interval: float, adaptive: Optional["AdaptiveInterval"]
+    ):
+        self.monitor = monitor
+        self.interval = interval
+        self.adaptive = adaptive
+        self.last_due = 0.0
+        self.next_due = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.skipped = 0
+        self.last_lag = 0.0
+        self.last_duration: Optional[float] = None
+
+
+def get_interval_seconds(monitor: dict) -> float:
+    """Return a monitor's check interval in seconds, falling back to the default."""
+    interval_ms = monitor.get("interval", DEFAULT_INTERVAL_MS)
+    if not isinstance(interval_ms, (int, float)) or interval_ms <= 0:
+        logger.warning(
+            f"{monitor.get('name')}: Invalid monitor interval '{interval_ms}', "
+            f"using default {DEFAULT_INTERVAL_MS}ms"
+        )
+        interval_ms = DEFAULT_INTERVAL_MS
+    return interval_ms / 1000
+
+
+class AdaptiveInterval:
+    """Check interval of one monitor, adjusted from its recent results.
+
+    A failed check, or a latency trend where the short-term average response
+    time rises well above the long-term average, drops the interval to
+    ``min_interval``. After ``ADAPTIVE_STABLE_CHECKS`` consecutive healthy
+    checks the interval grows by ``ADAPTIVE_BACKOFF``, up to ``max_interval``.
+    """
+
+    __slots__ = ("min_interval", "max_interval", "interval", "stable", "fast", "slow")
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.stable = 0
+        self.fast: Optional[float] = None
+        self.slow: Optional[float] = None
+
+    def _latency_trending_up(self, response_time: Optional[float]) -> bool:
+        if response_time is None:
+            return False
+        if self.fast is None:
+            self.fast = self.slow = response_time
+            return False
+        self.fast += TREND_FAST_ALPHA * (response_time - self.fast)
+        self.slow += TREND_SLOW_ALPHA * (response_time - self.slow)
+        return (
+            self.fast > self.slow * TREND_RATIO
+            and self.fast - self.slow > TREND_MIN_INCREASE
+        )
+
+    def observe(self, is_up: bool, response_time: Optional[float]) -> float:
+        """Update the interval with a check result and return it in seconds."""
+        trending = self._latency_trending_up(response_time)
+        if not is_up or trending:
+            self.stable = 0
+            self.interval = self.min_interval
+            return self.interval
+
+        self.stable += 1
+        if self.stable >= ADAPTIVE_STABLE_CHECKS:
+            self.stable = 0
+            self.interval = min(self.interval * ADAPTIVE_BACKOFF, self.max_interval)
+        return self.interval
+
+
+def get_adaptive_interval(
+    monitor: dict, interval: float, enabled: bool = False
+) -> Optional[AdaptiveInterval]:
+    """Return the adaptive interval policy of a monitor, or None if it is disabled.
+
+    Args:
+        monitor (dict): Monitor configuration. Reads ``adaptive``,
+            ``min_interval`` and ``max_interval`` (milliseconds).
+        interval (float): Configured check interval in seconds.
+        enabled (bool): Default used when the monitor does not set ``adaptive``.
+    """
+    if not monitor.get("adaptive", enabled):
+        return None
+
+    min_interval = monitor.get("min_interval", interval * 1000 / 4) / 1000
+    max_interval = monitor.get("max_interval", interval * 1000 * 4) / 1000
+    if min_interval <= 0 or max_interval < min_interval:
+        logger.warning(
+            f"{monitor.get('name')}: Invalid adaptive interval bounds, "
+            "using the fixed interval"
+        )
+        return None
+    return AdaptiveInterval(interval, min_interval, max_interval)
+
+
+class MonitorScheduler:
+    """Fixed-rate check scheduler keyed by each monitor's next due time.
+
+    Monitors are kept in a min-heap ordered by their next due time on the
+    event loop clock. Each monitor runs at its own interval, and due times
+    advance by whole intervals from the previous due time rather than from
+    check completion, so slow checks do not make the schedule drift.
+
+    Start times are spread across each monitor's first interval with random
+    jitter to avoid every probe firing in the same instant. A monitor whose
+    previous check is still running when it becomes due is not started again;
+    the tick is skipped and counted instead.
+
+    Monitors with adaptive intervals report each result through ``observe``,
+    which moves their next due time when the interval changes.
+    """
+
+    def __init__(
+        self,
+        monitors_config: List[dict],
+        run_check: Callable[[dict], Awaitable[None]],
+        jitter: float = 1.0,
+        adaptive: bool = False,
+    ):
+        """Create a scheduler.
+
+        Args:
+            monitors_config (List[dict]): Monitor configurations to schedule.
+            run_check (Callable): Coroutine function called with a monitor config
+                each time that monitor is due.
+            jitter (float): Fraction (0-1) of each monitor's interval used to
+                randomly offset its first check.
+            adaptive (bool): Whether monitors without an ``adaptive`` setting
+                use adaptive intervals.
+        """
+        self._run_check = run_check
+        self._jitter = min(max(float(jitter), 0.0), 1.0)
+        self._states: List[_MonitorState] = []
+        for monitor in monitors_config:
+            interval = get_interval_seconds(monitor)
+            policy = get_adaptive_interval(monitor, interval, adaptive)
+            if policy is not None:
+                interval = policy.interval
+            self._states.append(_MonitorState(monitor, interval, policy))
+        self._index_by_name: Dict[str, int] = {
+            state.monitor["name"]: index for index, state in enumerate(self._states)
+        }
+        self._heap: list = []
+        self._wakeup = asyncio.Event()
+        self._lag_samples: deque = deque(maxlen=LAG_SAMPLE_SIZE)
+
+    def _initial_offset(self, state: _MonitorState) -> float:
+        return random.uniform(0, state.interval * self._jitter)
+
+    def _dispatch(self, index: int, due: float, now: float):
+        state = self._states[index]
+        if state.task is not None and not state.task.done():
+            state.skipped += 1
+            logger.warning(
+                f"{state.monitor['name']}: Previous check still running, skipping tick "
+                f"({state.skipped} skipped so far)"
+            )
+            return
+
+        state.dispatched += 1
+        state.last_lag = now - due
+        self._lag_samples.append(state.last_lag)
+        state.task = asyncio.create_task(self._run(state))
+
+    async def _run(self, state: _MonitorState):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await self._run_check(state.monitor)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                "Unexpected monitor task exception that was recovered: %s",
+                e,
+                exc_info=(type(e), e, e.__traceback__),
+            )
+        finally:
+            state.last_duration = loop.time() - started
+
+    def observe(
+        self, monitor_name: str, is_up: bool, response_time: Optional[float]
+    ) -> float:
+        """Report a check result and return the interval until the next check.
+
+        For monitors with adaptive intervals the result updates the interval,
+        and the pending check is moved to one new interval after the check's
+        due time.
+
+        Args:
+            monitor_name (str): Name of the checked monitor.
+            is_up (bool): Whether the check succeeded.
+            response_time (Optional[float]): Response time in seconds, if any.
+
+        Returns:
+            float: Seconds until the monitor is checked again.
+        """
+        index = self._index_by_name[monitor_name]
+        state = self._states[index]
+        if state.adaptive is None:
+            return state.interval
+
+        interval = state.adaptive.observe(is_up, response_time)
+        if interval != state.interval:
+            state.interval = interval
+            loop = asyncio.get_running_loop()
+            state.next_due = max(state.last_due + interval, loop.time())
+            heapq.heappush(self._heap, (state.next_due, index))
+            self._wakeup.set()
+        return interval
+
+    def _reschedule(self, index: int, due: float, now: float):
+        state = self._states[index]
+        state.last_due = due
+        next_due = due + state.interval
+        if next_due <= now:
+            missed = int((now - next_due) // state.interval) + 1
+            state.skipped += missed
+            next_due += missed * state.interval
+            logger.warning(
+                f"{state.monitor['name']}: Scheduler fell behind, skipped {missed} tick(s)"
+            )
+        state.next_due = next_due
+        heapq.heappush(self._heap, (next_due, index))
+
+    async def run(self):
+        """Run the scheduling loop until cancelled.
+
+        In-flight checks are cancelled when the scheduler is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        for state in self._states:
+            state.next_due = now + self._initial_offset(state)
+        self._heap = [
+            (state.next_due, index) for index, state in enumerate(self._states)
+        ]
+        heapq.heapify(self._heap)
+
+        try:
+            while True:
+                if not self._heap:
+                    await asyncio.Event().wait()
+
+                due, index = self._heap[0]
+                if due != self._states[index].next_due:
+                    heapq.heappop(self._heap)
+                    continue
+
+                now = loop.time()
+                if due > now:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), due - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                self._dispatch(index, due, now)
+                self._reschedule(index, due, now)
+        finally:
+            tasks = [
+                state.task
+                for state in self._states
+                if state.task is not None and not state.task.done()
+            ]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, object]:
+        """Return scheduler counters for all monitors.
+
+        Returns:
+            dict: Totals, scheduling lag percentiles in seconds, and per-monitor
+            dispatched/skipped counts.
+        """
+        lags = sorted(self._lag_samples)
+
+        def percentile(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return lags[min(len(lags) - 1, int(p * len(lags)))]
+
+        monitors = {
+            state.monitor["name"]: {
+                "interval": state.interval,
+                "adaptive": state.adaptive is not None,
+                "dispatched": state.dispatched,
+                "skipped": state.skipped,
+                "running": state.task is not None and not state.task.done(),
+                "last_lag": state.last_lag,
+                "last_duration": state.last_duration,
+            }
+            for state in self._states
+        }
+        return {
+            "monitors_scheduled": len(self._states),
+            "dispatched": sum(s.dispatched for s in self._states),
+            "skipped": sum(s.skipped for s in self._states),
+            "lag_p50": percentile(0.50),
+            "lag_p99": percentile(0.99),
+            "lag_max": lags[-1] if lags else None,
+            "monitors": monitors,
+        }
@@ -0,0 +1,383 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from api.models import MonitorRecord
+
+logger = logging.getLogger(__name__)
+
+SINK_FLUSH_INTERVAL = 0.2
+SINK_BATCH_SIZE = 500
+STATS_INTERVAL = 5.0
+READ_BATCH_SIZE = 1000
+RESTART_BACKOFF = 5.0
+STOP_TIMEOUT = 10.0
+# Stats of the subsystems that run in the shards, reported to the parent.
+REPORTED_STATS = ("scheduler", "probes", "notifications", "confirmation")
+
+RECORD_FIELDS = ("monitor_name",) + tuple(
+    column.name
+    for column in MonitorRecord.__table__.columns
+    if column.name not in ("id", "monitor_id")
+)
+
+
+def shard_for(monitor_name: str, shard_count: int) -> int:
+    """Return the shard a monitor is assigned to.
+
+    Uses rendezvous hashing on the monitor name, so assignments are stable
+    across restarts and changing the shard count only moves the monitors of
+    added or removed shards.
+    """
+    return max(
+        range(shard_count),
+        key=lambda shard: zlib.crc32(f"{shard}:{monitor_name}".encode("utf-8")),
+    )
+
+
+def assign_shards(monitors_config: List[dict], shard_count: int) -> List[List[dict]]:
+    """Partition monitors into ``shard_count`` lists by ``shard_for``."""
+    shards: List[List[dict]] = [[] for _ in range(shard_count)]
+    for monitor in monitors_config:
+        shards[shard_for(monitor["name"], shard_count)].append(monitor)
+    return shards
+
+
+def record_to_dict(record: MonitorRecord) -> dict:
+    """Return the column values of an unsaved record for sending between processes."""
+    return {field: getattr(record, field) for field in RECORD_FIELDS}
+
+
+class ShardSink:
+    """Record writer stand-in that forwards a shard's results to the parent.
+
+    Records are buffered and sent to the parent process in batches, either
+    when ``SINK_BATCH_SIZE`` records are waiting or every
+    ``SINK_FLUSH_INTERVAL`` seconds.
+    """
+
+    def __init__(self, shard_index: int, results):
+        self.shard_index = shard_index
+        self._results = results
+        self._buffer: List[dict] = []
+
+    async def submit(self, record: MonitorRecord):
+        """Buffer a check result for the parent's record writer."""
+        self._buffer.append(record_to_dict(record))
+        if len(self._buffer) >= SINK_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Send buffered records to the parent process."""
+        if self._buffer:
+            self._results.put(("records", self.shard_index, time.time(), self._buffer))
+            self._buffer = []
+
+    async def run(self):
+        """Flush buffered records periodically until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(SINK_FLUSH_INTERVAL)
+                self.flush()
+        finally:
+            self.flush()
+
+
+def _shard_summary(stats: dict) -> dict:
+    scheduler = stats.get("scheduler") or {}
+    probes = stats.get("probes") or {}
+    return {
+        "monitors_scheduled": scheduler.get("monitors_scheduled"),
+        "dispatched": scheduler.get("dispatched"),
+        "skipped": scheduler.get("skipped"),
+        "lag_p50": scheduler.get("lag_p50"),
+        "lag_p99": scheduler.get("lag_p99"),
+        "lag_max": scheduler.get("lag_max"),
+        "in_flight": probes.get("in_flight"),
+        "waiting": probes.get("waiting"),
+        "queue_wait": probes.get("queue_wait"),
+        "request_time": probes.get("request_time"),
+        "notifications": stats.get("notifications"),
+        "confirmation": stats.get("confirmation"),
+    }
+
+
+async def _run_shard(
+    shard_index: int, monitors_config: List[dict], app_config: dict, results, stop_event
+):
+    import monitor
+
+    parent_pid = os.getppid()
+    sink = ShardSink(shard_index, results)
+    sink_task = asyncio.create_task(sink.run())
+    probe_task = asyncio.create_task(
+        monitor.run_probe_loop(monitors_config, app_config, sink)
+    )
+
+    try:
+        last_stats = 0.0
+        while not probe_task.done():
+            await asyncio.sleep(0.5)
+            if stop_event.is_set() or os.getppid() != parent_pid:
+                break
+            now = time.monotonic()
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                results.put(
+                    (
+                        "stats",
+                        shard_index,
+                        time.time(),
+                        {
+                            key: value
+                            for key, value in monitor.get_monitor_stats().items()
+                            if key in REPORTED_STATS
+                        },
+                    )
+                )
+    finally:
+        probe_task.cancel()
+        await asyncio.gather(probe_task, return_exceptions=True)
+        sink_task.cancel()
+        await asyncio.gather(sink_task, return_exceptions=True)
+
+
+def shard_process_main(
+    shard_index: int, monitors_config: List[dict], app_config: dict, results, stop_event
+):
+    """Entry point of a probe shard process.
+
+    Runs the probe loop for the shard's monitors on its own event loop and
+    connection pool until the parent sets ``stop_event`` or exits.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(levelname)s:shard-{shard_index}:%(name)s:%(message)s",
+    )
+    logger.info(f"Shard {shard_index} probing {len(monitors_config)} monitors")
+    asyncio.run(
+        _run_shard(shard_index, monitors_config, app_config, results, stop_event)
+    )
+
+
+class _ShardState:
+    """Process handle and counters of one shard, as seen by the parent."""
+
+    __slots__ = (
+        "process",
+        "monitors",
+        "started_at",
+        "restarts",
+        "received",
+        "rate_mark",
+        "records_per_sec",
+        "delivery_lag",
+        "last_report",
+        "report",
+    )
+
+    def __init__(self, monitors: List[dict]):
+        self.process = None
+        self.monitors = monitors
+        self.started_at = 0.0
+        self.restarts = 0
+        self.received = 0
+        self.rate_mark = (time.monotonic(), 0)
+        self.records_per_sec = None
+        self.delivery_lag = None
+        self.last_report = None
+        self.report: Optional[dict] = None
+
+
+class ShardSupervisor:
+    """Runs probing in worker processes and feeds their results to one writer.
+
+    Monitors are partitioned across ``probe_shards`` processes with
+    ``shard_for``, so each monitor keeps probing from the same process and
+    its keep-alive connections and DNS cache stay warm. Every shard runs its
+    own event loop, connection pool, scheduler and notification dispatcher.
+    Results are sent back to this process and persisted by its record writer.
+    Shard processes that exit unexpectedly are restarted.
+    """
+
+    def __init__(self, monitors_config: List[dict], app_config: dict, shard_count: int):
+        """Create a supervisor.
+
+        Args:
+            monitors_config (List[dict]): All monitor configurations.
+            app_config (dict): Application configuration passed to every shard.
+            shard_count (int): Number of probe processes.
+        """
+        self.app_config = app_config
+        self.shard_count = shard_count
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._stop_event = self._context.Event()
+        self._shards = [
+            _ShardState(monitors)
+            for monitors in assign_shards(monitors_config, shard_count)
+        ]
+        self._reader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="shard-reader"
+        )
+        self._stopping = False
+
+    def _start(self, index: int):
+        shard = self._shards[index]
+        shard.process = self._context.Process(
+            target=shard_process_main,
+            args=(
+                index,
+                shard.monitors,
+                self.app_config,
+                self._results,
+                self._stop_event,
+            ),
+            name=f"probe-shard-{index}",
+            daemon=True,
+        )
+        shard.process.start()
+        shard.started_at = time.monotonic()
+
+    def _read_messages(self) -> list:
+        try:
+            messages = [self._results.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(messages) < READ_BATCH_SIZE:
+            try:
+                messages.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    async def _handle(self, message, writer):
+        kind, index, sent_at, payload = message
+        shard = self._shards[index]
+        shard.delivery_lag = max(0.0, time.time() - sent_at)
+        if kind == "records":
+            shard.received += len(payload)
+            for values in payload:
+                await writer.submit(MonitorRecord(**values))
+        elif kind == "stats":
+            now = time.monotonic()
+            mark_time, mark_received = shard.rate_mark
+            if now > mark_time:
+                shard.records_per_sec = (shard.received - mark_received) / (
+                    now - mark_time
+                )
+            shard.rate_mark = (now, shard.received)
+            shard.last_report = sent_at
+            shard.report = payload
+
+    async def _read_results(self, writer):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            for message in await loop.run_in_executor(
+                self._reader, self._read_messages
+            ):
+                await self._handle(message, writer)
+
+    def _supervise(self):
+        now = time.monotonic()
+        for index, shard in enumerate(self._shards):
+            if shard.process.is_alive():
+                continue
+            if now - shard.started_at < RESTART_BACKOFF:
+                continue
+            logger.error(
+                f"Probe shard {index} exited with code {shard.process.exitcode}, restarting"
+            )
+            shard.restarts += 1
+            self._start(index)
+
+    def _stop(self):
+        self._stop_event.set()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for shard in self._shards:
+            if shard.process is None:
+                continue
+            shard.process.join(max(0.0, deadline - time.monotonic()))
+            if shard.process.is_alive():
+                shard.process.terminate()
+                shard.process.join(1)
+
+    async def run(self, writer):
+        """Start the shard processes and persist their results until cancelled.
+
+        Args:
+            writer (RecordWriter): Writer that persists results from all shards.
+        """
+        loop = asyncio.get_running_loop()
+        for index in range(self.shard_count):
+            self._start(index)
+        monitor_counts = [len(shard.monitors) for shard in self._shards]
+        logger.info(
+            f"Started {self.shard_count} probe shards with {monitor_counts} monitors"
+        )
+
+        reader_task = asyncio.create_task(self._read_results(writer))
+        try:
+            while True:
+                await asyncio.sleep(1)
+                self._supervise()
+        finally:
+            await loop.run_in_executor(None, self._stop)
+            # The reader finishes the batch it is handling, then whatever the
+            # stopped shards left in the queue is handled until it is empty.
+            self._stopping = True
+            await asyncio.gather(reader_task, return_exceptions=True)
+            while True:
+                messages = await loop.run_in_executor(self._reader, self._read_messages)
+                if not messages:
+                    break
+                for message in messages:
+                    await self._handle(message, writer)
+            self._reader.shutdown(wait=True)
+
+    def reported_stats(self, key: str) -> List[Optional[dict]]:
+        """Return the stats of a subsystem last reported by each shard.
+
+        Args:
+            key (str): Subsystem, one of ``REPORTED_STATS``.
+
+        Returns:
+            list: Stats of every shard by shard index, ``None`` for shards
+            that have not reported yet.
+        """
+        return [shard.report and shard.report.get(key) for shard in self._shards]
+
+    def stats(self) -> Dict[str, object]:
+        """Return throughput and lag for every shard.
+
+        Returns:
+            dict: Per-shard process state, record totals and rate, delivery lag
+            of results to this process, and the scheduler and probe summary last
+            reported by the shard.
+        """
+        return {
+            "shard_count": self.shard_count,
+            "shards": [
+                {
+                    "index": index,
+                    "pid": shard.process.pid if shard.process else None,
+                    "alive": bool(shard.process and shard.process.is_alive()),
+                    "restarts": shard.restarts,
+                    "monitors": len(shard.monitors),
+                    "records_received": shard.received,
+                    "records_per_sec": shard.records_per_sec,
+                    "delivery_lag": shard.delivery_lag,
+                    "last_report": shard.last_report,
+                    **_shard_summary(shard.report or {}),
+                }
+                for index, shard in enumerate(self._shards)
+            ],
+        }
@@ -0,0 +1,147 @@
+import math
+from typing import Dict, Iterable, Optional
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 0.0001
+MAX_KEY = 1024
+ENCODING_VERSION = 1
+
+
+def _key(value: float) -> int:
+    if value <= MIN_VALUE:
+        return 0
+    return min(MAX_KEY, math.ceil(math.log(value / MIN_VALUE) / LOG_GAMMA))
+
+
+def _value(key: int) -> float:
+    if key == 0:
+        return MIN_VALUE
+    return MIN_VALUE * 2 * GAMMA**key / (GAMMA + 1)
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, offset: int):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class LatencySketch:
+    """Mergeable histogram of response times in logarithmic buckets.
+
+    Values are counted in buckets growing by ``GAMMA``, so any quantile is
+    returned within ``RELATIVE_ACCURACY`` of the true value, from 0.1 ms up,
+    whatever the number of samples. Sketches of adjacent time buckets are
+    combined by adding their counts, which makes percentiles of any range of
+    aggregate buckets cheap to compute.
+
+    Serialized as a version byte followed by varint-encoded bucket key deltas
+    and counts, at most a few hundred bytes.
+    """
+
+    __slots__ = ("counts",)
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = counts or {}
+
+    def add(self, value: float, count: int = 1):
+        """Count one response time in seconds."""
+        key = _key(value)
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        """Add the counts of another sketch to this one and return it."""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        return self
+
+    @property
+    def total(self) -> int:
+        """Number of values counted."""
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the approximate ``q`` quantile (0 to 1), or None if empty."""
+        total = self.total
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen > rank:
+                return _value(key)
+        return _value(max(self.counts))
+
+    def percentiles(self) -> dict:
+        """Return the p50, p95 and p99 response times in seconds."""
+        return {
+            "p50_response_time": self.quantile(0.50),
+            "p95_response_time": self.quantile(0.95),
+            "p99_response_time": self.quantile(0.99),
+        }
+
+    def count_above(self, threshold: float) -> int:
+        """Return how many values exceed ``threshold``, within the sketch accuracy.
+
+        Values in the bucket containing ``threshold`` are split in proportion
+        to the part of the bucket, on a log scale, above it.
+        """
+        threshold_key = _key(threshold)
+        above = sum(count for key, count in self.counts.items() if key > threshold_key)
+        straddling = self.counts.get(threshold_key, 0)
+        if straddling and threshold > MIN_VALUE:
+            upper = MIN_VALUE * GAMMA**threshold_key
+            above += straddling * math.log(upper / threshold) / LOG_GAMMA
+        return round(above)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the sketch for storage."""
+        out = bytearray((ENCODING_VERSION,))
+        _write_varint(out, len(self.counts))
+        previous = 0
+        for key in sorted(self.counts):
+            _write_varint(out, key - previous)
+            _write_varint(out, self.counts[key])
+            previous = key
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "LatencySketch":
+        """Deserialize a sketch; empty or missing data gives an empty sketch."""
+        if not data:
+            return cls()
+        if data[0] != ENCODING_VERSION:
+            raise ValueError(f"Unsupported latency sketch version: {data[0]}")
+        size, offset = _read_varint(data, 1)
+        counts = {}
+        key = 0
+        for _ in range(size):
+            delta, offset = _read_varint(data, offset)
+            count, offset = _read_varint(data, offset)
+            key += delta
+            counts[key] = count
+        return cls(counts)
+
+    @classmethod
+    def merged(cls, blobs: Iterable[Optional[bytes]]) -> "LatencySketch":
+        """Merge serialized sketches into one."""
+        sketch = cls()
+        for blob in blobs:
+            if blob:
+                sketch.merge(cls.from_bytes(blob))
+        return sketch
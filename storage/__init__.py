@@ -0,0 +1,58 @@
+from typing import Dict, Type
+
+from sqlalchemy import Insert, Table
+from sqlalchemy.sql import ColumnElement
+
+from .base import StorageBackend
+from .memory import MemoryBackend
+from .postgres import PostgresBackend
+from .sqlite import SQLiteBackend
+
+DEFAULT_STORAGE_BACKEND = "sqlite"
+
+BACKENDS: Dict[str, Type[StorageBackend]] = {
+    "sqlite": SQLiteBackend,
+    "postgres": PostgresBackend,
+    "memory": MemoryBackend,
+}
+
+_DIALECT_BACKENDS: Dict[str, Type[StorageBackend]] = {
+    backend.dialect: backend for backend in (SQLiteBackend, PostgresBackend)
+}
+
+
+def create_backend(app_config: dict) -> StorageBackend:
+    """Return the storage backend selected by ``storage_backend``.
+
+    Raises:
+        ValueError: If the backend is unknown or its settings are invalid.
+    """
+    name = app_config.get("storage_backend", DEFAULT_STORAGE_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown storage_backend '{name}'. "
+            f"Must be one of: {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[name](app_config)
+
+
+def dialect_backend(connection) -> Type[StorageBackend]:
+    """Return the backend class providing the SQL of a connection's dialect."""
+    name = connection.dialect.name
+    if name not in _DIALECT_BACKENDS:
+        raise ValueError(f"Unsupported database dialect: {name}")
+    return _DIALECT_BACKENDS[name]
+
+
+def upsert(connection, table: Table) -> Insert:
+    """Return an INSERT for ``table`` in the dialect of ``connection``.
+
+    The statement supports ``on_conflict_do_update`` and
+    ``on_conflict_do_nothing``.
+    """
+    return dialect_backend(connection).insert(table)
+
+
+def bucket_start(connection, column, interval: str) -> ColumnElement:
+    """Return ``column`` truncated to its ``interval`` bucket start in SQL."""
+    return dialect_backend(connection).bucket_start(column, interval)
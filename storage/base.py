@@ -0,0 +1,112 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import BigInteger, Insert, Table, type_coerce
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import ColumnElement
+
+from .columnar import RecordArchive
+from .partitions import MonthlyPartitions
+from .types import EpochMillis
+
+# Lengths of the fixed-size buckets in milliseconds. Weeks start on Monday,
+# and 1970-01-01, the epoch of stored timestamps, was a Thursday.
+_BUCKET_MILLIS = {
+    "1m": 60000,
+    "5m": 300000,
+    "hour": 3600000,
+    "day": 86400000,
+    "week": 604800000,
+}
+_BUCKET_OFFSETS = {"week": 3 * 86400000}
+
+
+class StorageBackend:
+    """Database a deployment stores its records and aggregates in.
+
+    The application talks to every backend through SQLAlchemy Core and ORM,
+    so a backend only provides what differs between databases: how its
+    writer and reader engines are created and pooled, and the few statements
+    without a portable form, namely upserts and truncation to months.
+    Statement helpers are class methods, since they are chosen by the dialect
+    of a connection rather than by configuration; see ``storage.dialect_backend``.
+    """
+
+    name = "base"
+    dialect = ""
+    # Whether other processes opening the same configuration see the same
+    # data, so work can be handed to worker processes.
+    shared_between_processes = True
+    # Monthly files raw records are split into; only SQLite supports them.
+    partitions: Optional[MonthlyPartitions] = None
+    # Columnar files cold raw records are compacted into; SQLite only too.
+    archive: Optional[RecordArchive] = None
+    # Connections the reader engine keeps open.
+    reader_pool_size = 1
+
+    def __init__(self, app_config: dict):
+        self.app_config = app_config
+
+    def settings(self) -> tuple:
+        """Return the values engines are created from, to detect changes."""
+        raise NotImplementedError
+
+    def create_engines(self) -> Tuple[Engine, Engine]:
+        """Return the writer engine and the engine API reads go through."""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        """Return a one-line description of the database for logging."""
+        return self.name
+
+    @classmethod
+    def insert(cls, table: Table) -> Insert:
+        """Return an INSERT for ``table`` supporting ``on_conflict_do_update``."""
+        raise NotImplementedError
+
+    @classmethod
+    def bucket_start(cls, column, interval: str) -> ColumnElement:
+        """Return ``EpochMillis`` ``column`` truncated to its ``interval`` bucket.
+
+        Matches ``aggregation.get_bucket_start``: weeks start on Monday.
+        Buckets of fixed length are plain integer arithmetic; months are
+        left to ``month_start``.
+        """
+        millis = type_coerce(column, BigInteger)
+        if interval == "month":
+            start = cls.month_start(millis)
+        elif interval in _BUCKET_MILLIS:
+            start = millis - (millis + _BUCKET_OFFSETS.get(interval, 0)) % (
+                _BUCKET_MILLIS[interval]
+            )
+        else:
+            raise ValueError(f"Unsupported interval: {interval}")
+        return type_coerce(start, EpochMillis)
+
+    @classmethod
+    def month_start(cls, millis) -> ColumnElement:
+        """Return epoch milliseconds ``millis`` truncated to the 1st of the month."""
+        raise NotImplementedError
+
+    @classmethod
+    def interrupt(cls, dbapi_connection):
+        """Abort the statement running on a driver connection.
+
+        Called from another thread than the one running the statement, which
+        then fails. Does nothing where the driver cannot do this.
+        """
+
+    @classmethod
+    def lock_migrations(cls, connection):
+        """Keep other processes from migrating until the transaction ends.
+
+        Called first in each migration transaction, so processes starting at
+        the same time apply every migration once.
+        """
+
+    @classmethod
+    def free_bytes(cls, connection) -> Optional[int]:
+        """Return bytes freed by deletions and reused before the file grows.
+
+        ``None`` where the database does not report it.
+        """
+        return None
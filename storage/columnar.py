@@ -0,0 +1,382 @@
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime
+from itertools import accumulate, chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .partitions import months_overlapping
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = re.compile(r"^records-(\d{4})-(\d{2})\.cols$")
+ARCHIVE_VERSION = 1
+MAGIC = b"AMAICOL1"
+# Footer length and magic closing every archive file.
+TRAILER = struct.Struct("<Q8s")
+COMPRESSION_LEVEL = 6
+# Columns every archived block has: blocks are sorted by timestamp, and the
+# highest id of a file is kept so record ids are never handed out twice.
+TIMESTAMP_COLUMN = "timestamp"
+ID_COLUMN = "id"
+# Column kinds: integers are delta-encoded, booleans bit-packed and text
+# stored as a JSON list.
+INT, BOOL, TEXT = "int", "bool", "text"
+# Signed array typecodes, narrowest first; deltas use the first that fits.
+DELTA_TYPECODES = ("b", "h", "i", "q")
+BIT_VALUES = [tuple(bool(byte >> bit & 1) for bit in range(8)) for byte in range(256)]
+BIG_ENDIAN = sys.byteorder == "big"
+
+
+def _pack_bits(flags: List[bool]) -> bytes:
+    packed = bytearray((len(flags) + 7) // 8)
+    for index, flag in enumerate(flags):
+        if flag:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+
+def _unpack_bits(data: bytes, count: int) -> List[bool]:
+    flags = list(chain.from_iterable(map(BIT_VALUES.__getitem__, data)))
+    del flags[count:]
+    return flags
+
+
+def _encode_ints(values: List[int]) -> Tuple[int, str, bytes]:
+    """Return the first value, typecode and bytes of the deltas of ``values``."""
+    base = values[0] if values else 0
+    deltas = [
+        value - previous for previous, value in zip(chain((base,), values), values)
+    ]
+    low, high = min(deltas, default=0), max(deltas, default=0)
+    for typecode in DELTA_TYPECODES:
+        limit = 1 << (array(typecode).itemsize * 8 - 1)
+        if -limit <= low and high < limit:
+            break
+    packed = array(typecode, deltas)
+    if BIG_ENDIAN:
+        packed.byteswap()
+    return base, typecode, packed.tobytes()
+
+
+def _decode_ints(base: int, typecode: str, data: bytes) -> List[int]:
+    deltas = array(typecode)
+    deltas.frombytes(data)
+    if BIG_ENDIAN:
+        deltas.byteswap()
+    values = list(accumulate(deltas, initial=base))
+    del values[0]
+    return values
+
+
+def _encode_column(kind: str, values: list) -> Tuple[dict, List[bytes]]:
+    """Return the footer entry of a column and its compressed segments.
+
+    Segment positions in the entry are filled in by the caller.
+    """
+    entry: dict = {}
+    segments = []
+    present = [value for value in values if value is not None]
+    if len(present) < len(values):
+        entry["nulls"] = None
+        segments.append(_pack_bits([value is not None for value in values]))
+    if kind == INT:
+        entry["base"], entry["type"], data = _encode_ints(present)
+    elif kind == BOOL:
+        data = _pack_bits(present)
+    else:
+        data = json.dumps(present, separators=(",", ":")).encode()
+    entry["data"] = None
+    segments.append(data)
+    return entry, [zlib.compress(segment, COMPRESSION_LEVEL) for segment in segments]
+
+
+class ArchiveFile:
+    """Memory-mapped archive of one month of records.
+
+    The file starts with ``MAGIC``, followed by one block per monitor, a JSON
+    footer indexing the blocks and ``TRAILER``. A block holds each column
+    as compressed segments: a bitmap of which rows are not null, when some
+    are, and the values that are. Segments are decompressed straight from
+    the mapped pages, without reading the file into memory first.
+    """
+
+    def __init__(self, path: str):
+        """Map an archive file.
+
+        Raises:
+            ValueError: If the file is not an archive of a known version.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        footer_length, magic = TRAILER.unpack(self._view[-TRAILER.size :])
+        if self._view[: len(MAGIC)] != MAGIC or magic != MAGIC:
+            raise ValueError(f"{path} is not a record archive")
+        footer_end = len(self._view) - TRAILER.size
+        footer = json.loads(bytes(self._view[footer_end - footer_length : footer_end]))
+        if footer["version"] != ARCHIVE_VERSION:
+            raise ValueError(f"{path} has unsupported version {footer['version']}")
+        self.kinds: Dict[str, str] = footer["columns"]
+        self.blocks: Dict[int, dict] = {
+            int(key): block for key, block in footer["blocks"].items()
+        }
+        self.count = sum(block["count"] for block in self.blocks.values())
+        self.max_id = max(
+            (block["max_id"] for block in self.blocks.values()), default=0
+        )
+
+    def _segment(self, position: List[int]) -> bytes:
+        offset, length = position
+        return zlib.decompress(self._view[offset : offset + length])
+
+    def _column(self, name: str, entry: dict, count: int) -> list:
+        kind = self.kinds[name]
+        mask = None
+        if "nulls" in entry:
+            mask = _unpack_bits(self._segment(entry["nulls"]), count)
+            count = sum(mask)
+        data = self._segment(entry["data"])
+        if kind == INT:
+            values = _decode_ints(entry["base"], entry["type"], data)
+        elif kind == BOOL:
+            values = _unpack_bits(data, count)
+        else:
+            values = json.loads(data)
+        if mask is None:
+            return values
+        present = iter(values)
+        return [next(present) if flag else None for flag in mask]
+
+    def read(
+        self,
+        key: int,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> Optional[Dict[str, list]]:
+        """Return the values of a block timestamped in ``[since, until)``.
+
+        Args:
+            key (int): Block to read.
+            since (int, optional): Start of the range as a stored timestamp.
+            until (int, optional): End of the range as a stored timestamp.
+
+        Returns:
+            dict: Stored values by column, in timestamp order, or ``None``
+            when the block does not exist or has no values in the range.
+        """
+        block = self.blocks.get(key)
+        if (
+            block is None
+            or (since is not None and block["last"] < since)
+            or (until is not None and block["first"] >= until)
+        ):
+            return None
+        count = block["count"]
+        entries = block["columns"]
+        timestamps = self._column(TIMESTAMP_COLUMN, entries[TIMESTAMP_COLUMN], count)
+        start = 0 if since is None else bisect_left(timestamps, since)
+        end = count if until is None else bisect_left(timestamps, until)
+        if start >= end:
+            return None
+        columns = {}
+        for name, entry in entries.items():
+            values = (
+                timestamps
+                if name == TIMESTAMP_COLUMN
+                else self._column(name, entry, count)
+            )
+            columns[name] = values[start:end] if end - start < count else values
+        return columns
+
+
+def write_archive(
+    path: str, kinds: Dict[str, str], blocks: Iterable[Tuple[int, Dict[str, list]]]
+):
+    """Write an archive file, complete under a temporary name, then rename it.
+
+    Args:
+        path (str): File to write.
+        kinds (Dict[str, str]): Kind of each column: ``INT``, ``BOOL`` or
+            ``TEXT``.
+        blocks (Iterable): Block keys with the values of each column, sorted
+            by timestamp. Blocks without values are left out.
+    """
+    building = f"{path}.tmp"
+    index = {}
+    with open(building, "wb") as file:
+        file.write(MAGIC)
+        for key, columns in blocks:
+            timestamps = columns[TIMESTAMP_COLUMN]
+            if not timestamps:
+                continue
+            block = {
+                "count": len(timestamps),
+                "first": timestamps[0],
+                "last": timestamps[-1],
+                "max_id": max(columns[ID_COLUMN]),
+                "columns": {},
+            }
+            for name, kind in kinds.items():
+                entry, segments = _encode_column(kind, columns[name])
+                positions = []
+                for segment in segments:
+                    positions.append([file.tell(), len(segment)])
+                    file.write(segment)
+                if "nulls" in entry:
+                    entry["nulls"] = positions.pop(0)
+                entry["data"] = positions[0]
+                block["columns"][name] = entry
+            index[str(key)] = block
+        footer = json.dumps(
+            {"version": ARCHIVE_VERSION, "columns": kinds, "blocks": index},
+            separators=(",", ":"),
+        ).encode()
+        file.write(footer)
+        file.write(TRAILER.pack(len(footer), MAGIC))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(building, path)
+
+
+class RecordArchive:
+    """Directory of compressed columnar archives of raw records.
+
+    Archive files are named ``records-YYYY-MM.cols`` and hold the records of
+    one closed month, one block per monitor; see ``ArchiveFile``. Files are
+    written once, complete under a temporary name and then renamed, and are
+    mapped into memory when first read. A mapped file is reused until the
+    file on disk is replaced or removed.
+    """
+
+    def __init__(self, directory: str):
+        """Create the archive of a directory.
+
+        Args:
+            directory (str): Directory holding the archive files.
+        """
+        self.directory = directory
+        self._files: Dict[str, Tuple[tuple, ArchiveFile]] = {}
+        self._opening = threading.Lock()
+
+    def settings(self) -> tuple:
+        return (self.directory,)
+
+    def describe(self) -> str:
+        return f"record archive in {self.directory}"
+
+    def path(self, month: date) -> str:
+        """Return the archive file of ``month``."""
+        return os.path.join(
+            self.directory, f"records-{month.year:04d}-{month.month:02d}.cols"
+        )
+
+    def months(self) -> List[date]:
+        """Return the archived months, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        months = []
+        for name in names:
+            match = ARCHIVE_FILE.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def overlapping(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[date]:
+        """Return the archived months within ``[since, until)``."""
+        return months_overlapping(self.months(), since, until)
+
+    def open(self, month: date) -> Optional[ArchiveFile]:
+        """Return the mapped archive of ``month``, ``None`` if there is none."""
+        path = self.path(month)
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            self._files.pop(path, None)
+            return None
+        identity = (status.st_ino, status.st_size, status.st_mtime_ns)
+        with self._opening:
+            cached = self._files.get(path)
+            if cached is None or cached[0] != identity:
+                cached = (identity, ArchiveFile(path))
+                self._files[path] = cached
+        return cached[1]
+
+    def read(
+        self,
+        keys: Iterable[int],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        since_value: Optional[int] = None,
+        until_value: Optional[int] = None,
+    ) -> Iterator[Dict[str, list]]:
+        """Yield the archived blocks of ``keys`` within ``[since, until)``.
+
+        Args:
+            keys (Iterable[int]): Blocks to read in each month.
+            since (datetime, optional): Start of the range, to pick months.
+            until (datetime, optional): End of the range, to pick months.
+            since_value (int, optional): ``since`` as a stored timestamp.
+            until_value (int, optional): ``until`` as a stored timestamp.
+        """
+        keys = list(keys)
+        for month in self.overlapping(since, until):
+            archive = self.open(month)
+            if archive is None:
+                continue
+            for key in keys:
+                columns = archive.read(key, since_value, until_value)
+                if columns is not None:
+                    yield columns
+
+    def write(
+        self,
+        month: date,
+        kinds: Dict[str, str],
+        blocks: Iterable[Tuple[int, Dict[str, list]]],
+    ):
+        """Write the archive of ``month``, replacing the existing one."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(month)
+        write_archive(path, kinds, blocks)
+        logger.info(f"Wrote record archive {path}")
+
+    def max_id(self) -> int:
+        """Return the highest archived record id, 0 without archives."""
+        newest = 0
+        for month in self.months():
+            archive = self.open(month)
+            if archive is not None:
+                newest = max(newest, archive.max_id)
+        return newest
+
+    def size(self) -> int:
+        """Return the total size of the archive files in bytes."""
+        total = 0
+        for month in self.months():
+            try:
+                total += os.path.getsize(self.path(month))
+            except FileNotFoundError:
+                pass
+        return total
+
+    def remove(self, month: date):
+        """Delete the archive file of ``month``."""
+        path = self.path(month)
+        self._files.pop(path, None)
+        if os.path.exists(path):
+            os.remove(path)
+        logger.info(f"Removed record archive {path}")
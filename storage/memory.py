@@ -0,0 +1,60 @@
+from typing import Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from .sqlite import SQLiteBackend, apply_pragmas
+
+
+class MemoryBackend(SQLiteBackend):
+    """In-memory SQLite database held by the current process.
+
+    Meant for tests and trial runs: nothing is written to disk and the data
+    is gone when the process exits. All sessions share one connection, so the
+    reader engine is the writer engine, and processes spawned to share work
+    do not see the data.
+    """
+
+    name = "memory"
+    shared_between_processes = False
+
+    def __init__(self, app_config: dict):
+        """Read the settings shared with the SQLite backend.
+
+        Args:
+            app_config (dict): Application configuration. Reads
+                ``storage_profile`` and ``sqlite_pragmas``; the journal mode
+                does not apply to an in-memory database.
+
+        Raises:
+            ValueError: If ``partition_records`` or ``archive_after_days`` is
+                set, which need files.
+        """
+        if app_config.get("partition_records"):
+            raise ValueError("partition_records requires storage_backend 'sqlite'")
+        if app_config.get("archive_after_days") is not None:
+            raise ValueError("archive_after_days requires storage_backend 'sqlite'")
+        super().__init__(app_config)
+        self.partitions = None
+        self.archive = None
+        self.pragmas = {
+            name: value
+            for name, value in self.pragmas.items()
+            if name not in ("journal_mode", "mmap_size")
+        }
+
+    def settings(self) -> tuple:
+        return (self.name, tuple(self.pragmas.items()))
+
+    def create_engines(self) -> Tuple[Engine, Engine]:
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        apply_pragmas(engine, self.pragmas, query_only=False)
+        return engine, engine
+
+    def describe(self) -> str:
+        return "in-memory SQLite database"
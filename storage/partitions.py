@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import Table, create_engine
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+PARTITION_FILE = re.compile(r"^records-(\d{4})-(\d{2})\.db$")
+ALIAS_PREFIX = "records_"
+# SQLite attaches at most 10 databases to a connection by default; the rest
+# is headroom for partitions that cannot be detached mid-transaction.
+MAX_ATTACHED_PARTITIONS = 8
+# Pragmas that apply to each attached database rather than the connection.
+SCHEMA_PRAGMAS = ("synchronous", "cache_size", "mmap_size")
+
+
+def month_of(timestamp: datetime) -> date:
+    """Return the first day of the month ``timestamp`` falls in."""
+    return date(timestamp.year, timestamp.month, 1)
+
+
+def next_month(month: date) -> date:
+    """Return the first day of the month after ``month``."""
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def months_overlapping(
+    months: List[date],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[date]:
+    """Return the ``months`` with days within ``[since, until)``."""
+    return [
+        month
+        for month in months
+        if (since is None or next_month(month) > since.date())
+        and (until is None or datetime.combine(month, datetime.min.time()) < until)
+    ]
+
+
+class MonthlyPartitions:
+    """Directory of SQLite files holding one month of raw records each.
+
+    Partition files are named ``records-YYYY-MM.db`` and hold a
+    ``monitor_checks`` table of their own. They are attached to a connection
+    under the alias ``records_YYYY_MM`` only while a statement needs them,
+    at most ``MAX_ATTACHED_PARTITIONS`` at a time, and opened read-only by
+    query-only connections. A file is created complete under a temporary
+    name and then renamed, so readers never attach a partition without its
+    table, and expiring a month is removing its file.
+    """
+
+    def __init__(self, directory: str, enabled: bool, pragmas: Dict[str, object]):
+        """Create the partitions of a directory.
+
+        Args:
+            directory (str): Directory holding the partition files.
+            enabled (bool): Whether new records are written to partitions.
+                Existing partition files are read either way.
+            pragmas (Dict[str, object]): Pragmas of the database file; those
+                in ``SCHEMA_PRAGMAS`` are applied to attached partitions too.
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.pragmas = {
+            name: value for name, value in pragmas.items() if name in SCHEMA_PRAGMAS
+        }
+        # Set once the records table of the database file is found empty with
+        # partitioning on; nothing writes to it then, so reads can skip it.
+        self.unpartitioned_empty = False
+        self._creating = threading.Lock()
+
+    def settings(self) -> tuple:
+        return (self.directory, self.enabled, tuple(self.pragmas.items()))
+
+    def describe(self) -> str:
+        return f"monthly record partitions in {self.directory}"
+
+    @staticmethod
+    def alias(month: date) -> str:
+        """Return the schema name a partition is attached under."""
+        return f"{ALIAS_PREFIX}{month.year:04d}_{month.month:02d}"
+
+    def path(self, month: date) -> str:
+        """Return the file of the partition holding ``month``."""
+        return os.path.join(
+            self.directory, f"records-{month.year:04d}-{month.month:02d}.db"
+        )
+
+    def months(self) -> List[date]:
+        """Return the months with a partition file, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        months = []
+        for name in names:
+            match = PARTITION_FILE.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def overlapping(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[date]:
+        """Return the months with a partition file within ``[since, until)``."""
+        return months_overlapping(self.months(), since, until)
+
+    def create(self, month: date, table: Table):
+        """Create the partition file of ``month`` with ``table`` in it.
+
+        Does nothing if the file exists.
+        """
+        path = self.path(month)
+        with self._creating:
+            if os.path.exists(path):
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            building = f"{path}.tmp"
+            for leftover in (building, f"{building}-wal", f"{building}-shm"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            engine = create_engine(f"sqlite:///{building}")
+            try:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql("PRAGMA journal_mode = WAL")
+                    table.create(connection)
+            finally:
+                engine.dispose()
+            os.replace(building, path)
+        logger.info(f"Created record partition {path}")
+
+    def attach(self, connection, months: List[date]):
+        """Attach the partitions of ``months`` to ``connection``.
+
+        Partitions attached earlier and not in ``months`` are detached, unless
+        the connection is inside a write transaction that still needs them.
+
+        Raises:
+            ValueError: If more than ``MAX_ATTACHED_PARTITIONS`` are requested.
+        """
+        if len(months) > MAX_ATTACHED_PARTITIONS:
+            raise ValueError(
+                f"Cannot attach {len(months)} record partitions at once, "
+                f"at most {MAX_ATTACHED_PARTITIONS}"
+            )
+        wanted = {self.alias(month): month for month in months}
+        attached = {
+            row[1]
+            for row in connection.exec_driver_sql("PRAGMA database_list")
+            if row[1].startswith(ALIAS_PREFIX)
+        }
+        for alias in attached - set(wanted):
+            try:
+                connection.exec_driver_sql(f"DETACH DATABASE {alias}")
+            except OperationalError:
+                pass
+        missing = [alias for alias in wanted if alias not in attached]
+        if not missing:
+            return
+        query_only = connection.exec_driver_sql("PRAGMA query_only").scalar()
+        for alias in missing:
+            month = wanted[alias]
+            uri = Path(self.path(month)).resolve().as_uri()
+            connection.exec_driver_sql(
+                f"ATTACH DATABASE ? AS {alias}",
+                (f"{uri}?mode={'ro' if query_only else 'rw'}",),
+            )
+            for name, value in self.pragmas.items():
+                connection.exec_driver_sql(f"PRAGMA {alias}.{name} = {value}")
+
+    def remove(self, month: date):
+        """Delete the partition file of ``month``."""
+        path = self.path(month)
+        for name in (path, f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+        logger.info(f"Removed record partition {path}")
@@ -0,0 +1,260 @@
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import BigInteger, Table, cast, create_engine, event, func
+from sqlalchemy.dialects.sqlite import Insert, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import ColumnElement
+
+from .base import StorageBackend
+from .columnar import RecordArchive
+from .partitions import MonthlyPartitions
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_PATH = "status.db"
+DEFAULT_STORAGE_PROFILE = "fast"
+DEFAULT_WRITER_POOL_SIZE = 2
+DEFAULT_READER_POOL_SIZE = 8
+
+SQLITE_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+)
+
+STORAGE_PROFILES: Dict[str, Dict[str, object]] = {
+    # Readers never block the writer and commits skip the fsync of the WAL;
+    # a power loss may lose the last commits but never corrupts the file.
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # WAL with an fsync on every commit.
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # SQLite defaults: rollback journal, readers and the writer lock each other.
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def database_path(app_config: dict) -> str:
+    """Return the absolute path of the SQLite database file.
+
+    ``database_path`` is resolved against the application directory when
+    relative, so the database does not depend on the working directory.
+    """
+    path = app_config.get("database_path", DEFAULT_DATABASE_PATH)
+    return os.path.join(APP_DIR, os.path.expanduser(path))
+
+
+def partition_path(app_config: dict) -> str:
+    """Return the directory of the monthly record partitions.
+
+    ``partition_path`` is resolved like ``database_path``; by default the
+    partitions sit next to the database file in ``<name>-partitions``.
+    """
+    path = app_config.get("partition_path")
+    if path is None:
+        return f"{os.path.splitext(database_path(app_config))[0]}-partitions"
+    return os.path.join(APP_DIR, os.path.expanduser(path))
+
+
+def archive_path(app_config: dict) -> str:
+    """Return the directory of the record archive.
+
+    ``archive_path`` is resolved like ``database_path``; by default the
+    archive sits next to the database file in ``<name>-archive``.
+    """
+    path = app_config.get("archive_path")
+    if path is None:
+        return f"{os.path.splitext(database_path(app_config))[0]}-archive"
+    return os.path.join(APP_DIR, os.path.expanduser(path))
+
+
+def storage_pragmas(app_config: dict) -> Dict[str, object]:
+    """Return the SQLite pragmas of the configured storage profile.
+
+    Starts from ``STORAGE_PROFILES[storage_profile]`` and applies the
+    overrides in ``sqlite_pragmas``.
+
+    Raises:
+        ValueError: If the profile or a pragma is unknown, or a value is not a
+            number or a keyword.
+    """
+    profile = app_config.get("storage_profile", DEFAULT_STORAGE_PROFILE)
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(
+            f"Unknown storage_profile '{profile}'. "
+            f"Must be one of: {', '.join(STORAGE_PROFILES)}"
+        )
+    pragmas = dict(STORAGE_PROFILES[profile])
+    for name, value in (app_config.get("sqlite_pragmas") or {}).items():
+        if name not in SQLITE_PRAGMAS:
+            raise ValueError(
+                f"Unsupported SQLite pragma '{name}'. "
+                f"Must be one of: {', '.join(SQLITE_PRAGMAS)}"
+            )
+        if not isinstance(value, int) and not str(value).isalpha():
+            raise ValueError(f"Invalid value for SQLite pragma '{name}': {value}")
+        pragmas[name] = value
+    return pragmas
+
+
+def apply_pragmas(engine: Engine, pragmas: Dict[str, object], query_only: bool):
+    """Run ``pragmas`` on every new connection of ``engine``."""
+    if query_only:
+        # The journal mode is stored in the database file and is set by the
+        # writer; switching it needs a connection of its own.
+        pragmas = {
+            name: value for name, value in pragmas.items() if name != "journal_mode"
+        }
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if query_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite database file, the default backend.
+
+    Connections get the pragmas of ``storage_pragmas``. Reads go through a
+    second engine whose connections are opened read-only; in WAL mode they
+    see the last commit without waiting for the writer.
+
+    With ``partition_records``, raw records are written to one file per
+    month instead, see ``MonthlyPartitions``; the database file keeps the
+    monitors, aggregates and records written before. With
+    ``archive_after_days``, closed months of records are compacted into
+    columnar files, see ``RecordArchive``.
+    """
+
+    name = "sqlite"
+    dialect = "sqlite"
+
+    def __init__(self, app_config: dict):
+        """Read the SQLite settings.
+
+        Args:
+            app_config (dict): Application configuration. Reads
+                ``database_path``, ``storage_profile``, ``sqlite_pragmas``,
+                ``db_writer_pool_size``, ``db_reader_pool_size``,
+                ``partition_records``, ``partition_path``,
+                ``archive_after_days`` and ``archive_path``.
+
+        Raises:
+            ValueError: If the storage profile or pragmas are invalid.
+        """
+        super().__init__(app_config)
+        self.path = database_path(app_config)
+        self.pragmas = storage_pragmas(app_config)
+        self.writer_pool_size = int(
+            app_config.get("db_writer_pool_size", DEFAULT_WRITER_POOL_SIZE)
+        )
+        self.reader_pool_size = int(
+            app_config.get("db_reader_pool_size", DEFAULT_READER_POOL_SIZE)
+        )
+        self.partitions = MonthlyPartitions(
+            partition_path(app_config),
+            enabled=bool(app_config.get("partition_records", False)),
+            pragmas=self.pragmas,
+        )
+        self.archive = RecordArchive(archive_path(app_config))
+        self.archiving = app_config.get("archive_after_days") is not None
+
+    def settings(self) -> tuple:
+        return (
+            self.name,
+            self.path,
+            tuple(self.pragmas.items()),
+            self.writer_pool_size,
+            self.reader_pool_size,
+            self.partitions.settings(),
+            self.archive.settings(),
+        )
+
+    def _create_engine(self, pool_size: int, query_only: bool) -> Engine:
+        engine = create_engine(
+            f"sqlite:///{self.path}",
+            connect_args={
+                "check_same_thread": False,
+                "timeout": int(self.pragmas.get("busy_timeout", 5000)) / 1000,
+                # Partitions are attached by URI, to open them read-only.
+                "uri": True,
+            },
+            pool_size=pool_size,
+            max_overflow=pool_size,
+        )
+        apply_pragmas(engine, self.pragmas, query_only)
+        return engine
+
+    def create_engines(self) -> Tuple[Engine, Engine]:
+        return (
+            self._create_engine(self.writer_pool_size, query_only=False),
+            self._create_engine(self.reader_pool_size, query_only=True),
+        )
+
+    def describe(self) -> str:
+        description = (
+            f"SQLite database {self.path} with {self.pragmas['journal_mode']} "
+            f"journal, synchronous {self.pragmas['synchronous']}"
+        )
+        if self.partitions.enabled:
+            description += f" and {self.partitions.describe()}"
+        if self.archiving:
+            description += f", {self.archive.describe()}"
+        return description
+
+    @classmethod
+    def insert(cls, table: Table) -> Insert:
+        return insert(table)
+
+    @classmethod
+    def month_start(cls, millis) -> ColumnElement:
+        return (
+            cast(
+                func.strftime("%s", millis // 1000, "unixepoch", "start of month"),
+                BigInteger,
+            )
+            * 1000
+        )
+
+    @classmethod
+    def interrupt(cls, dbapi_connection):
+        dbapi_connection.interrupt()
+
+    @classmethod
+    def lock_migrations(cls, connection):
+        # Take the write lock now rather than at the first write, which is
+        # also what makes schema changes part of the transaction.
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @classmethod
+    def free_bytes(cls, connection) -> Optional[int]:
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        return page_size * free_pages
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import BigInteger, Integer
+from sqlalchemy.types import TypeDecorator
+
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def to_epoch_millis(value: datetime) -> int:
+    """Return a naive timestamp as whole milliseconds since ``EPOCH``."""
+    return (value - EPOCH) // MILLISECOND
+
+
+def from_epoch_millis(value: int) -> datetime:
+    """Return the naive timestamp ``value`` milliseconds after ``EPOCH``."""
+    return EPOCH + timedelta(milliseconds=value)
+
+
+class EpochMillis(TypeDecorator):
+    """``datetime`` stored as an integer count of milliseconds since 1970.
+
+    The application works with naive local timestamps, which are counted
+    from the epoch as they are, without a time zone in either direction, so
+    stored values keep the order and spacing of the timestamps and read back
+    unchanged. Sub-millisecond parts are truncated.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect) -> Optional[int]:
+        if value is None or isinstance(value, int):
+            return value
+        return to_epoch_millis(value)
+
+    def process_result_value(self, value, dialect) -> Optional[datetime]:
+        if value is None:
+            return None
+        return from_epoch_millis(value)
+
+
+class Milliseconds(TypeDecorator):
+    """Duration in seconds stored as a whole number of milliseconds."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect) -> Optional[int]:
+        if value is None:
+            return None
+        return round(value * 1000)
+
+    def process_result_value(self, value, dialect) -> Optional[float]:
+        if value is None:
+            return None
+        return value / 1000
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+AGGREGATE_WATERMARK = "aggregates"
+
+
+def read_aggregate_watermark(connection) -> Optional[int]:
+    """Return the highest record id counted in the aggregates, if recorded."""
+    return connection.execute(
+        text("SELECT record_id FROM aggregate_watermarks WHERE name = :name"),
+        {"name": AGGREGATE_WATERMARK},
+    ).scalar()
+
+
+def write_aggregate_watermark(connection, record_id: int):
+    """Record that aggregates include every monitor record up to ``record_id``."""
+    connection.execute(
+        text(
+            """
+            INSERT INTO aggregate_watermarks (name, record_id, updated_at)
+            VALUES (:name, :record_id, :updated_at)
+            ON CONFLICT (name) DO UPDATE SET
+                record_id = excluded.record_id,
+                updated_at = excluded.updated_at
+            """
+        ),
+        {
+            "name": AGGREGATE_WATERMARK,
+            "record_id": record_id,
+            "updated_at": datetime.now(),
+        },
+    )
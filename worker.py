@@ -0,0 +1,49 @@
+"""Standalone monitor worker.
+
+Runs the probe loop without serving the API, so the API can be scaled out
+with ``monitor_in_api: false``. Several workers may run at once for failover;
+the prober lease ensures only one of them probes at a time.
+
+Usage:
+    python worker.py
+"""
+
+import asyncio
+import logging
+import signal
+
+import aggregation
+import config
+import database
+import monitor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_worker():
+    """Initialize the database and run the monitoring service until stopped.
+
+    Stops on SIGINT or SIGTERM, releasing the prober lease so a standby
+    worker can take over without waiting for it to expire.
+    """
+    monitors_config, app_config, _ = config.load_config()
+    database.configure(app_config)
+    database.init_db()
+    aggregation.reevaluate_degraded_status(database.engine, app_config)
+
+    task = asyncio.create_task(monitor.run_monitor(monitors_config, app_config))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+
+    logger.info(f"Monitor worker started for {len(monitors_config)} monitors")
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    logger.info("Monitor worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())